@@ -0,0 +1,215 @@
+"""
+Varredura por amostragem: hashes de todas as seções, assinaturas de uma
+amostra.
+
+Primeiro o hash do .logjez e do .bu de todas as seções é comparado com o
+registrado nos envelopes de assinaturas; isso é barato e cobre a população
+inteira. Depois, entre as seções cujos hashes conferem, é sorteada em cada
+UF uma amostra aleatória simples com o tamanho necessário para estimar a
+taxa de falhas da assinatura com a margem de erro e a confiança pedidas, e só
+essas assinaturas são verificadas (ECDSA, em lote). A taxa é estimada por
+UF e para o total (estimador estratificado), com intervalos de Wilson; o
+do total usa o tamanho efetivo da amostra estratificada.
+
+Uso: python amostragem.py DIRETORIO [--confianca 0.95] [--margem 0.05]
+                          [--taxa-esperada 0.5] [--semente N]
+     (a UF é o nome da pasta de cada seção, relativa a DIRETORIO)
+"""
+import argparse
+import collections
+import hashlib
+import math
+import random
+import statistics
+import sys
+
+import verificacao
+
+
+def z_score(confianca):
+    return statistics.NormalDist().inv_cdf((1 + confianca) / 2)
+
+
+def sample_size(populacao, confianca, margem, taxa=0.5):
+    """
+    Tamanho da amostra aleatória simples para estimar uma proporção
+    próxima de `taxa` com a `margem` de erro, com a correção para população
+    finita.
+    """
+    if populacao == 0:
+        return 0
+    n0 = z_score(confianca) ** 2 * taxa * (1 - taxa) / margem ** 2
+    return min(populacao, math.ceil(n0 / (1 + (n0 - 1) / populacao)))
+
+
+def wilson_interval(taxa, n, z):
+    """
+    Intervalo de Wilson para a proporção `taxa` observada em `n` itens
+    (`n` pode ser um tamanho efetivo, não inteiro, ou infinito se a
+    população inteira foi verificada).
+    """
+    if math.isinf(n):
+        return taxa, taxa
+    if n == 0:
+        return 0.0, 1.0
+    denominador = 1 + z ** 2 / n
+    centro = (taxa + z ** 2 / (2 * n)) / denominador
+    meia = z * math.sqrt(taxa * (1 - taxa) / n + z ** 2 / (4 * n ** 2)) / denominador
+    return max(0.0, centro - meia), min(1.0, centro + meia)
+
+
+def check_hashes(secoes):
+    """
+    Compara os hashes de todas as seções com os dos envelopes. Gera
+    (seção, situação): "ok", "hash" (algum hash não confere) ou "erro".
+    """
+    for secao in secoes:
+        verificacao.requisicao_atual.set(secao["secao"])
+        if secao["sign"] is None or secao["log"] is None or secao["bu"] is None:
+            yield secao, "erro"
+            continue
+        try:
+            section = verificacao.read_section(secao["sign"], secao["log"], secao["bu"])
+        except Exception:
+            yield secao, "erro"
+            continue
+        conferem = all(section[arquivo][0] == section[arquivo][2] for arquivo in ("log", "bu"))
+        yield secao, "ok" if conferem else "hash"
+
+
+def verify_signatures(sign_paths, lote=128):
+    """
+    Verifica as assinaturas do log e do BU das seções cujos ZIPs de
+    assinaturas são `sign_paths`, que já tiveram os hashes conferidos. Gera
+    (caminho, válida) para cada uma; uma seção cujo envelope não pode mais
+    ser lido conta como falha.
+    """
+    for inicio in range(0, len(sign_paths), lote):
+        pendentes, itens = [], []
+        for sign_path in sign_paths[inicio:inicio + lote]:
+            try:
+                envelopes, _ = verificacao.read_envelopes(sign_path)
+                tabela = verificacao.merge_signed_files(envelopes)
+                entradas = [verificacao.find_signed(tabela, envelopes, arquivo)
+                            for arquivo in ("log", "bu")]
+            except Exception:
+                pendentes.append((sign_path, []))
+                continue
+            pendentes.append((sign_path, range(len(itens), len(itens) + len(entradas))))
+            itens.extend((hashlib.sha512(entrada["hash"]).digest(), entrada["assinatura"],
+                          entrada["pub_key"]) for entrada in entradas)
+        validas = verificacao.check_signature_batch(itens)
+        for sign_path, posicoes in pendentes:
+            yield sign_path, bool(posicoes) and all(validas[i] for i in posicoes)
+
+
+class Stratum:
+    __slots__ = ('secoes', 'erros', 'falhas_hash', 'conferidas', 'amostra', 'falhas_amostra')
+
+    def __init__(self):
+        self.secoes = 0
+        self.erros = 0
+        self.falhas_hash = 0
+        self.conferidas = []
+        self.amostra = 0
+        self.falhas_amostra = 0
+
+    def rate(self):
+        return self.falhas_amostra / self.amostra if self.amostra else 0.0
+
+    def effective_size(self):
+        # Com a correção para população finita: a população inteira
+        # verificada não tem erro amostral.
+        fracao = self.amostra / len(self.conferidas) if self.conferidas else 1.0
+        return math.inf if fracao >= 1 else self.amostra / (1 - fracao)
+
+
+def sweep(secoes, confianca=0.95, margem=0.05, taxa=0.5, rng=None):
+    """
+    Retorna {UF: Stratum} com os hashes de todas as seções e as assinaturas
+    da amostra de cada UF já verificados.
+    """
+    rng = rng or random.Random()
+    estratos = collections.defaultdict(Stratum)
+    for secao, situacao in check_hashes(secoes):
+        estrato = estratos[secao["uf"]]
+        estrato.secoes += 1
+        if situacao == "erro":
+            estrato.erros += 1
+        elif situacao == "hash":
+            estrato.falhas_hash += 1
+        else:
+            # Só o caminho do ZIP de assinaturas é guardado até o sorteio.
+            estrato.conferidas.append(secao["sign"])
+    for estrato in estratos.values():
+        amostra = rng.sample(estrato.conferidas,
+                             sample_size(len(estrato.conferidas), confianca, margem, taxa))
+        for _, valida in verify_signatures(amostra):
+            estrato.amostra += 1
+            estrato.falhas_amostra += not valida
+    return estratos
+
+
+def estimate(estratos, confianca=0.95):
+    """
+    Taxa de falhas da assinatura (entre as seções com hashes conferidos)
+    por UF e no total, com o intervalo de confiança: {UF ou None: (taxa,
+    mínimo, máximo)}.
+    """
+    z = z_score(confianca)
+    estimativas = {}
+    total = sum(len(e.conferidas) for e in estratos.values())
+    taxa, variancia_unitaria = 0.0, 0.0
+    for uf, estrato in estratos.items():
+        p = estrato.rate()
+        estimativas[uf] = (p, *wilson_interval(p, estrato.effective_size(), z))
+        if total and estrato.conferidas:
+            peso = len(estrato.conferidas) / total
+            taxa += peso * p
+            variancia_unitaria += peso ** 2 / estrato.effective_size()
+    # Tamanho efetivo da amostra estratificada: o de uma amostra aleatória
+    # simples com a mesma variância, se a taxa fosse igual em todas as UFs.
+    n_efetivo = 1 / variancia_unitaria if variancia_unitaria else math.inf
+    if not total:
+        n_efetivo = 0
+    estimativas[None] = (taxa, *wilson_interval(taxa, n_efetivo, z))
+    return estimativas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio")
+    parser.add_argument("--confianca", type=float, default=0.95)
+    parser.add_argument("--margem", type=float, default=0.05,
+                        help="Margem de erro da taxa estimada em cada UF")
+    parser.add_argument("--taxa-esperada", type=float, default=0.5,
+                        help="Taxa de falhas esperada (0,5 é o caso mais conservador)")
+    parser.add_argument("--semente", type=int, help="Semente do sorteio, para repetir a amostra")
+    args = parser.parse_args()
+
+    estratos = sweep(verificacao.find_sections(args.diretorio), args.confianca, args.margem,
+                     args.taxa_esperada, random.Random(args.semente))
+    estimativas = estimate(estratos, args.confianca)
+    print("%-10s %8s %8s %8s %8s %8s %9s  %s" % (
+        "UF", "seções", "erros", "hash", "amostra", "falhas", "taxa",
+        "IC %d%%" % round(100 * args.confianca)))
+    linhas = sorted(estratos.items()) + [(None, None)]
+    for uf, estrato in linhas:
+        if estrato is None:
+            estrato = Stratum()
+            for e in estratos.values():
+                for campo in ('secoes', 'erros', 'falhas_hash', 'amostra', 'falhas_amostra'):
+                    setattr(estrato, campo, getattr(estrato, campo) + getattr(e, campo))
+        taxa, minimo, maximo = estimativas[uf]
+        print("%-10s %8d %8d %8d %8d %8d %8.2f%%  [%.2f%%, %.2f%%]" % (
+            "total" if uf is None else uf or "-", estrato.secoes, estrato.erros,
+            estrato.falhas_hash, estrato.amostra, estrato.falhas_amostra,
+            100 * taxa, 100 * minimo, 100 * maximo))
+    problemas = sum(e.erros + e.falhas_hash + e.falhas_amostra for e in estratos.values())
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
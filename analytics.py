@@ -0,0 +1,246 @@
+"""
+Estatísticas sobre os metadados de muitos envelopes de assinatura.
+
+Os campos decodificados de cada envelope (modelo da urna, data e hora de
+criação, conjunto de chaves, UF e veredicto da verificação) são acumulados
+em colunas NumPy. Textos repetitivos viram códigos inteiros com dicionário,
+de modo que contagens por grupo, histogramas e taxas por UF são feitas com
+operações vetorizadas (bincount/histogram), sem percorrer dicionários Python.
+
+Uso: python analytics.py DIRETORIO [--salvar ARQUIVO.npz]
+     (a UF é o nome da pasta de cada ZIP de assinaturas, relativa a DIRETORIO)
+"""
+import argparse
+import hashlib
+import sys
+
+import numpy as np
+
+import verificacao
+
+# Veredictos: -1 = não verificado, 0 = inválido, 1 = válido.
+NAO_VERIFICADO = -1
+
+
+class Column:
+    """
+    Vetor NumPy que cresce por duplicação, para inserções em fluxo.
+    """
+
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            self.data = np.resize(self.data, 2 * len(self.data))
+        self.data[self.size] = value
+        self.size += 1
+
+    def values(self):
+        return self.data[:self.size]
+
+
+class Categories:
+    """
+    Dicionário de textos para códigos inteiros (coluna categórica).
+    """
+
+    def __init__(self, labels=()):
+        self.labels = list(labels)
+        self.codes = {label: i for i, label in enumerate(self.labels)}
+
+    def code(self, label):
+        if label not in self.codes:
+            self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return self.codes[label]
+
+
+def parse_datahora(datahora):
+    """
+    Converte DataHoraJE (YYYYMMDDThhmmss) em segundos desde 1970.
+    """
+    iso = "%s-%s-%sT%s:%s:%s" % (datahora[0:4], datahora[4:6], datahora[6:8],
+                                 datahora[9:11], datahora[11:13], datahora[13:15])
+    return np.datetime64(iso, 's').astype(np.int64)
+
+
+class MetadataStore:
+    def __init__(self):
+        self.modelo = Column(np.int16)
+        self.datahora = Column(np.int64)
+        self.chave = Column(np.int32)
+        self.uf = Column(np.int16)
+        self.veredicto = Column(np.int8)
+        self.chaves = Categories()
+        self.ufs = Categories()
+
+    def __len__(self):
+        return self.modelo.size
+
+    def add(self, modelo, datahora, conjunto_chave, uf="", veredicto=NAO_VERIFICADO):
+        self.modelo.append(modelo)
+        self.datahora.append(parse_datahora(datahora))
+        self.chave.append(self.chaves.code(conjunto_chave or ""))
+        self.uf.append(self.ufs.code(uf))
+        self.veredicto.append(NAO_VERIFICADO if veredicto is None else int(veredicto))
+
+    def add_envelope(self, envelope, uf="", veredicto=NAO_VERIFICADO):
+        """
+        `envelope` vem de verificacao.decode_signature_file (ou
+        read_envelopes), que já aplicou os limites de decodificação.
+        """
+        self.add(envelope["modelo"], envelope["datahora"], envelope["conjunto_chave"],
+                 uf, veredicto)
+
+    def count_by_modelo(self):
+        modelos = self.modelo.values()
+        contagem = np.bincount(modelos)
+        presentes = np.flatnonzero(contagem)
+        return dict(zip(presentes.tolist(), contagem[presentes].tolist()))
+
+    def count_by_chave(self):
+        contagem = np.bincount(self.chave.values(), minlength=len(self.chaves.labels))
+        return dict(zip(self.chaves.labels, contagem.tolist()))
+
+    def datahora_histogram(self, bin_seconds=3600):
+        """
+        Retorna (início de cada intervalo como datetime64, contagem).
+        """
+        datahora = self.datahora.values()
+        if not len(datahora):
+            return np.array([], dtype='datetime64[s]'), np.array([], dtype=np.int64)
+        inicio = datahora.min() // bin_seconds * bin_seconds
+        contagem = np.bincount((datahora - inicio) // bin_seconds)
+        bordas = inicio + bin_seconds * np.arange(len(contagem))
+        return bordas.astype('datetime64[s]'), contagem
+
+    def verdict_rates_by_uf(self):
+        """
+        Por UF: (verificados, válidos, taxa de válidos). Envelopes não
+        verificados não entram na taxa.
+        """
+        n = len(self.ufs.labels)
+        uf = self.uf.values()
+        veredicto = self.veredicto.values()
+        verificado = veredicto != NAO_VERIFICADO
+        total = np.bincount(uf[verificado], minlength=n)
+        validos = np.bincount(uf[verificado], weights=veredicto[verificado], minlength=n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            taxa = validos / total
+        return {label: (int(total[i]), int(validos[i]), float(taxa[i]))
+                for i, label in enumerate(self.ufs.labels)}
+
+    def save(self, path):
+        np.savez_compressed(
+            path, modelo=self.modelo.values(), datahora=self.datahora.values(),
+            chave=self.chave.values(), uf=self.uf.values(),
+            veredicto=self.veredicto.values(),
+            chaves=np.array(self.chaves.labels, dtype=object),
+            ufs=np.array(self.ufs.labels, dtype=object))
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        with np.load(path, allow_pickle=True) as data:
+            for nome in ("modelo", "datahora", "chave", "uf", "veredicto"):
+                coluna = getattr(store, nome)
+                coluna.data = data[nome].copy()
+                coluna.size = len(coluna.data)
+            store.chaves = Categories(data["chaves"].tolist())
+            store.ufs = Categories(data["ufs"].tolist())
+        return store
+
+
+def scan(diretorio, store=None, lote=64):
+    """
+    Acumula o envelope .vscmr de cada seção de `diretorio` com o veredicto
+    da verificação: válido se o hash e a assinatura do log e do BU presentes
+    conferem (as assinaturas de `lote` seções são verificadas juntas com
+    check_signature_batch); não verificado se a seção não tem log nem BU.
+    Retorna (store, [(seção, erro)] das seções cujo envelope não foi lido).
+    """
+    store = store or MetadataStore()
+    rejeitadas = []
+    secoes = verificacao.iter_sections(diretorio)
+    while True:
+        pendentes = []
+        for secao in secoes:
+            if secao["sign"] is not None:
+                pendentes.append(secao)
+            if len(pendentes) == lote:
+                break
+        if not pendentes:
+            return store, rejeitadas
+        servico = verificacao.hash_service()
+        lidas, itens = [], []
+        for secao in pendentes:
+            try:
+                envelopes, erros = verificacao.read_envelopes(secao["sign"])
+                envelope = next((e for e in envelopes if e["nome"].endswith(".vscmr")), None)
+                if envelope is None:
+                    raise verificacao.UntrustedInput("envelope .vscmr ausente ou inválido" + "".join(
+                        "; %s: %s" % erro for erro in erros))
+                tabela = verificacao.merge_signed_files(envelopes)
+                arquivos = []
+                if secao["log"] is not None:
+                    arquivos.append((verificacao.find_signed(tabela, envelopes, "log"), servico.submit(
+                        lambda p=secao["log"]: verificacao.open_member(p, ".logjez"))))
+                if secao["bu"] is not None:
+                    arquivos.append((verificacao.find_signed(tabela, envelopes, "bu"), servico.submit(
+                        lambda p=secao["bu"]: open(p, 'rb'))))
+            except Exception as e:
+                rejeitadas.append((secao["secao"], str(e) or type(e).__name__))
+                continue
+            lidas.append((secao, envelope, arquivos))
+        veredictos = []
+        for secao, envelope, arquivos in lidas:
+            veredicto = NAO_VERIFICADO if not arquivos else 1
+            for entrada, futuro in arquivos:
+                try:
+                    atual = futuro.result()
+                except Exception:
+                    veredicto = 0
+                    continue
+                if atual != entrada["hash"]:
+                    veredicto = 0
+                    continue
+                itens.append((len(veredictos), (hashlib.sha512(atual).digest(),
+                                                entrada["assinatura"], entrada["pub_key"])))
+            veredictos.append(veredicto)
+        validas = verificacao.check_signature_batch([item for _, item in itens])
+        for (i, _), valida in zip(itens, validas):
+            if not valida:
+                veredictos[i] = 0
+        for (secao, envelope, _), veredicto in zip(lidas, veredictos):
+            store.add_envelope(envelope, secao["uf"], veredicto)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio")
+    parser.add_argument("--salvar", help="Grava as colunas em .npz")
+    args = parser.parse_args()
+
+    store, rejeitadas = scan(args.diretorio)
+    for secao, erro in rejeitadas:
+        print("%s: envelope não pôde ser lido: %s" % (secao, erro), file=sys.stderr)
+    print("Envelopes:", len(store))
+    print("Por modelo de urna:", store.count_by_modelo())
+    print("Por conjunto de chaves:", store.count_by_chave())
+    for inicio, contagem in zip(*store.datahora_histogram()):
+        print(inicio, contagem)
+    print("Por UF (verificados, válidos, taxa):")
+    for uf, (total, validos, taxa) in store.verdict_rates_by_uf().items():
+        print("  %s\t%d\t%d\t%s" % (uf or ".", total, validos,
+                                   "-" if not total else "%.1f%%" % (100 * taxa)))
+    if args.salvar:
+        store.save(args.salvar)
+    if rejeitadas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
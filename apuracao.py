@@ -0,0 +1,160 @@
+"""
+Totalização dos votos de boletins de urna com assinatura verificada.
+
+Cada .bu só é somado se o seu hash e a assinatura ECDSA do envelope de
+assinaturas da mesma seção conferirem. Os votos são acumulados em vetores
+NumPy indexados por (UF, município, eleição, cargo, tipo de voto, votável),
+processando um boletim de cada vez: a memória depende do número de
+votáveis distintos, não do número de seções.
+
+Uso: python apuracao.py DIRETORIO [--nivel municipio|uf|estado]
+     (a UF é o nome da pasta de cada seção, relativa a DIRETORIO)
+"""
+import argparse
+import hashlib
+import sys
+
+import numpy as np
+
+import verificacao
+from analytics import Categories, Column
+
+NIVEIS = {
+    "municipio": ("uf", "municipio", "eleicao", "cargo", "tipo", "codigo"),
+    "uf": ("uf", "eleicao", "cargo", "tipo", "codigo"),
+    "estado": ("eleicao", "cargo", "tipo", "codigo"),
+}
+
+
+class VoteTotals:
+    def __init__(self, flush_every=65536):
+        self.flush_every = flush_every
+        self.indices = {}
+        self.uf = Column(np.int16)
+        self.municipio = Column(np.int32)
+        self.eleicao = Column(np.int32)
+        self.cargo = Column(np.int16)
+        self.tipo = Column(np.int8)
+        self.codigo = Column(np.int32)
+        self.ufs = Categories()
+        self.votos = np.zeros(0, dtype=np.int64)
+        self.secoes = 0
+        # Votos ainda não somados: (índice da chave, quantidade).
+        self.pendentes = Column(np.int64)
+        self.quantidades = Column(np.int64)
+
+    @verificacao.stage("add_bu")
+    def add_bu(self, bu_decoded, uf=""):
+        municipio = bu_decoded['identificacaoSecao']['municipioZona']['municipio']
+        uf = self.ufs.code(uf)
+        for eleicao, cargo, tipo, codigo, votos in verificacao.extract_votes(bu_decoded):
+            chave = (uf, municipio, eleicao, cargo, tipo, codigo)
+            indice = self.indices.get(chave)
+            if indice is None:
+                indice = self.indices[chave] = len(self.indices)
+                for coluna, valor in zip((self.uf, self.municipio, self.eleicao,
+                                          self.cargo, self.tipo, self.codigo), chave):
+                    coluna.append(valor)
+            self.pendentes.append(indice)
+            self.quantidades.append(votos)
+        self.secoes += 1
+        if self.pendentes.size >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        somados = np.bincount(self.pendentes.values(), weights=self.quantidades.values(),
+                              minlength=len(self.indices)).astype(np.int64)
+        somados[:len(self.votos)] += self.votos
+        self.votos = somados
+        self.pendentes.size = 0
+        self.quantidades.size = 0
+
+    def totals(self, nivel="estado"):
+        """
+        Retorna {(grupo..., eleição, cargo, tipo de voto, votável): votos}
+        para o nível "municipio", "uf" ou "estado".
+        """
+        self.flush()
+        colunas = NIVEIS[nivel]
+        if not len(self.votos):
+            return {}
+        chaves = np.stack([getattr(self, c).values().astype(np.int64) for c in colunas], axis=1)
+        grupos, inverso = np.unique(chaves, axis=0, return_inverse=True)
+        somas = np.bincount(inverso.ravel(), weights=self.votos, minlength=len(grupos))
+        resultado = {}
+        for grupo, soma in zip(grupos.tolist(), somas.astype(np.int64).tolist()):
+            if colunas[0] == "uf":
+                grupo[0] = self.ufs.labels[grupo[0]]
+            resultado[tuple(grupo)] = soma
+        return resultado
+
+
+@verificacao.stage("verified_bu")
+def verified_bu(sign_path, bu_path, limits=verificacao.DECODE_LIMITS):
+    """
+    Conteúdo do .bu se o hash e a assinatura conferem com os envelopes de
+    assinaturas (read_envelopes e find_signed, como na verificação de uma
+    seção); None caso contrário.
+    """
+    envelopes, erros = verificacao.read_envelopes(sign_path, limits=limits)
+    if not envelopes:
+        raise verificacao.UntrustedInput("nenhum envelope de assinaturas válido" + "".join(
+            "; %s: %s" % erro for erro in erros))
+    entrada = verificacao.find_signed(verificacao.merge_signed_files(envelopes), envelopes, "bu")
+    with open(bu_path, 'rb') as f:
+        bu = f.read(limits.max_size + 1)
+    if len(bu) > limits.max_size:
+        raise verificacao.UntrustedInput("BU maior que %d bytes" % limits.max_size)
+    atual = verificacao.hash_file(bu)
+    if atual != entrada["hash"]:
+        return None
+    if not verificacao.check_signature(hashlib.sha512(atual).digest(), entrada["assinatura"],
+                                       entrada["pub_key"]):
+        return None
+    return bu
+
+
+def aggregate(diretorio, totals=None):
+    """
+    Soma os boletins verificados de todas as seções de `diretorio`. Retorna
+    (totais, lista de seções rejeitadas com o motivo).
+    """
+    totals = totals or VoteTotals()
+    rejeitadas = []
+    for secao in verificacao.iter_sections(diretorio):
+        verificacao.requisicao_atual.set(secao["secao"])
+        if secao["sign"] is None or secao["bu"] is None:
+            rejeitadas.append((secao["secao"], "arquivos ausentes"))
+            continue
+        try:
+            bu = verified_bu(secao["sign"], secao["bu"])
+        except Exception as e:
+            rejeitadas.append((secao["secao"], "envelope inválido: %r" % e))
+            continue
+        if bu is None:
+            rejeitadas.append((secao["secao"], "assinatura não confere"))
+            continue
+        try:
+            totals.add_bu(verificacao.decode_bu(bu), secao["uf"])
+        except Exception as e:
+            rejeitadas.append((secao["secao"], "BU inválido: %r" % e))
+    return totals, rejeitadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio")
+    parser.add_argument("--nivel", choices=NIVEIS, default="estado")
+    args = parser.parse_args()
+
+    totals, rejeitadas = aggregate(args.diretorio)
+    print("Seções somadas:", totals.secoes)
+    for secao, motivo in rejeitadas:
+        print("Rejeitada %s: %s" % (secao, motivo), file=sys.stderr)
+    for chave, votos in sorted(totals.totals(args.nivel).items()):
+        print("\t".join(str(c) for c in chave) + "\t" + str(votos))
+
+
+if __name__ == "__main__":
+    main()
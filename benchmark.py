@@ -0,0 +1,305 @@
+"""
+Medições de desempenho do urnaHash sobre arquivos sintéticos (fixtures.py).
+
+Cada etapa da verificação é medida isoladamente, em tempo e em memória
+alocada (tracemalloc). Com --salvar os tempos são
+gravados em JSON; com --referencia são comparados a uma medição anterior e o
+script termina com erro se alguma etapa ficar mais lenta que a tolerância.
+
+Com --escala-hash, mede também como o hash de vários arquivos em paralelo
+escala com o número de threads. Com --inicializacao, mede o tempo de
+inicialização (python -X importtime) da interface, do núcleo, de um worker
+do pool de verificação e de uma execução curta de linha de comando.
+
+Uso: python benchmark.py [--tamanho-log BYTES] [--repeticoes N]
+                         [--escala-hash 1,2,4,8 [--blocos 65536,1048576]]
+                         [--inicializacao]
+                         [--salvar ARQUIVO] [--referencia ARQUIVO] [--tolerancia 0.2]
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import zipfile
+from pathlib import Path
+
+import app
+import fixtures
+import verificacao
+
+
+def synthetic_assinatura(arquivos=11):
+    return verificacao.conv.encode("Assinatura", {"arquivosAssinados": [
+        {"nomeArquivo": "o00407-0100700090001.%03d" % i,
+         "assinatura": {"tamanho": 139, "hash": os.urandom(64), "assinatura": os.urandom(139)}}
+        for i in range(arquivos)]})
+
+
+def bench(resultados, nome, fn, repeticoes):
+    fn()
+    total = min(timeit.repeat(fn, number=repeticoes, repeat=3))
+    por_chamada = total / repeticoes
+    resultados[nome] = por_chamada
+    print("%-40s %12.1f us" % (nome, por_chamada * 1e6))
+    return por_chamada
+
+
+def bench_decode_assinaturas(resultados, arquivos, repeticoes):
+    conteudo = synthetic_assinatura(arquivos)
+    rapido = verificacao.fast_decode_assinatura(conteudo)
+    generico = verificacao.conv.decode("Assinatura", conteudo)
+    assert [a.as_dict() for a in rapido["arquivosAssinados"]] == generico["arquivosAssinados"], \
+        "Decodificador especializado diverge de conv.decode"
+
+    t_generico = bench(resultados, "conv.decode('Assinatura')",
+                       lambda: verificacao.conv.decode("Assinatura", conteudo), repeticoes)
+    t_rapido = bench(resultados, "fast_decode_assinatura",
+                     lambda: verificacao.fast_decode_assinatura(conteudo), repeticoes)
+    entidade = {"conteudoAutoAssinado": conteudo}
+    t_etapa = bench(resultados, "decode_assinaturas (sintético)",
+                    lambda: verificacao.decode_assinaturas(entidade), repeticoes)
+    print("%-40s %12.1fx" % ("Ganho por envelope", t_generico / t_rapido))
+    # decode_assinaturas deve custar o decodificador especializado mais o
+    # registro da etapa; uma validação extra do TLV antes dele dobraria o
+    # tempo e anularia o ganho sobre conv.decode.
+    assert t_etapa < t_rapido * 1.5 and t_etapa < t_generico, \
+        "decode_assinaturas (%.1f us) faz mais que fast_decode_assinatura (%.1f us)" % (
+            t_etapa * 1e6, t_rapido * 1e6)
+
+
+def bench_stages(resultados, paths, repeticoes):
+    with zipfile.ZipFile(paths["sign"]) as zip:
+        vscmr = zip.read(next(f for f in zip.namelist() if f.endswith(".vscmr")))
+    with zipfile.ZipFile(paths["log"]) as zip:
+        logjez = zip.read(next(f for f in zip.namelist() if f.endswith(".logjez")))
+    envelope = verificacao.decode_envelope(vscmr)
+    assinaturas = verificacao.decode_assinaturas(envelope)
+    pub_key = verificacao.extract_pubkey(envelope)
+    hash_log = verificacao.hash_file(logjez)
+    assinatura_log = verificacao.extract_hash_signature(assinaturas, "log", "assinatura")
+    mensagem = hashlib.sha512(hash_log).digest()
+    assert verificacao.check_signature(mensagem, assinatura_log, pub_key), "Fixture com assinatura inválida"
+
+    def full():
+        section = verificacao.read_section(paths["sign"], paths["log"], paths["bu"])
+        assert verificacao.verify_section(section, "log") and verificacao.verify_section(section, "bu")
+        return app.build_section_output(section, "bench")
+
+    bench(resultados, "decode_envelope", lambda: verificacao.decode_envelope(vscmr), repeticoes)
+    bench(resultados, "decode_assinaturas", lambda: verificacao.decode_assinaturas(envelope), repeticoes)
+    bench(resultados, "decode_signature_file (.vscmr)",
+          lambda: verificacao.decode_signature_file("bench.vscmr", vscmr), repeticoes)
+    # Sem o cache de pubkey_from_cert, para medir a decodificação da chave.
+    bench(resultados, "extract_pubkey",
+          lambda: verificacao.pubkey_from_cert.__wrapped__(envelope['certificadoDigital']), repeticoes)
+    bench(resultados, "hash_file (log)", lambda: verificacao.hash_file(logjez), repeticoes)
+    bench(resultados, "check_signature",
+          lambda: verificacao.check_signature(mensagem, assinatura_log, pub_key), max(1, repeticoes // 10))
+    # Não é o handler contents() do Shiny: só a leitura, a verificação e o HTML.
+    bench(resultados, "read_section + verify + HTML da seção", full,
+          max(1, repeticoes // 10))
+
+
+def bench_batch(resultados, assinaturas):
+    """
+    Tempo por assinatura da verificação individual (ecpy) e em lote, com
+    duas assinaturas por chave, como o log e o BU de uma urna.
+    """
+    from ecpy.ecdsa import ECDSA
+
+    signer = ECDSA()
+    itens = []
+    for i in range(assinaturas):
+        if i % 2 == 0:
+            key = fixtures.make_key()
+            pub_key = {"pubkey": key.get_public_key(), "signer": signer, "cn": ""}
+        mensagem = hashlib.sha512(os.urandom(64)).digest()
+        itens.append((mensagem, signer.sign(mensagem, key), pub_key))
+    assert verificacao.check_signature_batch(itens) == [True] * assinaturas
+
+    individual = min(timeit.repeat(lambda: [verificacao.check_signature(*item) for item in itens],
+                                   number=1, repeat=3)) / assinaturas
+    lote = min(timeit.repeat(lambda: verificacao.check_signature_batch(itens),
+                             number=1, repeat=3)) / assinaturas
+    resultados["check_signature (por assinatura)"] = individual
+    resultados["check_signature_batch (por assinatura)"] = lote
+    print("%-40s %12.1f us" % ("check_signature (por assinatura)", individual * 1e6))
+    print("%-40s %12.1f us" % ("check_signature_batch (por assinatura)", lote * 1e6))
+    print("%-40s %12.1fx" % ("Ganho da verificação em lote", individual / lote))
+
+
+def bench_memory(resultados, paths):
+    """
+    Pico e memória retida por etapa (tracemalloc) numa verificação completa,
+    para acompanhar regressões de memória entre versões.
+    """
+    tracer = verificacao.MemoryTracer()
+    tracer.start()
+    try:
+        section = verificacao.read_section(paths["sign"], paths["log"], paths["bu"])
+        verificacao.verify_section(section, "log")
+        verificacao.verify_section(section, "bu")
+        verificacao.decode_bu(Path(paths["bu"]).read_bytes())
+        etapas = tracer.report()["etapas"]
+    finally:
+        tracer.stop()
+    for etapa, total in sorted(etapas.items()):
+        for medida in ("pico_max", "retido_medio"):
+            nome = "memória %s %s" % (medida, etapa)
+            resultados[nome] = total[medida]
+            print("%-40s %12.1f KB" % (nome, total[medida] / 1024))
+
+
+def bench_hash_scaling(resultados, arquivos, tamanho, workers, chunk_sizes):
+    """
+    Vazão do HashService para `arquivos` arquivos de `tamanho` bytes, com
+    cada número de threads e tamanho de bloco. O ganho é relativo a uma
+    thread com o mesmo bloco.
+    """
+    with tempfile.TemporaryDirectory() as diretorio:
+        paths = []
+        for i in range(arquivos):
+            paths.append(os.path.join(diretorio, "%d.bin" % i))
+            with open(paths[-1], "wb") as f:
+                f.write(os.urandom(tamanho))
+        esperado = [verificacao.hash_file(Path(p).read_bytes()) for p in paths]
+        print("%-40s %8s %10s %8s" % ("hash (%d x %d MB)" % (arquivos, tamanho >> 20),
+                                      "threads", "MB/s", "ganho"))
+        for chunk_size in chunk_sizes:
+            base = None
+            for n in workers:
+                service = verificacao.HashService(workers=n, chunk_size=chunk_size)
+                aberturas = [functools.partial(open, p, "rb") for p in paths]
+                assert service.hash_all(aberturas) == esperado
+                tempo = min(timeit.repeat(lambda: service.hash_all(aberturas), number=1, repeat=3))
+                service.executor.shutdown()
+                base = base or tempo
+                resultados["hash_all chunk=%d threads=%d" % (chunk_size, n)] = tempo
+                print("%-40s %8d %10.1f %7.2fx" % ("bloco %d KB" % (chunk_size >> 10), n,
+                                                  arquivos * tamanho / tempo / 2 ** 20,
+                                                  base / tempo))
+
+
+def import_time(argumentos):
+    """
+    Executa `python -X importtime ARGUMENTOS` neste diretório. Retorna o
+    tempo total do processo e a soma dos imports de primeiro nível, em
+    segundos, e os três módulos de primeiro nível mais caros.
+    """
+    inicio = time.perf_counter()
+    saida = subprocess.run([sys.executable, "-X", "importtime", *argumentos],
+                           cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True, check=True).stderr
+    total = time.perf_counter() - inicio
+    modulos = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:"):
+            continue
+        _, acumulado, nome = linha.split("|")
+        # Os imports aninhados vêm indentados sob o módulo que os fez.
+        if acumulado.strip().isdigit() and not nome[1:].startswith(" "):
+            modulos.append((int(acumulado) / 1e6, nome.strip()))
+    return total, sum(t for t, _ in modulos), sorted(modulos, reverse=True)[:3]
+
+
+def bench_startup(resultados, paths, repeticoes=3):
+    """
+    Inicialização de um processo novo em cada cenário, o melhor de
+    `repeticoes`. "interface (compilação no import)" reproduz o import de
+    antes da separação entre app e verificacao, que compilava as três
+    especificações ASN.1 a partir do texto.
+    """
+    with zipfile.ZipFile(paths["sign"]) as pacote:
+        vscmr = pacote.read(next(n for n in pacote.namelist() if n.endswith(".vscmr")))
+    cert = os.path.join(os.path.dirname(paths["sign"]), "certificado.der")
+    with open(cert, "wb") as f:
+        f.write(verificacao.decode_envelope(vscmr)["certificadoDigital"])
+    cenarios = [
+        ("interface (compilação no import)",
+         ["-c", "import app, asn1tools, verificacao\n"
+                "for texto, codec in verificacao.ESQUEMAS.values():\n"
+                "    asn1tools.compile_string(texto, codec=codec)"]),
+        ("interface", ["-c", "import app"]),
+        ("núcleo", ["-c", "import verificacao"]),
+        # O que um worker do verification_pool faz antes da primeira tarefa.
+        ("worker de verificação",
+         ["-c", "import pathlib, verificacao; "
+                "verificacao.pubkey_from_cert(pathlib.Path(%r).read_bytes())" % cert]),
+        ("logjez.py (uma seção)", ["logjez.py", os.path.dirname(paths["sign"]),
+                                   "--tipo", "NENHUM"]),
+    ]
+    print("%-40s %12s %12s  %s" % ("inicialização", "processo", "imports", "mais caros"))
+    for nome, argumentos in cenarios:
+        total, imports, modulos = min(import_time(argumentos) for _ in range(repeticoes))
+        resultados["inicialização " + nome] = total
+        print("%-40s %9.1f ms %9.1f ms  %s" % (nome, total * 1e3, imports * 1e3, ", ".join(
+            "%s %.0f ms" % (modulo, t * 1e3) for t, modulo in modulos)))
+
+
+def compare(resultados, referencia, tolerancia):
+    regressoes = []
+    for nome, anterior in referencia.items():
+        atual = resultados.get(nome)
+        if atual is not None and atual > anterior * (1 + tolerancia):
+            regressoes.append(nome)
+            escala, unidade = (1 / 1024, "KB") if nome.startswith("memória") else (1e6, "us")
+            print("REGRESSÃO %-30s %10.1f %s -> %10.1f %s" % (
+                nome, anterior * escala, unidade, atual * escala, unidade))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arquivos", type=int, default=11,
+                        help="Arquivos assinados por envelope sintético")
+    parser.add_argument("--tamanho-bu", type=int, default=20000)
+    parser.add_argument("--tamanho-log", type=int, default=500000)
+    parser.add_argument("--repeticoes", type=int, default=100)
+    parser.add_argument("--lote", type=int, default=32,
+                        help="Assinaturas na medição da verificação em lote")
+    parser.add_argument("--escala-hash", type=lambda s: [int(n) for n in s.split(",")],
+                        help="Números de threads para o HashService, separados por vírgula")
+    parser.add_argument("--blocos", default=[64 << 10, 1 << 20],
+                        type=lambda s: [int(n) for n in s.split(",")],
+                        help="Tamanhos de bloco (bytes) para --escala-hash")
+    parser.add_argument("--arquivos-hash", type=int, default=8)
+    parser.add_argument("--tamanho-hash", type=int, default=32 << 20)
+    parser.add_argument("--inicializacao", action="store_true",
+                        help="Mede o tempo de inicialização dos processos")
+    parser.add_argument("--salvar", help="Grava os tempos medidos em JSON")
+    parser.add_argument("--referencia", help="JSON de uma medição anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    resultados = {}
+    bench_decode_assinaturas(resultados, args.arquivos, args.repeticoes)
+    with tempfile.TemporaryDirectory() as diretorio:
+        paths = fixtures.make_section(diretorio, tamanho_bu=args.tamanho_bu,
+                                      tamanho_log=args.tamanho_log)
+        bench_stages(resultados, paths, args.repeticoes)
+        bench_memory(resultados, paths)
+        if args.inicializacao:
+            bench_startup(resultados, paths)
+    bench_batch(resultados, args.lote)
+    if args.escala_hash:
+        bench_hash_scaling(resultados, args.arquivos_hash, args.tamanho_hash,
+                           args.escala_hash, args.blocos)
+
+    if args.salvar:
+        with open(args.salvar, "w") as f:
+            json.dump(resultados, f, indent=2)
+    if args.referencia:
+        with open(args.referencia) as f:
+            if compare(resultados, json.load(f), args.tolerancia):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
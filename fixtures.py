@@ -0,0 +1,332 @@
+"""
+Gerador de arquivos sintéticos de urna para testes de desempenho.
+
+Cria chaves secp521r1 locais, certificados X.509 assinados por uma AC
+sintética e envelopes EntidadeAssinaturaResultado codificados com as mesmas
+especificações usadas pelo aplicativo (`conv` e `x509_conv`). Para cada
+seção são gravados o ZIP de assinaturas (.vscmr), o ZIP do Log de Urna
+(.logjez) e o Boletim de Urna (.bu), no mesmo formato dos arquivos do TSE.
+
+Uso: python fixtures.py DIRETORIO [--secoes N] [--tamanho-bu BYTES] [--tamanho-log BYTES]
+"""
+import argparse
+import datetime
+import hashlib
+import lzma
+import os
+import struct
+import zlib
+import random
+import zipfile
+from pathlib import Path
+
+from ecpy.curves import Curve
+from ecpy.ecdsa import ECDSA
+from ecpy.keys import ECPrivateKey
+
+from verificacao import bu_conv, conv, x509_conv, EC_CURVES
+
+CURVE = Curve.get_curve('secp521r1')
+SECP521R1 = next(der for der, nome in EC_CURVES.items() if nome == 'secp521r1')
+ECDSA_SHA512 = '1.2.840.10045.4.3.4'
+
+# Posições de .bu e .logjez em arquivosAssinados, como em extract_hash_signature.
+EXTENSOES = ['bu', 'busa', 'imgbu', 'imgbusa', 'rdv', 'rdvsa', 'vscsa',
+             'vscrd', 'vscbu', 'dvs', 'logjez']
+
+
+def make_key():
+    return ECPrivateKey(random.SystemRandom().randrange(1, CURVE.order), CURVE)
+
+
+def sign(key, mensagem):
+    return ECDSA().sign(mensagem, key)
+
+
+def _name(cn):
+    valor = cn.encode('utf-8')
+    return ('rdnSequence', [[{'type': '2.5.4.3',
+                              'value': bytes([0x0c, len(valor)]) + valor}]])
+
+
+def make_certificate(cn, key, issuer_cn=None, issuer_key=None, serial=1, ca=False,
+                     validade=(datetime.datetime(2022, 1, 1), datetime.datetime(2032, 1, 1))):
+    """
+    Certificado DER para a chave `key`. Sem emissor, o certificado é
+    auto-assinado; com `ca`, leva a extensão basicConstraints cA=TRUE.
+    """
+    if issuer_key is None:
+        issuer_cn, issuer_key = cn, key
+    ponto = bytes(CURVE.encode_point(key.get_public_key().W))
+    tbs = {
+        'version': 2,
+        'serialNumber': serial,
+        'signature': {'algorithm': ECDSA_SHA512},
+        'issuer': _name(issuer_cn),
+        'validity': {
+            'notBefore': ('utcTime', validade[0]),
+            'notAfter': ('utcTime', validade[1]),
+        },
+        'subject': _name(cn),
+        'subjectPublicKeyInfo': {
+            'algorithm': {'algorithm': '1.2.840.10045.2.1', 'parameters': SECP521R1},
+            'subjectPublicKey': (ponto, 8 * len(ponto)),
+        },
+    }
+    if ca:
+        tbs['extensions'] = [{'extnID': '2.5.29.19', 'critical': True,
+                              'extnValue': x509_conv.encode('BasicConstraints', {'cA': True})}]
+    assinatura = sign(issuer_key, hashlib.sha512(
+        x509_conv.encode('TBSCertificate', tbs)).digest())
+    return x509_conv.encode('Certificate', {
+        'tbsCertificate': tbs,
+        'signatureAlgorithm': {'algorithm': ECDSA_SHA512},
+        'signature': (assinatura, 8 * len(assinatura)),
+    })
+
+
+def make_ca(cn="AC Urnas Sintéticas"):
+    key = make_key()
+    return {"cn": cn, "key": key, "cert": make_certificate(cn, key, ca=True)}
+
+
+def signed_digest(key, conteudo):
+    hash = hashlib.sha512(conteudo).digest()
+    assinatura = sign(key, hashlib.sha512(hash).digest())
+    return {'tamanho': len(assinatura), 'hash': hash, 'assinatura': assinatura}
+
+
+def make_entidade(key, cert, secao, conteudo):
+    return {
+        'dataHoraCriacao': '20221030T170000',
+        'versao': 2,
+        'autoAssinado': {
+            'usuario': {'nomeUsuario': secao, 'serial': 20220801},
+            'algoritmoHash': {'algoritmo': 4},
+            'algoritmoAssinatura': {'algoritmo': 2, 'bits': 521},
+            'assinatura': signed_digest(key, conteudo),
+        },
+        'conteudoAutoAssinado': conteudo,
+        'certificadoDigital': cert,
+        'conjuntoChave': 'SINTETICO',
+    }
+
+
+def make_envelope(key, cert, secao, arquivos):
+    """
+    Envelope EntidadeAssinaturaResultado com `arquivos` (lista de pares
+    nome, conteúdo) assinados pela mesma chave nas entidades HW e SW.
+    """
+    conteudo = conv.encode('Assinatura', {'arquivosAssinados': [
+        {'nomeArquivo': nome, 'assinatura': signed_digest(key, dados)}
+        for nome, dados in arquivos]})
+    return conv.encode('EntidadeAssinaturaResultado', {
+        'modeloUrna': 20,
+        'assinaturaSW': make_entidade(key, cert, secao, conteudo),
+        'assinaturaHW': make_entidade(key, cert, secao, conteudo),
+    })
+
+
+def make_bu(secao, tamanho=20000):
+    """
+    Boletim de urna (EntidadeEnvelopeGenerico com EntidadeBoletimUrna) com
+    votos aleatórios para presidente e, para chegar a cerca de `tamanho`
+    bytes, candidatos a deputado federal.
+    """
+    rng = random.Random(secao)
+    municipio, zona, numero = int(secao[:5]), int(secao[5:9]), int(secao[9:])
+    identificacao = {'municipioZona': {'municipio': municipio, 'zona': zona},
+                     'local': 1015, 'secao': numero}
+    cabecalho = {'dataGeracao': '20221030T170500', 'idEleitoral': ('idEleicao', 545)}
+    urna = {
+        'tipoUrna': 1,
+        'versaoVotacao': '8.26.0.0 - Onça-pintada',
+        'correspondenciaResultado': {
+            'identificacao': ('identificacaoSecaoEleitoral', identificacao),
+            'carga': {'numeroInternoUrna': 2000000 + numero, 'numeroSerieFC': os.urandom(4),
+                      'dataHoraCarga': '20221020T101500', 'codigoCarga': secao},
+        },
+        'tipoArquivo': 1,
+        'numeroSerieFV': os.urandom(4),
+    }
+
+    def votaveis(numeros):
+        totais = [{'tipoVoto': 1, 'quantidadeVotos': rng.randint(0, 200),
+                   'identificacaoVotavel': {'partido': n // 10 ** (len(str(n)) - 2), 'codigo': n},
+                   'assinatura': os.urandom(16)} for n in numeros]
+        totais.append({'tipoVoto': 2, 'quantidadeVotos': rng.randint(0, 20)})
+        totais.append({'tipoVoto': 3, 'quantidadeVotos': rng.randint(0, 20)})
+        return totais
+
+    deputados = [1000 + i for i in range(max(1, tamanho // 40))]
+    bu = {
+        'cabecalho': cabecalho,
+        'fase': 2,
+        'urna': urna,
+        'identificacaoSecao': identificacao,
+        'dataHoraEmissao': '20221030T170200',
+        'dadosSecaoSA': ('dadosSecao', {'dataHoraAbertura': '20221030T080000',
+                                        'dataHoraEncerramento': '20221030T170000'}),
+        'qtdEleitoresLibCodigo': 0,
+        'qtdEleitoresCompBiometrico': rng.randint(0, 400),
+        'resultadosVotacaoPorEleicao': [{
+            'idEleicao': 545,
+            'qtdEleitoresAptos': 400,
+            'resultadosVotacao': [
+                {'tipoCargo': 1, 'qtdComparecimento': 350, 'totaisVotosCargo': [
+                    {'codigoCargo': ('cargoConstitucional', 1), 'ordemImpressao': 1,
+                     'votosVotaveis': votaveis([12, 13, 15, 22])}]},
+                {'tipoCargo': 2, 'qtdComparecimento': 350, 'totaisVotosCargo': [
+                    {'codigoCargo': ('cargoConstitucional', 6), 'ordemImpressao': 2,
+                     'votosVotaveis': votaveis(deputados)}]},
+            ],
+        }],
+    }
+    return bu_conv.encode('EntidadeEnvelopeGenerico', {
+        'cabecalho': cabecalho,
+        'fase': 2,
+        'urna': urna,
+        'identificacao': ('identificacaoSecaoEleitoral', identificacao),
+        'tipoEnvelope': 1,
+        'conteudo': bu_conv.encode('EntidadeBoletimUrna', bu),
+    })
+
+
+# (tipo, aplicação, mensagem, peso)
+MENSAGENS_LOG = [
+    ("INFO", "VOTA", "Urna pronta para receber votos", 1),
+    ("INFO", "VOTA", "Eleitor foi habilitado", 30),
+    ("INFO", "VOTA", "Voto confirmado para [Deputado Federal]", 30),
+    ("INFO", "VOTA", "Voto confirmado para [Presidente]", 30),
+    ("INFO", "VOTA", "O voto do eleitor foi computado", 30),
+    ("ALERTA", "VOTA", "Eleitor não reconhecido pela biometria", 3),
+    ("ERRO", "SCUE", "Erro ao acessar mídia de resultado", 1),
+]
+
+
+def number_7z(valor):
+    for extras in range(8):
+        if valor < 1 << (8 * extras + 7 - extras):
+            primeiro = (0xff00 >> extras) & 0xff | (valor >> (8 * extras))
+            return bytes([primeiro]) + valor.to_bytes(8, "little")[:extras]
+    return b"\xff" + valor.to_bytes(8, "little")
+
+
+def make_7z(nome, conteudo):
+    """
+    Arquivo 7z com um único arquivo compactado em LZMA e cabeçalho não
+    codificado, como o .logjez da urna.
+    """
+    props = {"dict_size": 1 << 20, "lc": 3, "lp": 0, "pb": 2}
+    compactado = lzma.compress(conteudo, format=lzma.FORMAT_RAW,
+                               filters=[dict(id=lzma.FILTER_LZMA1, **props)])
+    propriedades = bytes([(props["pb"] * 5 + props["lp"]) * 9 + props["lc"]]) + \
+        struct.pack("<I", props["dict_size"])
+    nome = nome.encode("utf-16-le") + b"\x00\x00"
+    cabecalho = (
+        b"\x01\x04"                                          # kHeader, kMainStreamsInfo
+        + b"\x06" + number_7z(0) + number_7z(1)               # kPackInfo
+        + b"\x09" + number_7z(len(compactado)) + b"\x00"
+        + b"\x07\x0b" + number_7z(1) + b"\x00"               # kUnPackInfo, kFolder
+        + number_7z(1) + b"\x23\x03\x01\x01" + number_7z(len(propriedades)) + propriedades
+        + b"\x0c" + number_7z(len(conteudo)) + b"\x00"
+        + b"\x08\x0a\x01" + struct.pack("<I", zlib.crc32(conteudo)) + b"\x00"  # kSubStreamsInfo
+        + b"\x00"                                             # fim de MainStreamsInfo
+        + b"\x05" + number_7z(1)                              # kFilesInfo
+        + b"\x11" + number_7z(len(nome) + 1) + b"\x00" + nome + b"\x00"
+        + b"\x00")
+    inicio = struct.pack("<QQI", len(compactado), len(cabecalho), zlib.crc32(cabecalho))
+    return b"7z\xbc\xaf\x27\x1c\x00\x04" + struct.pack("<I", zlib.crc32(inicio)) + \
+        inicio + compactado + cabecalho
+
+
+def make_log(secao, tamanho=500000):
+    """
+    Texto de log (logd.dat) com cerca de `tamanho` bytes de eventos.
+    """
+    rng = random.Random(secao)
+    pesos = [m[3] for m in MENSAGENS_LOG]
+    linhas = []
+    total = 0
+    segundos = 8 * 3600
+    while total < tamanho:
+        tipo, aplicacao, mensagem, _ = rng.choices(MENSAGENS_LOG, pesos)[0]
+        segundos += rng.randrange(30)
+        linha = "30/10/2022 %02d:%02d:%02d\t%s\t%08d\t%s\t%s\t%016X" % (
+            segundos // 3600 % 24, segundos // 60 % 60, segundos % 60, tipo,
+            int(secao[-8:]), aplicacao, mensagem, rng.getrandbits(64))
+        linhas.append(linha)
+        total += len(linha) + 1
+    return ("\n".join(linhas) + "\n").encode("latin-1")
+
+
+def make_section(diretorio, secao="0100700090001", tamanho_bu=20000,
+                 tamanho_log=500000, ca=None):
+    """
+    Grava os três arquivos de uma seção em `diretorio` e retorna seus caminhos.
+    """
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    base = "o00407-" + secao
+    key = make_key()
+    if ca is None:
+        cert = make_certificate("UE: " + secao, key)
+    else:
+        cert = make_certificate("UE: " + secao, key, ca["cn"], ca["key"])
+
+    arquivos = []
+    for ext in EXTENSOES:
+        if ext == 'bu':
+            dados = make_bu(secao, tamanho_bu)
+        elif ext == 'logjez':
+            dados = make_7z("logd.dat", make_log(secao, tamanho_log))
+        else:
+            dados = os.urandom(256)
+        arquivos.append((base + "." + ext, dados))
+    conteudo = dict(arquivos)
+
+    paths = {
+        "sign": diretorio / (base + "-assinaturas.zip"),
+        "log": diretorio / (base + "-log.zip"),
+        "bu": diretorio / (base + ".bu"),
+    }
+    with zipfile.ZipFile(paths["sign"], 'w') as zip:
+        zip.writestr(base + ".vscmr", make_envelope(key, cert, secao, arquivos))
+        # Os arquivos do sistema de apuração também têm envelope próprio.
+        zip.writestr(base + ".vscsa", make_envelope(
+            key, cert, secao, [(nome, dados) for nome, dados in arquivos
+                               if nome.endswith("sa") and ".vsc" not in nome]))
+    with zipfile.ZipFile(paths["log"], 'w') as zip:
+        zip.writestr(base + ".logjez", conteudo[base + ".logjez"])
+    paths["bu"].write_bytes(conteudo[base + ".bu"])
+    return paths
+
+
+def make_dataset(diretorio, secoes=1, tamanho_bu=20000, tamanho_log=500000):
+    """
+    Gera `secoes` seções assinadas por uma mesma AC e grava o certificado
+    da AC em `diretorio/certs`, pronto para URNAHASH_TRUST_STORE.
+    """
+    diretorio = Path(diretorio)
+    ca = make_ca()
+    (diretorio / "certs").mkdir(parents=True, exist_ok=True)
+    (diretorio / "certs" / "ac.der").write_bytes(ca["cert"])
+    return [make_section(diretorio, "%013d" % (100700090001 + i),
+                         tamanho_bu, tamanho_log, ca)
+            for i in range(secoes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio")
+    parser.add_argument("--secoes", type=int, default=1)
+    parser.add_argument("--tamanho-bu", type=int, default=20000)
+    parser.add_argument("--tamanho-log", type=int, default=500000)
+    args = parser.parse_args()
+    for paths in make_dataset(args.diretorio, args.secoes, args.tamanho_bu, args.tamanho_log):
+        print(paths["sign"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Execução do urnaHash com vários processos pré-aquecidos.
+
+O processo pai importa o aplicativo (compilando as especificações ASN.1),
+carrega as curvas e o repositório de certificados, aquece os caches com as
+seções de URNAHASH_WARMUP_DIR (se definido) e só então cria os
+workers com fork. As páginas já inicializadas ficam compartilhadas por
+cópia-na-escrita, então cada worker começa pronto e ocupa menos memória que
+N inicializações independentes (compare com --frio).
+
+O Shiny exige que o websocket e os uploads de uma sessão cheguem ao mesmo
+processo. O pai escuta na porta pública e encaminha cada requisição a um
+worker: o indicado pelo cookie de afinidade, que a primeira resposta a um
+navegador cria, ou senão um escolhido pelo endereço do cliente. Cada
+requisição leva o endereço de quem conectou no X-Forwarded-For, e os
+workers confiam só nos saltos acrescentados pelo launcher e pelos --proxies
+na frente dele.
+
+Esse proxy é um só processo Python e abre uma conexão nova com o worker a
+cada requisição, então limita a vazão total. A coluna "CPU pai" de
+`python loadtest.py --workers N` mostra a sua ocupação. Com 2 workers, 8
+sessões simultâneas e logs de 100 KB, ela ficou em 3-5% (7-9 ms de CPU por
+sessão, um teto de mais de 100 sessões/s), enquanto a verificação nos
+workers fica em cerca de 3 sessões/s por CPU. Acima disso, use um proxy
+externo com afinidade (cookie urnahash_worker) na frente de vários
+launchers ou workers.
+
+Uso: python launcher.py [--workers N] [--host 127.0.0.1] [--port 8000] [--proxies 0]
+                        [--frio]
+"""
+import argparse
+import asyncio
+import gc
+import hashlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+
+def warm_up():
+    import app
+    import verificacao
+
+    verificacao.preload()
+    verificacao.trust_store()
+    # Os caches preenchidos aqui são herdados por todos os workers.
+    app.warmup.run()
+    return app
+
+
+def bind(host, port=0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def fork_worker(sock, log_level):
+    pid = os.fork()
+    if pid:
+        return pid
+    import uvicorn
+    import app
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app.app, log_level=log_level)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        app.profiler.stop()
+        os._exit(0)
+
+
+def spawn_cold_worker(sock, log_level):
+    # Worker independente, para comparação: importa e compila tudo sozinho.
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--fd", str(sock.fileno()),
+         "--log-level", log_level],
+        pass_fds=[sock.fileno()]).pid
+
+
+COOKIE = b"urnahash_worker"
+
+
+def parse_head(head):
+    """
+    (linha inicial, [(nome em minúsculas, valor)]) de um cabeçalho HTTP/1.1.
+    """
+    linhas = head[:-4].split(b"\r\n")
+    campos = []
+    for linha in linhas[1:]:
+        nome, _, valor = linha.partition(b":")
+        campos.append((nome.strip().lower(), valor.strip()))
+    return linhas[0], campos
+
+
+def build_head(inicial, campos):
+    return inicial + b"\r\n" + b"".join(
+        nome + b": " + valor + b"\r\n" for nome, valor in campos) + b"\r\n"
+
+
+def header(campos, nome):
+    return next((valor for n, valor in campos if n == nome), None)
+
+
+def forwarded_hops(campos, peer):
+    # Endereços de X-Forwarded-For seguidos do de quem conectou ao launcher.
+    return [endereco.strip() for nome, valor in campos if nome == b"x-forwarded-for"
+            for endereco in valor.split(b",") if endereco.strip()] + [peer.encode()]
+
+
+def choose_worker(campos, cliente, workers):
+    """
+    (índice do worker, se veio do cookie): o do cookie de afinidade, se a
+    requisição tem um válido, ou senão um derivado do endereço do cliente.
+    """
+    for nome, valor in campos:
+        if nome != b"cookie":
+            continue
+        for par in valor.split(b";"):
+            chave, _, indice = par.strip().partition(b"=")
+            if chave == COOKIE and indice.isdigit() and int(indice) < workers:
+                return int(indice), True
+    return int.from_bytes(hashlib.sha1(cliente).digest()[:4], "big") % workers, False
+
+
+async def copy_exactly(reader, writer, n):
+    while n:
+        data = await reader.read(min(n, 65536))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", n)
+        writer.write(data)
+        await writer.drain()
+        n -= len(data)
+
+
+async def copy_body(reader, writer, campos):
+    """
+    Copia o corpo de uma mensagem HTTP com Content-Length ou chunked.
+    Retorna False se a mensagem não tem tamanho definido.
+    """
+    if b"chunked" in (header(campos, b"transfer-encoding") or b"").lower():
+        while True:
+            linha = await reader.readuntil(b"\r\n")
+            writer.write(linha)
+            tamanho = int(linha.split(b";")[0], 16)
+            if not tamanho:
+                # Trailers, até a linha vazia.
+                while linha != b"\r\n":
+                    linha = await reader.readuntil(b"\r\n")
+                    writer.write(linha)
+                await writer.drain()
+                return True
+            await copy_exactly(reader, writer, tamanho + 2)
+    tamanho = header(campos, b"content-length")
+    if tamanho is None:
+        return False
+    await copy_exactly(reader, writer, int(tamanho))
+    return True
+
+
+async def pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def forward(reader, writer, inicial, campos, destino, set_cookie):
+    """
+    Encaminha uma requisição a um worker, numa conexão só para ela, e copia
+    a resposta. Retorna se a conexão do cliente pode continuar aberta.
+    """
+    up_reader, up_writer = await asyncio.open_connection(*destino)
+    try:
+        upgrade = b"upgrade" in (header(campos, b"connection") or b"").lower()
+        if not upgrade:
+            # Sem Expect, o worker não manda respostas 100 Continue.
+            campos = [(n, v) for n, v in campos
+                      if n not in (b"connection", b"keep-alive", b"expect")]
+            campos.append((b"connection", b"close"))
+        up_writer.write(build_head(inicial, campos))
+        if upgrade:
+            # Websocket: a conexão passa a ser só deste worker.
+            await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+            return False
+        # Uma requisição sem Content-Length nem chunked não tem corpo.
+        await copy_body(reader, up_writer, campos)
+        await up_writer.drain()
+        resposta = await up_reader.readuntil(b"\r\n\r\n")
+        status, resposta_campos = parse_head(resposta)
+        delimitada = header(resposta_campos, b"content-length") is not None or \
+            b"chunked" in (header(resposta_campos, b"transfer-encoding") or b"").lower()
+        if delimitada:
+            resposta_campos = [(n, v) for n, v in resposta_campos if n != b"connection"]
+        if set_cookie is not None:
+            resposta_campos.append((b"set-cookie", COOKIE + b"=" + set_cookie +
+                                    b"; Path=/; HttpOnly; SameSite=Lax"))
+        writer.write(build_head(status, resposta_campos))
+        if not delimitada or inicial.startswith(b"HEAD "):
+            # Sem tamanho, o fim da resposta é o fim da conexão do worker.
+            while data := await up_reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+            return delimitada
+        await copy_body(up_reader, writer, resposta_campos)
+        return True
+    finally:
+        up_writer.close()
+
+
+async def proxy(host, port, destinos, proxies=0):
+    """
+    Encaminha cada requisição (não cada conexão) a um worker. O worker é o
+    do cookie de afinidade, que é criado na primeira resposta a um
+    navegador, ou senão o do endereço do cliente: o salto mais à direita de
+    X-Forwarded-For que não é um dos `proxies` confiáveis na frente do
+    launcher. O endereço de quem conectou é acrescentado ao X-Forwarded-For.
+    """
+    async def handle(reader, writer):
+        peer = writer.get_extra_info("peername")[0]
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                inicial, campos = parse_head(head)
+                saltos = forwarded_hops(campos, peer)
+                cliente = saltos[max(0, len(saltos) - 1 - proxies)]
+                indice, do_cookie = choose_worker(campos, cliente, len(destinos))
+                campos = [(n, v) for n, v in campos if n != b"x-forwarded-for"]
+                campos.append((b"x-forwarded-for", b", ".join(saltos)))
+                continuar = await forward(reader, writer, inicial, campos, destinos[indice],
+                                          None if do_cookie else str(indice).encode())
+                fechar = (header(campos, b"connection") or b"").lower() == b"close" or \
+                    inicial.endswith(b"HTTP/1.0")
+                if not continuar or fechar:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            return
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--proxies", type=int, default=0,
+                        help="Proxies confiáveis na frente do launcher (X-Forwarded-For)")
+    parser.add_argument("--frio", action="store_true",
+                        help="Inicia workers independentes, sem pré-aquecimento")
+    args = parser.parse_args()
+
+    inicio = time.monotonic()
+    # Os workers confiam no salto acrescentado pelo launcher e nos anteriores.
+    os.environ["URNAHASH_PROXIES"] = str(args.proxies + 1)
+    sockets = [bind("127.0.0.1") for _ in range(args.workers)]
+    if args.frio:
+        pids = [spawn_cold_worker(sock, args.log_level) for sock in sockets]
+    else:
+        warm_up()
+        aquecido = time.monotonic()
+        print("Aplicativo aquecido em %.2f s" % (aquecido - inicio), flush=True)
+        # Objetos criados até aqui não serão mais visitados pelo coletor de
+        # lixo, que de outro modo tocaria (e copiaria) as páginas compartilhadas.
+        gc.collect()
+        gc.freeze()
+        pids = [fork_worker(sock, args.log_level) for sock in sockets]
+    print("%d workers iniciados em %.2f s" % (len(pids), time.monotonic() - inicio), flush=True)
+
+    destinos = [sock.getsockname() for sock in sockets]
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(proxy(args.host, args.port, destinos, args.proxies))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Teste de carga local do urnaHash.
+
+Inicia o aplicativo num uvicorn local (ou usa um servidor já em execução com
+--url) e abre N sessões Shiny simultâneas por websocket. Cada sessão envia os
+três arquivos de uma seção sintética (fixtures.py) e espera até que `contents`
+e todos os veredictos progressivos estejam renderizados. Para cada nível de
+concorrência são informados vazão, percentis de latência, respostas de
+servidor ocupado, a memória residente (RSS) do servidor e a ocupação de CPU
+do processo principal (com --workers, o proxy do launcher).
+
+Uso: python loadtest.py [--niveis 1,2,4,8] [--sessoes 16] [--url http://127.0.0.1:8000]
+                        [--workers N [--frio]]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import websockets
+
+import fixtures
+
+
+class ShinyClient:
+    """
+    Cliente mínimo do protocolo de websocket do Shiny: init, upload de
+    arquivos e recebimento de saídas.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.ws_url = "ws" + self.url[len("http"):] + "/websocket/"
+        self.tags = itertools.count()
+        self.received = []
+        self.ws = None
+        self.headers = {}
+
+    async def __aenter__(self):
+        # Como um navegador, carrega a página antes e devolve o cookie de
+        # afinidade do launcher.py no websocket e nos uploads.
+        resposta = await asyncio.to_thread(urllib.request.urlopen, self.url + "/")
+        cookie = resposta.headers.get("set-cookie")
+        resposta.read()
+        if cookie:
+            self.headers["Cookie"] = cookie.split(";")[0]
+        # O parâmetro mudou de nome no websockets 14.
+        nome = "extra_headers" if int(websockets.__version__.split(".")[0]) < 14 \
+            else "additional_headers"
+        self.ws = await websockets.connect(self.ws_url, max_size=None, **{nome: self.headers})
+        await self.send({"method": "init", "data": {
+            "completa": False, ".clientdata_output_contents_hidden": False}})
+        await self.wait(lambda m: "config" in m)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+    async def send(self, message):
+        await self.ws.send(json.dumps(message))
+
+    async def wait(self, predicate, timeout=120):
+        for i, message in enumerate(self.received):
+            if predicate(message):
+                return self.received.pop(i)
+        deadline = time.monotonic() + timeout
+        while True:
+            message = json.loads(await asyncio.wait_for(
+                self.ws.recv(), deadline - time.monotonic()))
+            if predicate(message):
+                return message
+            self.received.append(message)
+
+    async def call(self, method, *args):
+        tag = next(self.tags)
+        await self.send({"method": method, "args": list(args), "tag": tag})
+        message = await self.wait(lambda m: m.get("response", {}).get("tag") == tag)
+        return message["response"]["value"]
+
+    async def upload(self, input_id, path):
+        data = Path(path).read_bytes()
+        job = await self.call("uploadInit", [{"name": Path(path).name, "size": len(data),
+                                              "type": "application/octet-stream"}])
+        request = urllib.request.Request(self.url + "/" + job["uploadUrl"], data=data,
+                                         headers=self.headers, method="POST")
+        await asyncio.to_thread(lambda: urllib.request.urlopen(request).read())
+        await self.call("uploadEnd", job["jobId"], input_id)
+
+
+async def run_session(url, paths):
+    """
+    Retorna ("ok" | "ocupado" | "erro", latência em segundos).
+    """
+    inicio = time.monotonic()
+    try:
+        async with ShinyClient(url) as client:
+            await client.upload("fileSign", paths["sign"])
+            await client.upload("fileLog", paths["log"])
+            await client.upload("fileBU", paths["bu"])
+            while True:
+                message = await client.wait(lambda m: "contents" in m.get("values", {})
+                                            or "contents" in m.get("errors", {}))
+                if "contents" in message.get("errors", {}):
+                    return "erro", time.monotonic() - inicio
+                valor = message["values"]["contents"]
+                if valor is None:
+                    continue
+                html = valor["html"]
+                if "Servidor ocupado" in html:
+                    return "ocupado", time.monotonic() - inicio
+                if "Verificando" in html or "Validando" in html:
+                    break
+            pendentes = html.count("<i>Verificando") + html.count("<i>Validando")
+            for _ in range(pendentes):
+                await client.wait(lambda m: "shiny-insert-ui" in m)
+            return "ok", time.monotonic() - inicio
+    except Exception as e:
+        print("Erro na sessão:", repr(e), file=sys.stderr)
+        return "erro", time.monotonic() - inicio
+
+
+def process_rss(pid):
+    """
+    Memória em bytes do processo `pid` e de seus filhos (Linux). Usa o PSS,
+    que divide as páginas compartilhadas entre os processos, quando o kernel
+    o informa; caso contrário, soma o RSS.
+    """
+    total = 0
+    pids = [pid]
+    while pids:
+        atual = pids.pop()
+        try:
+            try:
+                with open("/proc/%d/smaps_rollup" % atual) as f:
+                    campo = "Pss:"
+                    linhas = f.readlines()
+            except (FileNotFoundError, PermissionError):
+                with open("/proc/%d/status" % atual) as f:
+                    campo = "VmRSS:"
+                    linhas = f.readlines()
+            for linha in linhas:
+                if linha.startswith(campo):
+                    total += int(linha.split()[1]) * 1024
+            with open("/proc/%d/task/%d/children" % (atual, atual)) as f:
+                pids.extend(int(p) for p in f.read().split())
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def process_cpu(pid):
+    """
+    Segundos de CPU (usuário + sistema) do processo `pid`, sem os filhos.
+    Com --workers é o launcher, por onde passam todas as requisições.
+    """
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+    except FileNotFoundError:
+        return 0.0
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def run_level(url, secoes, concorrencia, sessoes, pid):
+    semaforo = asyncio.Semaphore(concorrencia)
+    pico_rss = 0
+    terminou = asyncio.Event()
+
+    async def amostra_rss():
+        nonlocal pico_rss
+        while not terminou.is_set():
+            pico_rss = max(pico_rss, process_rss(pid))
+            await asyncio.sleep(0.2)
+
+    async def sessao(i):
+        async with semaforo:
+            return await run_session(url, secoes[i % len(secoes)])
+
+    monitor = asyncio.create_task(amostra_rss()) if pid else None
+    cpu = process_cpu(pid) if pid else None
+    inicio = time.monotonic()
+    resultados = await asyncio.gather(*(sessao(i) for i in range(sessoes)))
+    duracao = time.monotonic() - inicio
+    if pid:
+        cpu = process_cpu(pid) - cpu
+    terminou.set()
+    if monitor:
+        await monitor
+
+    latencias = [t for estado, t in resultados if estado == "ok"]
+    return {
+        "concorrencia": concorrencia,
+        "ok": len(latencias),
+        "ocupado": sum(estado == "ocupado" for estado, _ in resultados),
+        "erro": sum(estado == "erro" for estado, _ in resultados),
+        "vazao": len(latencias) / duracao,
+        "p50": percentile(latencias, 50) if latencias else None,
+        "p90": percentile(latencias, 90) if latencias else None,
+        "p99": percentile(latencias, 99) if latencias else None,
+        "media": statistics.mean(latencias) if latencias else None,
+        "rss_mb": pico_rss / 2 ** 20 if pid else None,
+        # Ocupação de CPU do processo principal: perto de 100% com --workers,
+        # o proxy do launcher (uma só thread) é o gargalo.
+        "cpu_pai": cpu / duracao if pid else None,
+    }
+
+
+def print_level(r):
+    def ms(v):
+        return "%8.0f" % (v * 1000) if v is not None else "%8s" % "-"
+    rss = "%8.1f" % r["rss_mb"] if r["rss_mb"] is not None else "%8s" % "-"
+    cpu = "%7.0f%%" % (100 * r["cpu_pai"]) if r["cpu_pai"] is not None else "%8s" % "-"
+    print("%6d %6d %6d %6d %8.2f %s %s %s %s %s" % (
+        r["concorrencia"], r["ok"], r["ocupado"], r["erro"], r["vazao"],
+        ms(r["p50"]), ms(r["p90"]), ms(r["p99"]), rss, cpu), flush=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(comando, url, timeout=60):
+    processo = subprocess.Popen(comando, cwd=Path(__file__).parent)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url + "/").read()
+            return processo
+        except OSError:
+            if processo.poll() is not None:
+                raise RuntimeError("O servidor terminou durante a inicialização")
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError("O servidor não respondeu em %d s" % timeout)
+
+
+def server_command(porta, workers=None, frio=False):
+    if workers is None:
+        return [sys.executable, "-m", "uvicorn", "app:app", "--port", str(porta),
+                "--log-level", "warning"]
+    comando = [sys.executable, "launcher.py", "--port", str(porta), "--workers", str(workers)]
+    if frio:
+        comando.append("--frio")
+    return comando
+
+
+async def run(args, url, pid):
+    with tempfile.TemporaryDirectory() as diretorio:
+        secoes = [fixtures.make_section(os.path.join(diretorio, str(i)), "%013d" % (100700090001 + i),
+                                        args.tamanho_bu, args.tamanho_log)
+                  for i in range(args.secoes_distintas)]
+        print("%6s %6s %6s %6s %8s %8s %8s %8s %8s %8s" % (
+            "conc", "ok", "ocup", "erro", "sess/s", "p50 ms", "p90 ms", "p99 ms", "Mem MB",
+            "CPU pai"))
+        resultados = []
+        for nivel in args.niveis:
+            r = await run_level(url, secoes, nivel, max(args.sessoes, nivel), pid)
+            print_level(r)
+            resultados.append(r)
+        return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Servidor já em execução (não inicia o uvicorn)")
+    parser.add_argument("--niveis", default="1,2,4,8",
+                        type=lambda s: [int(n) for n in s.split(",")],
+                        help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument("--sessoes", type=int, default=16, help="Sessões por nível")
+    parser.add_argument("--secoes-distintas", type=int, default=4)
+    parser.add_argument("--tamanho-bu", type=int, default=20000)
+    parser.add_argument("--tamanho-log", type=int, default=500000)
+    parser.add_argument("--workers", type=int,
+                        help="Inicia o servidor com launcher.py e N workers pré-aquecidos")
+    parser.add_argument("--frio", action="store_true",
+                        help="Com --workers, inicia workers independentes para comparação")
+    parser.add_argument("--json", help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    processo = None
+    url = args.url
+    if url is None:
+        porta = free_port()
+        url = "http://127.0.0.1:%d" % porta
+        inicio = time.monotonic()
+        processo = start_server(server_command(porta, args.workers, args.frio), url)
+        print("Servidor pronto em %.2f s (memória %.1f MB)" % (
+            time.monotonic() - inicio, process_rss(processo.pid) / 2 ** 20), flush=True)
+    try:
+        resultados = asyncio.run(run(args, url.rstrip("/"), processo.pid if processo else None))
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
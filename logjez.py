@@ -0,0 +1,374 @@
+"""
+Leitura em fluxo do Log de Urna (.logjez).
+
+O .logjez é um arquivo 7z com o log de eventos da urna (logd.dat), um
+evento por linha com campos separados por tabulação: data e hora, tipo
+(INFO, ALERTA, ERRO...), identificador da urna, aplicação, mensagem e
+verificador. Aqui o membro do ZIP é lido uma única vez, em blocos e em
+ordem: cada bloco alimenta o SHA-512 usado na verificação da assinatura e
+o fluxo compactado vai para um arquivo temporário (em memória até um
+limite). Lido o cabeçalho do fim do 7z, o fluxo passa pelo descompressor
+LZMA, do qual as linhas são extraídas sob demanda. A memória usada
+independe do tamanho do log.
+
+Uso: python logjez.py DIRETORIO [--tipo ERRO] [--contem TEXTO]
+"""
+import argparse
+import collections
+import hashlib
+import io
+import lzma
+import struct
+import sys
+import tempfile
+
+import verificacao
+
+ASSINATURA_7Z = b"7z\xbc\xaf\x27\x1c"
+
+# Identificadores de propriedades do cabeçalho 7z.
+K_END = 0x00
+K_HEADER = 0x01
+K_MAIN_STREAMS_INFO = 0x04
+K_FILES_INFO = 0x05
+K_PACK_INFO = 0x06
+K_UNPACK_INFO = 0x07
+K_SUBSTREAMS_INFO = 0x08
+K_SIZE = 0x09
+K_CRC = 0x0A
+K_FOLDER = 0x0B
+K_CODERS_UNPACK_SIZE = 0x0C
+K_NUM_UNPACK_STREAM = 0x0D
+K_ENCODED_HEADER = 0x17
+
+LogEvent = collections.namedtuple(
+    "LogEvent", "datahora tipo urna aplicacao mensagem verificador")
+
+
+class Reader7z:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def read(self, n):
+        self.pos += n
+        return self.data[self.pos - n:self.pos]
+
+    def number(self):
+        primeiro = self.byte()
+        mascara = 0x80
+        valor = 0
+        for i in range(8):
+            if not primeiro & mascara:
+                return valor | ((primeiro & (mascara - 1)) << (8 * i))
+            valor |= self.byte() << (8 * i)
+            mascara >>= 1
+        return valor
+
+    def expect(self, propriedade):
+        if self.byte() != propriedade:
+            raise ValueError("Cabeçalho 7z inesperado")
+
+    def number_pair(self):
+        return self.number(), self.number()
+
+    def skip_digests(self, n):
+        todos = self.byte()
+        definidos = n if todos else sum(
+            bin(b).count("1") for b in self.read((n + 7) // 8))
+        self.read(4 * definidos)
+
+    def streams_info(self):
+        """
+        Lê PackInfo/UnpackInfo/SubStreamsInfo. Suporta uma pasta com um único
+        fluxo compactado e uma cadeia de codificadores simples (LZMA, LZMA2,
+        BCJ x86, delta ou cópia), que cobre o que a urna e o 7-Zip geram.
+        """
+        info = {}
+        propriedade = self.byte()
+        if propriedade == K_PACK_INFO:
+            info["pack_pos"] = self.number()
+            if self.number() != 1:
+                raise ValueError("Apenas um fluxo compactado é suportado")
+            propriedade = self.byte()
+            while propriedade != K_END:
+                if propriedade == K_SIZE:
+                    info["pack_size"] = self.number()
+                elif propriedade == K_CRC:
+                    self.skip_digests(1)
+                propriedade = self.byte()
+            propriedade = self.byte()
+        if propriedade == K_UNPACK_INFO:
+            self.expect(K_FOLDER)
+            if self.number() != 1 or self.byte() != 0:
+                raise ValueError("Apenas uma pasta é suportada")
+            # Codificadores simples (uma entrada e uma saída) em cadeia: cada
+            # par liga a entrada de um codificador à saída de outro.
+            coders = []
+            for _ in range(self.number()):
+                flags = self.byte()
+                if flags & 0x10:
+                    raise ValueError("Codificadores complexos não são suportados")
+                coder = bytes(self.read(flags & 0x0f))
+                props = bytes(self.read(self.number())) if flags & 0x20 else b""
+                coders.append((coder, props))
+            origem = dict(self.number_pair() for _ in range(len(coders) - 1))
+            # Ordem de descompressão: do codificador que lê o fluxo compactado
+            # (entrada não ligada) até o que produz o arquivo.
+            atual = next(i for i in range(len(coders)) if i not in origem)
+            seguinte = {saida: entrada for entrada, saida in origem.items()}
+            ordem = [atual]
+            while atual in seguinte:
+                atual = seguinte[atual]
+                ordem.append(atual)
+            self.expect(K_CODERS_UNPACK_SIZE)
+            tamanhos = [self.number() for _ in coders]
+            # O lzma espera os filtros na ordem de compressão.
+            info["coders"] = [coders[i] for i in reversed(ordem)]
+            info["unpack_size"] = tamanhos[ordem[-1]]
+            propriedade = self.byte()
+            if propriedade == K_CRC:
+                self.skip_digests(1)
+                propriedade = self.byte()
+            if propriedade != K_END:
+                raise ValueError("Cabeçalho 7z inesperado")
+            propriedade = self.byte()
+        if propriedade == K_SUBSTREAMS_INFO:
+            fluxos = 1
+            propriedade = self.byte()
+            if propriedade == K_NUM_UNPACK_STREAM:
+                fluxos = self.number()
+                propriedade = self.byte()
+            if propriedade == K_SIZE:
+                for _ in range(fluxos - 1):
+                    self.number()
+                propriedade = self.byte()
+            if propriedade == K_CRC:
+                self.skip_digests(fluxos)
+                propriedade = self.byte()
+            if propriedade != K_END:
+                raise ValueError("Cabeçalho 7z inesperado")
+            propriedade = self.byte()
+        if propriedade != K_END:
+            raise ValueError("Cabeçalho 7z inesperado")
+        return info
+
+
+def lzma_filter(coder, props):
+    if coder == b"\x03\x01\x01":
+        return {"id": lzma.FILTER_LZMA1, "dict_size": struct.unpack("<I", props[1:5])[0],
+                "lc": props[0] % 9, "lp": props[0] // 9 % 5, "pb": props[0] // 45}
+    if coder == b"\x21":
+        return {"id": lzma.FILTER_LZMA2, "dict_size": lzma2_dict_size(props[0])}
+    if coder == b"\x03\x03\x01\x03":
+        return {"id": lzma.FILTER_X86}
+    if coder == b"\x03":
+        return {"id": lzma.FILTER_DELTA, "dist": props[0] + 1}
+    raise ValueError("Compressão 7z não suportada: %s" % coder.hex())
+
+
+def decompressor(coders):
+    if coders == [(b"\x00", b"")]:
+        return None
+    filtros = [lzma_filter(coder, props) for coder, props in coders]
+    return lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=filtros)
+
+
+def lzma2_dict_size(prop):
+    if prop == 40:
+        return 0xFFFFFFFF
+    return (2 | (prop & 1)) << (prop // 2 + 11)
+
+
+def decompress(info, packed):
+    d = decompressor(info["coders"])
+    return packed if d is None else d.decompress(packed, info["unpack_size"])
+
+
+def start_header(inicio):
+    """
+    (posição, tamanho) do cabeçalho principal, a partir dos 32 bytes do
+    cabeçalho de assinatura do 7z.
+    """
+    if len(inicio) < 32 or inicio[:6] != ASSINATURA_7Z:
+        raise ValueError("O .logjez não é um arquivo 7z")
+    offset, tamanho = struct.unpack("<QQ", inicio[12:28])
+    return 32 + offset, tamanho
+
+
+def parse_layout(cabecalho, ler):
+    """
+    Posição, tamanho e codificadores do fluxo de dados a partir do
+    cabeçalho principal. `ler(posição, tamanho)` lê do arquivo 7z, para o
+    caso de o cabeçalho estar ele mesmo compactado.
+    """
+    reader = Reader7z(cabecalho)
+    propriedade = reader.byte()
+    if propriedade == K_ENCODED_HEADER:
+        info = reader.streams_info()
+        reader = Reader7z(decompress(info, ler(32 + info["pack_pos"], info["pack_size"])))
+        propriedade = reader.byte()
+    if propriedade != K_HEADER:
+        raise ValueError("Cabeçalho 7z inesperado")
+    reader.expect(K_MAIN_STREAMS_INFO)
+    info = reader.streams_info()
+    info["pack_pos"] += 32
+    return info
+
+
+def read_layout(f):
+    """
+    Lê os cabeçalhos do 7z (o de assinatura, no início, e o principal, no
+    fim) de um arquivo posicionável e retorna a posição, o tamanho e os
+    codificadores do fluxo de dados.
+    """
+    def ler(posicao, tamanho):
+        f.seek(posicao)
+        return f.read(tamanho)
+
+    posicao, tamanho = start_header(f.read(32))
+    return parse_layout(ler(posicao, tamanho), ler)
+
+
+def parse_line(linha):
+    campos = linha.rstrip(b"\r").decode("latin-1").split("\t")
+    campos += [""] * (6 - len(campos))
+    return LogEvent(*campos[:6])
+
+
+class LogStream:
+    """
+    Iterador sobre os eventos de um .logjez aberto como arquivo binário,
+    lido uma única vez e em ordem (não precisa ser posicionável: voltar ao
+    início de um membro deflate do ZIP o descompactaria de novo). Os
+    codificadores só são conhecidos no cabeçalho do fim do 7z, então o fluxo
+    compactado é guardado num arquivo temporário, em memória até
+    `spool_size` bytes, e descompactado depois. Ao fim da iteração,
+    `digest` contém o SHA-512 do .logjez, o mesmo de hash_file.
+    """
+
+    def __init__(self, f, chunk_size=1 << 20, spool_size=16 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.spool_size = spool_size
+        self.digest = None
+
+    def _copy(self, sha, destino, n):
+        while n:
+            bloco = self.f.read(min(n, self.chunk_size))
+            if not bloco:
+                raise ValueError("O .logjez está truncado")
+            sha.update(bloco)
+            destino.write(bloco)
+            n -= len(bloco)
+
+    def __iter__(self):
+        sha = hashlib.sha512()
+        inicio = self.f.read(32)
+        sha.update(inicio)
+        posicao, tamanho = start_header(inicio)
+        with tempfile.SpooledTemporaryFile(self.spool_size) as dados:
+            self._copy(sha, dados, posicao - len(inicio))
+            cabecalho = io.BytesIO()
+            self._copy(sha, cabecalho, tamanho)
+            while bloco := self.f.read(self.chunk_size):
+                sha.update(bloco)
+            digest = sha.digest()
+
+            def ler(posicao, tamanho):
+                dados.seek(posicao - 32)
+                return dados.read(tamanho)
+
+            info = parse_layout(cabecalho.getvalue(), ler)
+            dados.seek(info["pack_pos"] - 32)
+            pendente = info["pack_size"]
+            d = decompressor(info["coders"])
+            restante = b""
+            while True:
+                if d is None or d.needs_input:
+                    compactado = dados.read(min(pendente, self.chunk_size))
+                    pendente -= len(compactado)
+                    if not compactado:
+                        break
+                else:
+                    compactado = b""
+                # O texto descompactado é limitado a chunk_size por vez.
+                texto = compactado if d is None else d.decompress(compactado, self.chunk_size)
+                linhas = (restante + texto).split(b"\n")
+                restante = linhas.pop()
+                for linha in linhas:
+                    if linha:
+                        yield parse_line(linha)
+                if d is not None and d.eof:
+                    break
+        if restante:
+            yield parse_line(restante)
+        self.digest = digest
+
+
+def open_log(log_zip):
+    """
+    Abre o membro .logjez de um ZIP de Log de Urna. Use como gerenciador de
+    contexto: `with open_log(path) as f: for evento in LogStream(f): ...`.
+    """
+    return verificacao.open_member(log_zip, ".logjez")
+
+
+def filter_events(eventos, tipos=None, contem=None):
+    for evento in eventos:
+        if tipos and evento.tipo not in tipos:
+            continue
+        if contem and not any(texto in evento.mensagem for texto in contem):
+            continue
+        yield evento
+
+
+def signed_log(sign_zip, digest):
+    """
+    True se `digest` (o hash do .logjez) é o do log no arquivo de
+    assinaturas e a assinatura dele confere (read_envelopes e find_signed,
+    como na verificação de uma seção).
+    """
+    envelopes, erros = verificacao.read_envelopes(sign_zip)
+    if not envelopes:
+        raise verificacao.UntrustedInput("nenhum envelope de assinaturas válido" + "".join(
+            "; %s: %s" % erro for erro in erros))
+    entrada = verificacao.find_signed(verificacao.merge_signed_files(envelopes), envelopes, "log")
+    return digest == entrada["hash"] and verificacao.check_signature(
+        hashlib.sha512(digest).digest(), entrada["assinatura"], entrada["pub_key"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio")
+    parser.add_argument("--tipo", action="append", help="Tipo de evento (repetível)")
+    parser.add_argument("--contem", action="append", help="Texto na mensagem (repetível)")
+    args = parser.parse_args()
+
+    erros = 0
+    for secao in verificacao.find_sections(args.diretorio):
+        if secao["log"] is None:
+            continue
+        try:
+            with open_log(secao["log"]) as f:
+                stream = LogStream(f)
+                for evento in filter_events(stream, args.tipo, args.contem):
+                    print(secao["secao"], *evento, sep="\t")
+            if secao["sign"] is not None and not signed_log(secao["sign"], stream.digest):
+                print("%s: hash ou assinatura do log não confere com o arquivo de assinaturas"
+                      % secao["secao"], file=sys.stderr)
+        except Exception as e:
+            erros += 1
+            print("%s: log não pôde ser lido: %s" % (secao["secao"], str(e) or type(e).__name__),
+                  file=sys.stderr)
+    if erros:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Matriz de comparação cruzada entre seções.
+
+Confronta M arquivos de assinaturas com N Boletins de Urna e N Logs de Urna
+(de quaisquer seções) para mostrar que um arquivo só confere com a
+assinatura da sua própria urna. Cada arquivo é lido e resumido uma única
+vez; os hashes ficam em matrizes NumPy de 64 bytes por linha e as matrizes
+M x N de coincidência são calculadas com comparações vetorizadas. A
+verificação ECDSA, cara, só é feita nos pares cujo hash coincide, e em lote.
+
+Uso: python matriz.py ASSINATURAS [--arquivos DIRETORIO] [--salvar ARQUIVO.npz]
+     (sem --arquivos, os .bu e logs são procurados em ASSINATURAS)
+"""
+import argparse
+import hashlib
+import sys
+
+import numpy as np
+
+import verificacao
+
+DIGEST = np.dtype((np.void, 64))
+
+
+def digest_array(digests):
+    """
+    Lista de hashes SHA-512 como vetor de elementos de 64 bytes. Um hash de
+    outro tamanho deslocaria todos os seguintes, então é rejeitado.
+    """
+    digests = list(digests)
+    if any(len(h) != 64 for h in digests):
+        raise ValueError("Hash SHA-512 sem 64 bytes nas posições %s" % [
+            i for i, h in enumerate(digests) if len(h) != 64])
+    return np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, 64).view(DIGEST).ravel()
+
+
+def read_signatures(sign_paths):
+    """
+    Lê os envelopes de cada ZIP de assinaturas uma vez, com os limites de
+    verificacao.read_envelopes, e encontra as entradas do BU e do log.
+    Retorna os índices dos ZIPs lidos, os hashes esperados do BU e do log
+    (vetores na ordem desses índices), as assinaturas e as chaves públicas
+    de cada um, e [(índice, erro)] dos ZIPs rejeitados.
+    """
+    lidos, erros = [], []
+    hashes = {"bu": [], "log": []}
+    assinaturas = {"bu": [], "log": []}
+    chaves = {"bu": [], "log": []}
+    for i, path in enumerate(sign_paths):
+        try:
+            envelopes, _ = verificacao.read_envelopes(path)
+            if not envelopes:
+                raise verificacao.UntrustedInput("nenhum envelope de assinaturas válido")
+            tabela = verificacao.merge_signed_files(envelopes)
+            entradas = {arquivo: verificacao.find_signed(tabela, envelopes, arquivo)
+                        for arquivo in ("bu", "log")}
+            for arquivo, entrada in entradas.items():
+                if len(entrada["hash"]) != 64:
+                    raise verificacao.UntrustedInput("hash do %s sem 64 bytes" % arquivo)
+        except Exception as e:
+            erros.append((i, str(e) or type(e).__name__))
+            continue
+        lidos.append(i)
+        for arquivo, entrada in entradas.items():
+            hashes[arquivo].append(entrada["hash"])
+            assinaturas[arquivo].append(entrada["assinatura"])
+            chaves[arquivo].append(entrada["pub_key"])
+    return (lidos, {arquivo: digest_array(h) for arquivo, h in hashes.items()},
+            assinaturas, chaves, erros)
+
+
+def hash_files(bu_paths, log_paths):
+    """
+    Hash de cada BU e de cada .logjez, calculados em paralelo pelo
+    HashService. Retorna ({"bu": vetor, "log": vetor} dos arquivos lidos,
+    os índices lidos e [(índice, erro)] dos demais, por tipo de arquivo).
+    """
+    servico = verificacao.hash_service()
+    futuros = {
+        "bu": [servico.submit(lambda p=p: open(p, 'rb')) for p in bu_paths],
+        "log": [servico.submit(lambda p=p: verificacao.open_member(p, ".logjez"))
+                for p in log_paths]}
+    atuais, lidos, erros = {}, {}, {}
+    for arquivo, lista in futuros.items():
+        hashes, lidos[arquivo], erros[arquivo] = [], [], []
+        for i, futuro in enumerate(lista):
+            try:
+                hashes.append(futuro.result())
+            except Exception as e:
+                erros[arquivo].append((i, str(e) or type(e).__name__))
+                continue
+            lidos[arquivo].append(i)
+        atuais[arquivo] = digest_array(hashes)
+    return atuais, lidos, erros
+
+
+def match_matrix(esperados, atuais):
+    """
+    Matriz booleana M x N: [i, j] indica que o hash do arquivo j é o
+    registrado no arquivo de assinaturas i.
+    """
+    return esperados[:, None] == atuais[None, :]
+
+
+def verify_matches(matriz, atuais, assinaturas, chaves):
+    """
+    Verifica a assinatura ECDSA apenas dos pares com hash coincidente, em
+    lote (verificacao.check_signature_batch). Retorna uma matriz M x N de
+    int8: -1 sem coincidência, 0 assinatura inválida, 1 válida.
+    """
+    resultado = np.full(matriz.shape, -1, dtype=np.int8)
+    pares = np.argwhere(matriz)
+    validas = verificacao.check_signature_batch([
+        (hashlib.sha512(atuais[j].tobytes()).digest(), assinaturas[i], chaves[i])
+        for i, j in pares])
+    for (i, j), valida in zip(pares, validas):
+        resultado[i, j] = valida
+    return resultado
+
+
+def compare_sections(assinaturas, arquivos):
+    """
+    `assinaturas` e `arquivos` são listas de seções de verificacao.find_sections.
+    Retorna {"bu": matriz, "log": matriz} com os resultados de
+    verify_matches, os rótulos das linhas e das colunas e [(seção, arquivo,
+    erro)] dos arquivos que não puderam ser lidos, que ficam fora das matrizes.
+    """
+    linhas = [s for s in assinaturas if s["sign"] is not None]
+    colunas = {arquivo: [s for s in arquivos if s[arquivo] is not None]
+               for arquivo in ("bu", "log")}
+    lidas, esperados, assinados, chaves, erros_linhas = read_signatures(
+        [s["sign"] for s in linhas])
+    atuais, lidos, erros_colunas = hash_files([s["bu"] for s in colunas["bu"]],
+                                              [s["log"] for s in colunas["log"]])
+    erros = [(linhas[i]["secao"], "assinaturas", erro) for i, erro in erros_linhas]
+    for arquivo in ("bu", "log"):
+        erros += [(colunas[arquivo][i]["secao"], arquivo, erro)
+                  for i, erro in erros_colunas[arquivo]]
+        colunas[arquivo] = [colunas[arquivo][i] for i in lidos[arquivo]]
+    linhas = [linhas[i] for i in lidas]
+    resultados = {}
+    for arquivo in ("bu", "log"):
+        matriz = match_matrix(esperados[arquivo], atuais[arquivo])
+        resultados[arquivo] = verify_matches(matriz, atuais[arquivo],
+                                             assinados[arquivo], chaves[arquivo])
+    rotulos = {"assinaturas": [s["secao"] for s in linhas],
+               "bu": [s["secao"] for s in colunas["bu"]],
+               "log": [s["secao"] for s in colunas["log"]]}
+    return resultados, rotulos, erros
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("assinaturas")
+    parser.add_argument("--arquivos", help="Diretório dos .bu e logs (padrão: ASSINATURAS)")
+    parser.add_argument("--salvar", help="Grava as matrizes e os rótulos em .npz")
+    args = parser.parse_args()
+
+    assinaturas = verificacao.find_sections(args.assinaturas)
+    arquivos = assinaturas if args.arquivos is None else verificacao.find_sections(args.arquivos)
+    resultados, rotulos, erros = compare_sections(assinaturas, arquivos)
+    for secao, arquivo, erro in erros:
+        print("%s: %s não pôde ser lido: %s" % (secao, arquivo, erro), file=sys.stderr)
+
+    cruzados = 0
+    for arquivo, matriz in resultados.items():
+        linhas, colunas = matriz.shape
+        coincidentes = np.argwhere(matriz >= 0)
+        print("%s: %d x %d pares, %d hashes coincidentes, %d assinaturas válidas" % (
+            arquivo, linhas, colunas, len(coincidentes), int((matriz == 1).sum())))
+        for i, j in coincidentes:
+            secao, outra = rotulos["assinaturas"][i], rotulos[arquivo][j]
+            if secao != outra:
+                cruzados += 1
+                print("  %s de %s confere com as assinaturas de %s (assinatura %s)" % (
+                    arquivo, outra, secao, "válida" if matriz[i, j] == 1 else "inválida"))
+        sem_par = np.flatnonzero(~(matriz == 1).any(axis=1)) if colunas else []
+        for i in sem_par:
+            print("  %s: nenhum %s com assinatura válida" % (rotulos["assinaturas"][i], arquivo))
+    if args.salvar:
+        np.savez_compressed(args.salvar, bu=resultados["bu"], log=resultados["log"],
+                            **{"rotulos_" + nome: np.array(r) for nome, r in rotulos.items()})
+    if cruzados or erros:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Verificação em lote por etapas encadeadas.
+
+Cada seção passa por três etapas, cada uma com o seu número de workers:
+leitura (threads que abrem os ZIPs e leem os arquivos de assinaturas, o
+.logjez e o .bu), hash (threads, o SHA-512 libera o GIL) e decodificação e
+verificação (pool de processos, em lotes de seções, com a verificação ECDSA
+em lote, montados por uma thread de despacho). As etapas são ligadas por filas limitadas: uma etapa mais rápida
+que a seguinte fica bloqueada em vez de acumular arquivos na memória. Ao
+fim é mostrada a ocupação de cada etapa, o tempo que os seus workers
+passaram sem entrada e com a saída cheia, para ajustar os números de
+workers: a etapa mais ocupada é o gargalo.
+
+Os resultados têm o formato de relatorio.verify_sections e podem ser
+gravados em JSONL ou virar o relatório HTML diretamente.
+
+Uso: python pipeline.py DIRETORIO [--leitores 2] [--hash 2] [--verificadores N]
+                        [--lote 16] [--fila 32] [--resultados ARQUIVO.jsonl]
+                        [--relatorio SAIDA]
+"""
+import argparse
+import binascii
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import verificacao
+
+FIM = object()
+
+
+def new_result(secao):
+    return {"secao": secao["secao"], "uf": secao["uf"], "log": None, "bu": None,
+            "hash_log": None, "hash_bu": None, "erro": None, "avisos": []}
+
+
+def read_item(secao):
+    """
+    Etapa de leitura: conteúdo dos arquivos de assinaturas, do .logjez e do
+    .bu da seção.
+    """
+    item = {"resultado": new_result(secao)}
+    if secao["sign"] is None or secao["log"] is None or secao["bu"] is None:
+        item["resultado"]["erro"] = "arquivos ausentes"
+        return item
+    try:
+        item["arquivos"] = verificacao.read_signature_files(secao["sign"])
+        with verificacao.open_member(secao["log"], ".logjez") as f:
+            item["log"] = f.read()
+        with open(secao["bu"], "rb") as f:
+            item["bu"] = f.read()
+    except Exception as e:
+        item["resultado"]["erro"] = str(e) or type(e).__name__
+    return item
+
+
+def hash_item(item):
+    """
+    Etapa de hash: troca o conteúdo do log e do BU pelos seus hashes.
+    """
+    resultado = item["resultado"]
+    if resultado["erro"] is None:
+        for arquivo in ("log", "bu"):
+            resultado["hash_" + arquivo] = binascii.hexlify(
+                verificacao.hash_file(item.pop(arquivo))).decode('ascii')
+    return item
+
+
+def verify_batch(itens):
+    """
+    Etapa de verificação, num worker do pool de processos: decodifica os
+    envelopes de cada seção, compara os hashes e verifica as assinaturas de
+    todo o lote juntas. Envelopes que não decodificam ficam em "avisos".
+    Retorna (resultados, segundos de trabalho).
+    """
+    inicio = time.perf_counter()
+    resultados, pendentes = [], []
+    for item in itens:
+        resultado = item["resultado"]
+        resultados.append(resultado)
+        envelopes = []
+        for nome, dados in item["arquivos"]:
+            try:
+                envelope = verificacao.decode_signature_file(nome, dados)
+                envelope["pub_key"] = verificacao.pubkey_from_cert(envelope["certificado"])
+            except Exception as e:
+                resultado["avisos"].append("%s: %s" % (nome, str(e) or type(e).__name__))
+                continue
+            envelopes.append(envelope)
+        try:
+            if not envelopes:
+                raise verificacao.UntrustedInput("nenhum envelope de assinaturas válido")
+            tabela = verificacao.merge_signed_files(envelopes)
+            for arquivo in ("log", "bu"):
+                entrada = verificacao.find_signed(tabela, envelopes, arquivo)
+                atual = binascii.unhexlify(resultado["hash_" + arquivo])
+                if entrada["hash"] != atual:
+                    resultado[arquivo] = False
+                    continue
+                pendentes.append((resultado, arquivo, (
+                    hashlib.sha512(atual).digest(), entrada["assinatura"], entrada["pub_key"])))
+        except Exception as e:
+            resultado["erro"] = str(e) or type(e).__name__
+    validas = verificacao.check_signature_batch([item for _, _, item in pendentes])
+    for (resultado, arquivo, _), valida in zip(pendentes, validas):
+        resultado[arquivo] = valida
+    return resultados, time.perf_counter() - inicio
+
+
+class Stage:
+    """
+    Tempos acumulados dos workers de uma etapa: trabalhando, esperando
+    entrada e esperando espaço na fila de saída.
+    """
+
+    def __init__(self, nome, workers):
+        self.nome = nome
+        self.workers = workers
+        self.itens = 0
+        self.ocupado = 0.0
+        self.sem_entrada = 0.0
+        self.saida_cheia = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, itens=0, ocupado=0.0, sem_entrada=0.0, saida_cheia=0.0):
+        with self._lock:
+            self.itens += itens
+            self.ocupado += ocupado
+            self.sem_entrada += sem_entrada
+            self.saida_cheia += saida_cheia
+
+    def report(self, decorrido):
+        capacidade = decorrido * self.workers or 1
+        return {"workers": self.workers, "itens": self.itens,
+                "ocupacao": self.ocupado / capacidade,
+                "sem_entrada": self.sem_entrada / capacidade,
+                "saida_cheia": self.saida_cheia / capacidade}
+
+
+class BatchPipeline:
+    def __init__(self, leitores=2, hashers=2, verificadores=None, lote=16, fila=32):
+        self.verificadores = verificadores or os.cpu_count() or 1
+        self.lote = lote
+        self.fila = fila
+        # O despacho é uma só thread que junta os lotes para o pool; as suas
+        # esperas ficam numa etapa própria, porque divididas pelos
+        # verificadores subestimariam a ociosidade deles.
+        self.etapas = {"leitura": Stage("leitura", leitores),
+                       "hash": Stage("hash", hashers),
+                       "despacho": Stage("despacho", 1),
+                       "verificacao": Stage("verificacao", self.verificadores)}
+        self.inicio = None
+        self.fim = None
+
+    def _threads(self, etapa, fn, entrada, saida):
+        def worker():
+            while True:
+                t0 = time.perf_counter()
+                item = entrada.get()
+                t1 = time.perf_counter()
+                if item is FIM:
+                    entrada.put(FIM)
+                    etapa.record(sem_entrada=t1 - t0)
+                    return
+                item = fn(item)
+                t2 = time.perf_counter()
+                saida.put(item)
+                etapa.record(1, t2 - t1, t1 - t0, time.perf_counter() - t2)
+
+        threads = [threading.Thread(target=worker, name=etapa.nome, daemon=True)
+                   for _ in range(etapa.workers)]
+        for thread in threads:
+            thread.start()
+
+        def close():
+            for thread in threads:
+                thread.join()
+            saida.put(FIM)
+
+        threading.Thread(target=close, daemon=True).start()
+
+    def _dispatch(self, entrada, em_andamento, resultados, executor):
+        # Junta as seções em lotes para o pool de processos. A fila
+        # em_andamento limita os lotes submetidos ao dobro de workers.
+        despacho = self.etapas["despacho"]
+        lote = []
+        while True:
+            t0 = time.perf_counter()
+            item = entrada.get()
+            t1 = time.perf_counter()
+            despacho.record(sem_entrada=t1 - t0)
+            if item is not FIM and item["resultado"]["erro"] is not None:
+                resultados.put(item["resultado"])
+                self.etapas["verificacao"].record(1)
+                continue
+            if item is not FIM:
+                lote.append(item)
+            if lote and (item is FIM or len(lote) == self.lote):
+                futuro = executor.submit(verify_batch, lote)
+                t2 = time.perf_counter()
+                em_andamento.put((futuro, len(lote)))
+                despacho.record(len(lote), t2 - t1, saida_cheia=time.perf_counter() - t2)
+                lote = []
+            if item is FIM:
+                em_andamento.put(FIM)
+                return
+
+    def _collect(self, em_andamento, resultados):
+        etapa = self.etapas["verificacao"]
+        while True:
+            pendente = em_andamento.get()
+            if pendente is FIM:
+                resultados.put(FIM)
+                return
+            futuro, n = pendente
+            try:
+                verificados, ocupado = futuro.result()
+            except Exception as e:
+                resultados.put(e)
+                return
+            etapa.record(n, ocupado)
+            for resultado in verificados:
+                resultados.put(resultado)
+
+    def run(self, secoes):
+        """
+        Gera um resultado por seção de `secoes` (de iter_sections), na ordem
+        em que ficam prontos.
+        """
+        filas = [queue.Queue(self.fila) for _ in range(4)]
+        secoes_q, lidos, hashes, resultados = filas
+        em_andamento = queue.Queue(2 * self.verificadores)
+        executor = verificacao.process_pool(self.verificadores)
+        self.inicio = time.perf_counter()
+
+        def feed():
+            for secao in secoes:
+                secoes_q.put(secao)
+            secoes_q.put(FIM)
+
+        threading.Thread(target=feed, daemon=True).start()
+        self._threads(self.etapas["leitura"], read_item, secoes_q, lidos)
+        self._threads(self.etapas["hash"], hash_item, lidos, hashes)
+        threading.Thread(target=self._dispatch, daemon=True,
+                         args=(hashes, em_andamento, resultados, executor)).start()
+        threading.Thread(target=self._collect, daemon=True,
+                         args=(em_andamento, resultados)).start()
+        try:
+            while True:
+                resultado = resultados.get()
+                if resultado is FIM:
+                    break
+                if isinstance(resultado, Exception):
+                    raise resultado
+                yield resultado
+        finally:
+            self.fim = time.perf_counter()
+            executor.shutdown(cancel_futures=True)
+
+    def report(self):
+        decorrido = (self.fim or time.perf_counter()) - self.inicio
+        return {"segundos": decorrido,
+                "etapas": {nome: etapa.report(decorrido) for nome, etapa in self.etapas.items()}}
+
+
+def print_report(relatorio, file=sys.stderr):
+    print("%-12s %8s %8s %10s %12s %12s" % (
+        "etapa", "workers", "itens", "ocupação", "sem entrada", "saída cheia"), file=file)
+    for nome, etapa in relatorio["etapas"].items():
+        print("%-12s %8d %8d %9.0f%% %11.0f%% %11.0f%%" % (
+            nome, etapa["workers"], etapa["itens"], 100 * etapa["ocupacao"],
+            100 * etapa["sem_entrada"], 100 * etapa["saida_cheia"]), file=file)
+    gargalo = max(relatorio["etapas"], key=lambda nome: relatorio["etapas"][nome]["ocupacao"])
+    print("Gargalo: %s (%.1f s no total)" % (gargalo, relatorio["segundos"]), file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio")
+    parser.add_argument("--leitores", type=int, default=2)
+    parser.add_argument("--hash", type=int, default=2)
+    parser.add_argument("--verificadores", type=int, help="Processos (padrão: CPUs)")
+    parser.add_argument("--lote", type=int, default=16, help="Seções por tarefa de verificação")
+    parser.add_argument("--fila", type=int, default=32, help="Capacidade de cada fila")
+    parser.add_argument("--resultados", help="Grava os resultados em JSONL")
+    parser.add_argument("--relatorio", help="Grava o relatório HTML neste diretório")
+    args = parser.parse_args()
+
+    engine = BatchPipeline(args.leitores, args.hash, args.verificadores, args.lote, args.fila)
+    resultados = engine.run(verificacao.iter_sections(args.diretorio))
+    if args.relatorio:
+        import relatorio
+
+        total = relatorio.write_report(resultados, args.relatorio, salvar=args.resultados)
+        secoes, validas = total.secoes, total.validas
+    else:
+        arquivo = open(args.resultados, "w") if args.resultados else None
+        secoes = validas = 0
+        for resultado in resultados:
+            secoes += 1
+            validas += resultado["log"] is True and resultado["bu"] is True
+            if arquivo:
+                arquivo.write(json.dumps(resultado) + "\n")
+        if arquivo:
+            arquivo.close()
+    print("%d seções, %d válidas" % (secoes, validas), file=sys.stderr)
+    print_report(engine.report())
+
+
+if __name__ == "__main__":
+    main()
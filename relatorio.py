@@ -0,0 +1,299 @@
+"""
+Relatório HTML navegável da verificação em lote.
+
+Os resultados (um por seção) são consumidos em fluxo, direto da verificação
+de um diretório ou de um arquivo JSONL gravado antes, e cada linha é escrita
+na página corrente do seu município assim que chega. Só ficam em memória os
+contadores por UF e município e um número limitado de arquivos abertos; ao
+fim são gravados o índice geral, o índice de cada UF e o de cada município,
+com a navegação entre as páginas.
+
+Uso: python relatorio.py SAIDA (--diretorio DIR | --resultados ARQUIVO.jsonl)
+                         [--por-pagina 500] [--salvar-resultados ARQUIVO.jsonl]
+"""
+import argparse
+import binascii
+import collections
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import pipeline
+import verificacao
+
+CABECALHO = """<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>%s</title>
+<style>
+body { font-family: sans-serif; margin: 2em; }
+td, th { padding: 2px 8px; text-align: left; }
+.valida { color: green; } .invalida { color: red; } .nao-verificada { color: gray; }
+code { font-size: 90%%; }
+</style></head><body>
+<h1>%s</h1>
+"""
+RODAPE = "</body></html>\n"
+
+VEREDICTOS = {True: ("valida", "válida"), False: ("invalida", "inválida"),
+              None: ("nao-verificada", "não verificada")}
+
+
+def parse_secao(secao):
+    """
+    (município, zona, seção) do identificador oNNNNN-MMMMMZZZZSSSS.
+    """
+    numero = secao.split("-")[-1]
+    return numero[:5], numero[5:9], numero[9:]
+
+
+def folder_name(texto, vazio):
+    """
+    Nome de pasta seguro para uma UF ou um município, que podem vir de nomes
+    de diretórios ou de um JSONL: separadores e demais caracteres fora de
+    [A-Za-z0-9_.-] viram "_", e um nome vazio ou só de pontos vira `vazio`.
+    """
+    nome = re.sub(r"[^A-Za-z0-9_.-]", "_", texto)
+    return vazio if not nome.strip(".") else nome
+
+
+def verify_sections(diretorio, lote=64):
+    """
+    Gera um resultado por seção de `diretorio`: {"secao", "uf", "log", "bu",
+    "hash_log", "hash_bu", "erro", "avisos"}. As assinaturas de `lote` seções são
+    verificadas juntas com verificacao.check_signature_batch.
+    """
+    secoes = verificacao.iter_sections(diretorio)
+    while True:
+        pendentes = []
+        for secao in secoes:
+            pendentes.append(secao)
+            if len(pendentes) == lote:
+                break
+        if not pendentes:
+            return
+        resultados, itens = [], []
+        for secao in pendentes:
+            resultado = pipeline.new_result(secao)
+            resultados.append(resultado)
+            if secao["sign"] is None or secao["log"] is None or secao["bu"] is None:
+                resultado["erro"] = "arquivos ausentes"
+                continue
+            try:
+                section = verificacao.read_section(secao["sign"], secao["log"], secao["bu"])
+            except Exception as e:
+                resultado["erro"] = str(e) or type(e).__name__
+                continue
+            resultado["avisos"] = ["%s: %s" % erro for erro in section["erros"]]
+            for arquivo in ("log", "bu"):
+                original, assinatura, atual = section[arquivo]
+                resultado["hash_" + arquivo] = binascii.hexlify(atual).decode('ascii')
+                if original != atual:
+                    resultado[arquivo] = False
+                    continue
+                mensagem = hashlib.sha512(atual).digest()
+                itens.append((resultado, arquivo, (mensagem, assinatura,
+                                                   section["chaves"][arquivo])))
+        validas = verificacao.check_signature_batch([item for _, _, item in itens])
+        for (resultado, arquivo, _), valida in zip(itens, validas):
+            resultado[arquivo] = valida
+        yield from resultados
+
+
+def read_results(caminho):
+    with open(caminho) as f:
+        for linha in f:
+            if linha.strip():
+                yield json.loads(linha)
+
+
+def render_row(resultado):
+    municipio, zona, secao = parse_secao(resultado["secao"])
+    out = "<tr><td>" + html.escape(resultado["secao"]) + "</td><td>" + html.escape(zona) + \
+        "</td><td>" + html.escape(secao) + "</td>"
+    for arquivo in ("log", "bu"):
+        classe, texto = VEREDICTOS[resultado[arquivo]]
+        hash_atual = resultado["hash_" + arquivo]
+        out += "<td class='" + classe + "'>" + texto + "</td><td><code title='" + \
+            (hash_atual or "") + "'>" + (hash_atual or "")[:16] + "</code></td>"
+    mensagens = ([resultado["erro"]] if resultado.get("erro") else []) + resultado.get("avisos", [])
+    out += "<td>" + "<br>".join(html.escape(m) for m in mensagens) + "</td></tr>\n"
+    return out
+
+
+TABELA = "<table><tr><th>Seção</th><th>Zona</th><th>Número</th><th>Log</th>" + \
+    "<th>Hash do log</th><th>BU</th><th>Hash do BU</th><th>Erro</th></tr>\n"
+
+
+class Contagem:
+    __slots__ = ('secoes', 'validas', 'invalidas', 'paginas')
+
+    def __init__(self):
+        self.secoes = 0
+        self.validas = 0
+        self.invalidas = 0
+        self.paginas = 0
+
+    def add(self, resultado):
+        self.secoes += 1
+        veredictos = (resultado["log"], resultado["bu"])
+        if all(v is True for v in veredictos):
+            self.validas += 1
+        elif any(v is False for v in veredictos) or resultado.get("erro"):
+            self.invalidas += 1
+
+
+class ReportWriter:
+    """
+    Distribui as linhas nas páginas de cada município. Mantém abertos no
+    máximo `max_abertos` arquivos (os usados mais recentemente); os demais
+    são reabertos para acréscimo quando necessário.
+    """
+
+    def __init__(self, saida, por_pagina=500, max_abertos=64):
+        self.saida = Path(saida)
+        self.por_pagina = por_pagina
+        self.max_abertos = max_abertos
+        self.abertos = collections.OrderedDict()
+        self.municipios = collections.defaultdict(Contagem)
+        self.ufs = collections.defaultdict(Contagem)
+        self.total = Contagem()
+
+    def folder(self, uf, municipio=None):
+        pasta = self.saida / (uf or "sem-uf")
+        return pasta if municipio is None else pasta / municipio
+
+    def page_path(self, uf, municipio, pagina):
+        return self.folder(uf, municipio) / ("pagina-%05d.html" % pagina)
+
+    def _file(self, caminho, novo):
+        f = self.abertos.pop(caminho, None)
+        if f is None:
+            if len(self.abertos) >= self.max_abertos:
+                self.abertos.popitem(last=False)[1].close()
+            if novo:
+                caminho.parent.mkdir(parents=True, exist_ok=True)
+            f = open(caminho, "w" if novo else "a", encoding="utf-8")
+        self.abertos[caminho] = f
+        return f
+
+    def add(self, resultado):
+        # UF e município viram nomes de pasta e links: UFs que só diferem
+        # nos caracteres trocados por folder_name ficam juntas.
+        uf = folder_name(resultado["uf"], "")
+        municipio = folder_name(parse_secao(resultado["secao"])[0], "sem-municipio")
+        contagem = self.municipios[(uf, municipio)]
+        novo = contagem.secoes % self.por_pagina == 0
+        if novo:
+            if contagem.paginas:
+                self._close_page(uf, municipio, contagem.paginas, ultima=False)
+            contagem.paginas += 1
+        f = self._file(self.page_path(uf, municipio, contagem.paginas), novo)
+        if novo:
+            titulo = "%s — município %s — página %d" % (uf or "sem UF", municipio,
+                                                        contagem.paginas)
+            f.write(CABECALHO % (html.escape(titulo), html.escape(titulo)))
+            f.write("<p><a href='index.html'>Município</a> · <a href='../index.html'>UF</a>"
+                    " · <a href='../../index.html'>Início</a></p>\n" + TABELA)
+        f.write(render_row(resultado))
+        contagem.add(resultado)
+        self.ufs[uf].add(resultado)
+        self.total.add(resultado)
+
+    def _close_page(self, uf, municipio, pagina, ultima):
+        f = self._file(self.page_path(uf, municipio, pagina), False)
+        f.write("</table>\n<p>")
+        if pagina > 1:
+            f.write("<a href='pagina-%05d.html'>&larr; anterior</a> " % (pagina - 1))
+        if not ultima:
+            f.write("<a href='pagina-%05d.html'>próxima &rarr;</a>" % (pagina + 1))
+        f.write("</p>\n" + RODAPE)
+        f.close()
+        del self.abertos[self.page_path(uf, municipio, pagina)]
+
+    def _index(self, caminho, titulo, linhas, voltar=None):
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(CABECALHO % (html.escape(titulo), html.escape(titulo)))
+            if voltar:
+                f.write("<p><a href='%s'>Voltar</a></p>\n" % voltar)
+            f.write("<table><tr><th></th><th>Seções</th><th>Válidas</th>"
+                    "<th>Inválidas ou com erro</th></tr>\n")
+            for rotulo, link, contagem in linhas:
+                f.write("<tr><td><a href='%s'>%s</a></td><td>%d</td><td class='valida'>%d</td>"
+                        "<td class='invalida'>%d</td></tr>\n" % (
+                            html.escape(link, quote=True), html.escape(rotulo), contagem.secoes,
+                            contagem.validas, contagem.invalidas))
+            f.write("</table>\n" + RODAPE)
+
+    def finish(self):
+        for (uf, municipio), contagem in self.municipios.items():
+            self._close_page(uf, municipio, contagem.paginas, ultima=True)
+        por_uf = collections.defaultdict(list)
+        for (uf, municipio), contagem in sorted(self.municipios.items()):
+            por_uf[uf].append((municipio, contagem))
+            caminho = self.folder(uf, municipio) / "index.html"
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            with open(caminho, "w", encoding="utf-8") as f:
+                titulo = "%s — município %s" % (uf or "sem UF", municipio)
+                f.write(CABECALHO % (html.escape(titulo), html.escape(titulo)))
+                f.write("<p><a href='../index.html'>Voltar</a></p>\n")
+                f.write("<p>%d seções, %d válidas, %d inválidas ou com erro.</p>\n<ul>\n" % (
+                    contagem.secoes, contagem.validas, contagem.invalidas))
+                for pagina in range(1, contagem.paginas + 1):
+                    f.write("<li><a href='pagina-%05d.html'>Página %d</a></li>\n" % (
+                        pagina, pagina))
+                f.write("</ul>\n" + RODAPE)
+        for uf, municipios in por_uf.items():
+            self._index(self.folder(uf) / "index.html",
+                        "UF %s" % (uf or "sem UF"),
+                        [(m, m + "/index.html", c) for m, c in municipios], "../index.html")
+        self._index(self.saida / "index.html", "Verificação das urnas",
+                    [(uf or "sem UF", (uf or "sem-uf") + "/index.html", self.ufs[uf])
+                     for uf in sorted(self.ufs)])
+
+
+def write_report(resultados, saida, por_pagina=500, salvar=None):
+    """
+    Consome `resultados` (iterável de dicionários de verify_sections) e grava
+    o relatório em `saida`. Com `salvar`, grava também os resultados em JSONL.
+    """
+    writer = ReportWriter(saida, por_pagina)
+    arquivo = open(salvar, "w") if salvar else None
+    try:
+        for resultado in resultados:
+            writer.add(resultado)
+            if arquivo:
+                arquivo.write(json.dumps(resultado) + "\n")
+        writer.finish()
+    finally:
+        if arquivo:
+            arquivo.close()
+    return writer.total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("saida")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--diretorio", help="Verifica as seções deste diretório")
+    origem.add_argument("--resultados", help="JSONL com resultados já verificados")
+    parser.add_argument("--por-pagina", type=int, default=500)
+    parser.add_argument("--salvar-resultados", help="Grava os resultados em JSONL")
+    args = parser.parse_args()
+
+    if args.diretorio:
+        resultados = verify_sections(args.diretorio)
+    else:
+        resultados = read_results(args.resultados)
+    total = write_report(resultados, args.saida, args.por_pagina, args.salvar_resultados)
+    print("%d seções: %d válidas, %d inválidas ou com erro. Relatório em %s" % (
+        total.secoes, total.validas, total.invalidas,
+        os.path.join(args.saida, "index.html")), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
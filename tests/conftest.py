@@ -0,0 +1,19 @@
+import pytest
+
+import fixtures
+
+
+@pytest.fixture(scope="session")
+def ca():
+    return fixtures.make_ca()
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory, ca):
+    """
+    Três seções sintéticas assinadas pela mesma AC, com logs pequenos.
+    """
+    diretorio = tmp_path_factory.mktemp("secoes")
+    return [fixtures.make_section(diretorio, "%013d" % (100700090001 + i),
+                                  tamanho_bu=5000, tamanho_log=20000, ca=ca)
+            for i in range(3)]
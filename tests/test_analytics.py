@@ -0,0 +1,12 @@
+"""
+Metadados e veredictos dos envelopes de um diretório.
+"""
+import analytics
+
+
+def test_scan_verdict_rates(dataset):
+    store, rejeitadas = analytics.scan(dataset[0]["sign"].parent, lote=2)
+    assert rejeitadas == []
+    assert len(store) == 3
+    assert store.count_by_chave() == {"SINTETICO": 3}
+    assert store.verdict_rates_by_uf() == {"": (3, 3, 1.0)}
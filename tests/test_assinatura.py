@@ -0,0 +1,105 @@
+"""
+Testes diferenciais do decodificador especializado de `Assinatura`
+(fast_decode_assinatura) contra o codec genérico do asn1tools.
+"""
+import random
+import zipfile
+
+import pytest
+
+import verificacao
+
+
+def generic_decode(data):
+    return verificacao.conv.decode("Assinatura", bytes(data))
+
+
+def fast_decode(data):
+    return {'arquivosAssinados': [arquivo.as_dict() for arquivo in
+                                  verificacao.fast_decode_assinatura(data)['arquivosAssinados']]}
+
+
+def random_assinatura(rng):
+    arquivos = []
+    for _ in range(rng.randrange(0, 20)):
+        arquivos.append({
+            'nomeArquivo': "".join(rng.choice("abcdefghij0123456789.-_")
+                                   for _ in range(rng.randrange(0, 200))),
+            'assinatura': {
+                'tamanho': rng.choice([0, -1, 132, 139, rng.randrange(-1 << 40, 1 << 40)]),
+                'hash': rng.randbytes(rng.choice([0, 32, 64, 200])),
+                'assinatura': rng.randbytes(rng.choice([0, 64, 139, 300])),
+            }})
+    return verificacao.conv.encode("Assinatura", {'arquivosAssinados': arquivos})
+
+
+@pytest.mark.parametrize("semente", range(50))
+def test_synthetic_encodings_match(semente):
+    data = random_assinatura(random.Random(semente))
+    assert fast_decode(data) == generic_decode(data)
+
+
+def test_envelopes_match(dataset):
+    for secao in dataset:
+        with zipfile.ZipFile(secao["sign"]) as pacote:
+            for nome in pacote.namelist():
+                envelope = verificacao.decode_envelope(pacote.read(nome))
+                conteudo = envelope["conteudoAutoAssinado"]
+                assert fast_decode(conteudo) == generic_decode(conteudo)
+
+
+def test_long_form_lengths_match():
+    # Nomes e assinaturas com mais de 127 e de 255 bytes usam comprimentos
+    # de um e dois bytes extras.
+    data = verificacao.conv.encode("Assinatura", {'arquivosAssinados': [{
+        'nomeArquivo': "x" * 300,
+        'assinatura': {'tamanho': 1, 'hash': b"h" * 130, 'assinatura': b"s" * 70000}}]})
+    assert fast_decode(data) == generic_decode(data)
+
+
+def test_indefinite_length_is_left_to_generic_decoder():
+    data = bytearray(random_assinatura(random.Random(1)))
+    # Troca o comprimento externo pela forma indefinida.
+    inicio, fim = verificacao.tlv_span(data, 0)
+    indefinido = b"\x30\x80" + bytes(data[inicio:fim]) + b"\x00\x00"
+    with pytest.raises(ValueError):
+        verificacao.fast_decode_assinatura(indefinido)
+    assert verificacao.decode_assinaturas(
+        {"conteudoAutoAssinado": indefinido}) == generic_decode(indefinido)
+
+
+@pytest.mark.parametrize("semente", range(200))
+def test_corrupted_encodings(semente):
+    # Com bytes alterados ou truncados, o decodificador especializado ou
+    # recusa a entrada com ValueError, ou concorda com o genérico.
+    rng = random.Random(semente)
+    data = bytearray(random_assinatura(rng))
+    if not data:
+        return
+    if rng.random() < 0.3:
+        del data[rng.randrange(len(data)):]
+    else:
+        for _ in range(rng.randrange(1, 4)):
+            data[rng.randrange(len(data))] = rng.randrange(256)
+    try:
+        rapido = fast_decode(data)
+    except ValueError:
+        return
+    assert rapido == generic_decode(data)
+
+
+def tlv(tag, conteudo):
+    tamanho = len(conteudo)
+    if tamanho < 0x80:
+        return bytes([tag, tamanho]) + conteudo
+    tamanho = tamanho.to_bytes((tamanho.bit_length() + 7) // 8, 'big')
+    return bytes([tag, 0x80 | len(tamanho)]) + tamanho + conteudo
+
+
+def test_trailing_fields_are_rejected():
+    data = verificacao.conv.encode("Assinatura", {'arquivosAssinados': [{
+        'nomeArquivo': "a.bu",
+        'assinatura': {'tamanho': 1, 'hash': b"h", 'assinatura': b"s"}}]})
+    inicio, fim = verificacao.tlv_span(data, 0)
+    with pytest.raises(ValueError):
+        verificacao.fast_decode_assinatura(tlv(0x30, data[inicio:fim] + tlv(0x04, b"")))
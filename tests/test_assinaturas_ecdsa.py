@@ -0,0 +1,80 @@
+"""
+check_signature_batch deve dar exatamente as mesmas respostas que
+check_signature, assinatura por assinatura.
+"""
+import hashlib
+import random
+
+import pytest
+
+import fixtures
+import verificacao
+
+
+@pytest.fixture(scope="module")
+def chaves():
+    resultado = []
+    for i in range(3):
+        key = fixtures.make_key()
+        cert = fixtures.make_certificate("UE: %d" % i, key)
+        resultado.append((key, verificacao.pubkey_from_cert(cert)))
+    return resultado
+
+
+def signed_item(key, pub_key, conteudo):
+    hash_arquivo = hashlib.sha512(hashlib.sha512(conteudo).digest()).digest()
+    return hash_arquivo, fixtures.sign(key, hash_arquivo), pub_key
+
+
+def tamper(item, rng, chaves):
+    hash_arquivo, assinatura, pub_key = item
+    tipo = rng.choice(["hash", "assinatura", "chave", "lixo"])
+    if tipo == "hash":
+        hash_arquivo = bytes([hash_arquivo[0] ^ 1]) + hash_arquivo[1:]
+    elif tipo == "assinatura":
+        posicao = rng.randrange(8, len(assinatura))
+        assinatura = assinatura[:posicao] + bytes([assinatura[posicao] ^ 0x10]) + \
+            assinatura[posicao + 1:]
+    elif tipo == "chave":
+        pub_key = next(p for _, p in chaves if p is not pub_key)
+    else:
+        assinatura = rng.randbytes(len(assinatura))
+    return hash_arquivo, assinatura, pub_key
+
+
+def expected(itens):
+    return [verificacao.check_signature(*item) for item in itens]
+
+
+def test_all_valid(chaves):
+    itens = [signed_item(key, pub_key, b"arquivo %d" % i)
+             for i, (key, pub_key) in enumerate(chaves * 4)]
+    assert verificacao.check_signature_batch(itens) == [True] * len(itens)
+
+
+@pytest.mark.parametrize("semente", range(6))
+@pytest.mark.parametrize("tamanho_lote", [1, 3, 8])
+def test_mixed_matches_individual(chaves, semente, tamanho_lote):
+    rng = random.Random(semente)
+    itens = []
+    for i in range(12):
+        key, pub_key = rng.choice(chaves)
+        item = signed_item(key, pub_key, b"%d-%d" % (semente, i))
+        if rng.random() < 0.4:
+            item = tamper(item, rng, chaves)
+        itens.append(item)
+    assert verificacao.check_signature_batch(itens, tamanho_lote) == expected(itens)
+
+
+def test_malformed_signatures(chaves):
+    key, pub_key = chaves[0]
+    hash_arquivo, assinatura, _ = signed_item(key, pub_key, b"x")
+    itens = [(hash_arquivo, b"", pub_key), (hash_arquivo, b"\x30\x00", pub_key),
+             (hash_arquivo, assinatura[:-1], pub_key), (hash_arquivo, assinatura, pub_key)]
+    resultado = verificacao.check_signature_batch(itens)
+    assert resultado[:3] == [False] * 3
+    assert resultado[3] is True
+
+
+def test_empty_batch():
+    assert verificacao.check_signature_batch([]) == []
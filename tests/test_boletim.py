@@ -0,0 +1,59 @@
+"""
+Especificação do Boletim de Urna (BOLETIM). Os arquivos sintéticos são
+codificados com a própria especificação, então só os boletins reais
+mostram que ela foi transcrita corretamente: aponte URNAHASH_AMOSTRAS para
+um diretório com arquivos baixados do TSE (.bu e, opcionalmente, o ZIP de
+assinaturas da mesma seção) para testá-los.
+"""
+import os
+
+import pytest
+
+import apuracao
+import fixtures
+import verificacao
+
+AMOSTRAS = os.environ.get("URNAHASH_AMOSTRAS")
+SECOES = [s for s in verificacao.find_sections(AMOSTRAS) if s["bu"]] if AMOSTRAS else []
+
+
+def identificacao(secao):
+    numero = secao.split("-")[-1]
+    return int(numero[:5]), int(numero[5:9]), int(numero[9:])
+
+
+def check_bu(bu_decoded, secao):
+    identificacao_secao = bu_decoded['identificacaoSecao']
+    assert (identificacao_secao['municipioZona']['municipio'],
+            identificacao_secao['municipioZona']['zona'],
+            identificacao_secao['secao']) == identificacao(secao)
+    votos = list(verificacao.extract_votes(bu_decoded))
+    assert votos
+    assert all(quantidade >= 0 for *_, quantidade in votos)
+
+
+def test_synthetic_round_trip():
+    secao = "0100700090001"
+    check_bu(verificacao.decode_bu(fixtures.make_bu(secao)), "o00407-" + secao)
+
+
+def test_verified_bu(dataset):
+    secao = dataset[0]
+    assert apuracao.verified_bu(secao["sign"], secao["bu"]) == secao["bu"].read_bytes()
+    assert apuracao.verified_bu(secao["sign"], dataset[1]["bu"]) is None
+
+
+def test_verified_bu_size_limit(dataset, tmp_path):
+    grande = tmp_path / "grande.bu"
+    grande.write_bytes(b"\0" * (verificacao.DECODE_LIMITS.max_size + 1))
+    with pytest.raises(verificacao.UntrustedInput, match="BU maior"):
+        apuracao.verified_bu(dataset[0]["sign"], grande)
+
+
+@pytest.mark.skipif(not SECOES, reason="URNAHASH_AMOSTRAS sem boletins reais")
+@pytest.mark.parametrize("secao", SECOES, ids=[s["secao"] for s in SECOES])
+def test_real_bu(secao):
+    with open(secao["bu"], 'rb') as f:
+        check_bu(verificacao.decode_bu(f.read()), secao["secao"])
+    if secao["sign"]:
+        assert apuracao.verified_bu(secao["sign"], secao["bu"]) is not None
@@ -0,0 +1,74 @@
+"""
+Validação da cadeia de certificados: assinaturas, período de validade e
+basicConstraints dos emissores.
+"""
+import datetime
+
+import pytest
+
+import fixtures
+import verificacao
+
+UTC = datetime.timezone.utc
+
+
+class Store:
+    def __init__(self, *certs):
+        self.certs = list(certs)
+
+    def __len__(self):
+        return len(self.certs)
+
+    def issuers(self, der):
+        return self.certs
+
+
+def test_valid_chain(ca):
+    leaf = fixtures.make_certificate("UE: 1", fixtures.make_key(), ca["cn"], ca["key"])
+    assert verificacao.validate_chain(leaf, Store(ca["cert"])) is True
+
+
+def test_empty_store_is_not_configured(ca):
+    assert verificacao.validate_chain(ca["cert"], Store()) is None
+
+
+def test_wrong_issuer_key(ca):
+    outra = fixtures.make_ca("Outra AC")
+    leaf = fixtures.make_certificate("UE: 1", fixtures.make_key(), outra["cn"], outra["key"])
+    assert verificacao.validate_chain(leaf, Store(ca["cert"])) is False
+
+
+@pytest.mark.parametrize("momento", [datetime.datetime(2021, 12, 31, tzinfo=UTC),
+                                     datetime.datetime(2032, 1, 2, tzinfo=UTC)])
+def test_outside_validity_period(ca, momento):
+    leaf = fixtures.make_certificate("UE: 1", fixtures.make_key(), ca["cn"], ca["key"])
+    assert verificacao.validate_chain(leaf, Store(ca["cert"]), momento=momento) is False
+
+
+def test_expired_leaf(ca):
+    leaf = fixtures.make_certificate(
+        "UE: 1", fixtures.make_key(), ca["cn"], ca["key"],
+        validade=(datetime.datetime(2023, 1, 1), datetime.datetime(2024, 1, 1)))
+    assert verificacao.validate_chain(leaf, Store(ca["cert"])) is False
+    assert verificacao.validate_chain(leaf, Store(ca["cert"]), momento=datetime.datetime(
+        2023, 6, 1, tzinfo=UTC)) is True
+
+
+def test_issuer_without_ca_constraint():
+    key = fixtures.make_key()
+    emissor = fixtures.make_certificate("Não é AC", key)
+    leaf = fixtures.make_certificate("UE: 1", fixtures.make_key(), "Não é AC", key)
+    assert verificacao.check_issued_by(emissor, leaf) is True
+    assert verificacao.validate_chain(leaf, Store(emissor)) is False
+
+
+@pytest.mark.parametrize("algoritmo, parametros", [
+    ('1.2.840.113549.1.1.1', None),
+    ('1.2.840.10045.2.1', b'\x06\x03\x2b\x81\x04'),
+])
+def test_unsupported_public_keys(algoritmo, parametros):
+    spki = {'algorithm': {'algorithm': algoritmo}, 'subjectPublicKey': (b'\x04', 8)}
+    if parametros is not None:
+        spki['algorithm']['parameters'] = parametros
+    with pytest.raises(verificacao.UntrustedInput):
+        verificacao.pubkey_from_spki(spki)
@@ -0,0 +1,54 @@
+"""
+check_tlv: estrutura TLV válida, malformada ou acima dos limites.
+"""
+import pytest
+
+import verificacao
+
+LIMITES = verificacao.DecodeLimits(max_size=1000, max_depth=4, max_items=5, max_seconds=1)
+
+
+def test_valid_der(ca):
+    assert verificacao.check_tlv(ca["cert"]) == len(ca["cert"])
+
+
+def test_returns_end_of_first_element():
+    assert verificacao.check_tlv(b"\x04\x01x\x04\x00", LIMITES) == 3
+
+
+def test_indefinite_length():
+    assert verificacao.check_tlv(b"\x30\x80\x04\x01x\x00\x00", LIMITES) == 7
+
+
+@pytest.mark.parametrize("data", [
+    b"\x30",                        # só a tag
+    b"\x30\x05\x04\x01",            # conteúdo truncado
+    b"\x30\x03\x04\x05xxxxx",       # filho maior que o pai
+    b"\x04\x80\x00\x00",            # comprimento indefinido em primitivo
+    b"\x04\x85\x01\x00\x00\x00\x00",  # comprimento de mais de 4 bytes
+    b"\x1f\x81\x81\x81\x81\x01\x00",  # tag longa demais
+    b"\x30\x80\x04\x01x",           # indefinido sem fim
+])
+def test_malformed(data):
+    with pytest.raises(verificacao.UntrustedInput):
+        verificacao.check_tlv(data, LIMITES)
+
+
+def test_depth_limit():
+    data = b"\x04\x00"
+    for _ in range(LIMITES.max_depth):
+        data = bytes([0x30, len(data)]) + data
+    verificacao.check_tlv(data, LIMITES)
+    with pytest.raises(verificacao.UntrustedInput):
+        verificacao.check_tlv(bytes([0x30, len(data)]) + data, LIMITES)
+
+
+def test_items_limit():
+    verificacao.check_tlv(b"\x30\x0a" + b"\x04\x00" * 5, LIMITES)
+    with pytest.raises(verificacao.UntrustedInput):
+        verificacao.check_tlv(b"\x30\x0c" + b"\x04\x00" * 6, LIMITES)
+
+
+def test_size_limit():
+    with pytest.raises(verificacao.UntrustedInput):
+        verificacao.check_tlv(b"\x04\x82\x03\xe8" + b"x" * 1000, LIMITES)
@@ -0,0 +1,35 @@
+"""
+Cache em disco das especificações ASN.1 analisadas.
+"""
+import pickle
+import sys
+
+import pytest
+
+import verificacao
+
+TEXTO = """
+Teste DEFINITIONS IMPLICIT TAGS ::= BEGIN
+    Numero ::= INTEGER
+END
+"""
+
+
+class Removida:
+    pass
+
+
+@pytest.mark.parametrize("conteudo", [
+    b"lixo",
+    b"",
+    # Classe que deixou de existir, como depois de atualizar o asn1tools.
+    pickle.dumps(Removida()).replace(b"Removida", b"Sumida__"),
+], ids=["lixo", "vazio", "classe-removida"])
+def test_corrupt_cache_is_reparsed(tmp_path, monkeypatch, conteudo):
+    monkeypatch.setattr(verificacao, "__file__", str(tmp_path / "verificacao.py"))
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    esperado = verificacao.parsed_schema(TEXTO)
+    (cache,) = (tmp_path / "__pycache__").glob("asn1-*.pickle")
+    cache.write_bytes(conteudo)
+    assert verificacao.parsed_schema(TEXTO) == esperado
+    assert pickle.loads(cache.read_bytes()) == esperado
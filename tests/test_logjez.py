@@ -0,0 +1,69 @@
+"""
+Leitura do .logjez (7z com LZMA) em fluxo.
+"""
+import io
+
+import pytest
+
+import fixtures
+import logjez
+import verificacao
+
+
+def test_events_and_digest():
+    texto = fixtures.make_log("0100700090001", 30000)
+    dados = fixtures.make_7z("logd.dat", texto)
+    stream = logjez.LogStream(io.BytesIO(dados), chunk_size=1000)
+    eventos = list(stream)
+    assert eventos == [logjez.parse_line(linha) for linha in texto.split(b"\n") if linha]
+    assert stream.digest == verificacao.hash_file(dados)
+
+
+def test_layout():
+    texto = b"30/10/2022 08:00:00\tINFO\t1\tVOTA\tmensagem\t0\n" * 100
+    dados = fixtures.make_7z("logd.dat", texto)
+    info = logjez.read_layout(io.BytesIO(dados))
+    assert info["unpack_size"] == len(texto)
+    assert logjez.decompress(info, dados[info["pack_pos"]:info["pack_pos"] + info["pack_size"]]) \
+        == texto
+
+
+def test_not_7z():
+    with pytest.raises(ValueError):
+        logjez.read_layout(io.BytesIO(b"PK\x03\x04" + b"\0" * 60))
+
+
+def test_section_log(dataset):
+    secao = dataset[0]
+    with logjez.open_log(secao["log"]) as f:
+        stream = logjez.LogStream(f)
+        assert sum(1 for _ in stream) > 0
+    assert logjez.signed_log(secao["sign"], stream.digest)
+    assert not logjez.signed_log(dataset[1]["sign"], stream.digest)
+
+
+class SemSeek(io.RawIOBase):
+    def __init__(self, dados):
+        self.dados = io.BytesIO(dados)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.dados.readinto(b)
+
+
+def test_read_once_in_order():
+    # LogStream não pode voltar atrás: um membro deflate do ZIP seria
+    # descompactado de novo.
+    texto = fixtures.make_log("0100700090002", 30000)
+    dados = fixtures.make_7z("logd.dat", texto)
+    stream = logjez.LogStream(SemSeek(dados), chunk_size=777, spool_size=1000)
+    assert len(list(stream)) == texto.count(b"\n")
+    assert stream.digest == verificacao.hash_file(dados)
+
+
+def test_truncated():
+    dados = fixtures.make_7z("logd.dat", b"linha\n" * 100)
+    with pytest.raises(ValueError):
+        list(logjez.LogStream(io.BytesIO(dados[:len(dados) // 2])))
@@ -0,0 +1,13 @@
+"""
+Etapas do pipeline de verificação de um diretório.
+"""
+import pipeline
+
+
+def test_undecodable_envelope_is_reported(dataset):
+    item = pipeline.hash_item(pipeline.read_item(dict(dataset[0], secao="s", uf="")))
+    item["arquivos"].append(("o00407-0100700090001.vscsoft", b"\x30\x03lixo"))
+    (resultado,), _ = pipeline.verify_batch([item])
+    assert resultado["log"] and resultado["bu"] and resultado["erro"] is None
+    assert len(resultado["avisos"]) == 1
+    assert resultado["avisos"][0].startswith("o00407-0100700090001.vscsoft: ")
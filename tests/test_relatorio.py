@@ -0,0 +1,19 @@
+"""
+Relatório HTML gravado a partir dos resultados.
+"""
+import relatorio
+
+
+def test_folder_name():
+    assert relatorio.folder_name("SP/1", "") == "SP_1"
+    assert relatorio.folder_name("..", "sem-uf") == "sem-uf"
+    assert relatorio.folder_name("x' onclick='y", "") == "x__onclick__y"
+
+
+def test_report_stays_inside_output(tmp_path):
+    resultados = [{"secao": "o00407-0100700090001", "uf": "../../x' a='b", "log": True, "bu": True,
+                   "hash_log": None, "hash_bu": None, "erro": None, "avisos": []}]
+    saida = tmp_path / "saida"
+    relatorio.write_report(resultados, saida)
+    assert all(saida in p.parents for p in tmp_path.rglob("*.html"))
+    assert "href='.._.._x__a__b/index.html'" in (saida / "index.html").read_text(encoding="utf-8")
@@ -0,0 +1,71 @@
+"""
+Leitura e verificação de uma seção completa.
+"""
+import pytest
+
+import verificacao
+
+
+def test_valid_section(dataset):
+    secao = dataset[0]
+    section = verificacao.read_section(secao["sign"], secao["log"], secao["bu"])
+    for arquivo in ("log", "bu"):
+        original, _, atual = section[arquivo]
+        assert original == atual
+        assert verificacao.verify_section(section, arquivo)
+
+
+def test_files_from_another_section(dataset):
+    section = verificacao.read_section(dataset[0]["sign"], dataset[1]["log"], dataset[1]["bu"])
+    for arquivo in ("log", "bu"):
+        original, _, atual = section[arquivo]
+        assert original != atual
+        assert not verificacao.verify_section(section, arquivo)
+
+
+def test_precomputed_digests_are_used(dataset):
+    secao = dataset[0]
+    section = verificacao.read_section(secao["sign"], secao["log"], secao["bu"],
+                                       {"bu": b"x" * 64})
+    assert section["bu"][2] == b"x" * 64
+    assert section["log"][0] == section["log"][2]
+
+
+def test_position_fallback_only_in_vscmr():
+    arquivos = [("a", b"1" * 64, b"s1"), ("b", b"2" * 64, b"s2")]
+    envelopes = [{"nome": "o00407.vscmr", "arquivos": arquivos,
+                  "certificado": b"", "pub_key": None}]
+    tabela = verificacao.merge_signed_files(envelopes)
+    assert verificacao.find_signed(tabela, envelopes, "bu") is tabela[arquivos[verificacao.POSICAO["bu"]][0]]
+    envelopes[0]["nome"] = "o00407.vscsoft"
+    tabela = verificacao.merge_signed_files(envelopes)
+    with pytest.raises(verificacao.UntrustedInput):
+        verificacao.find_signed(tabela, envelopes, "bu")
+
+
+def test_iter_sections_matches_find_sections(dataset, tmp_path):
+    for i, secao in enumerate(dataset):
+        uf = tmp_path / "SP" / str(i)
+        uf.mkdir(parents=True)
+        for arquivo in ("sign", "log", "bu"):
+            (uf / secao[arquivo].name).write_bytes(secao[arquivo].read_bytes())
+    (tmp_path / "SP" / "o00407-0100700099999.bu").write_bytes(b"")
+
+    def chaves(secoes):
+        return sorted((s["uf"], s["secao"], s["sign"], s["log"], s["bu"]) for s in secoes)
+    assert chaves(verificacao.iter_sections(tmp_path)) == chaves(verificacao.find_sections(tmp_path))
+    assert len(list(verificacao.iter_sections(tmp_path))) == 4
+
+
+def test_signature_jobs_find_entries_by_name():
+    arquivos = [{"nomeArquivo": nome, "assinatura": {"tamanho": 3, "hash": b"h" * 64,
+                                                     "assinatura": nome.encode()}}
+                for nome in ("o00407.logjez", "o00407.bu")]
+    conteudo = verificacao.conv.encode("Assinatura", {"arquivosAssinados": arquivos})
+    entidade = {"certificadoDigital": b"cert", "conteudoAutoAssinado": conteudo,
+                "autoAssinado": {"assinatura": {"assinatura": b"auto"}}}
+    jobs = verificacao.signature_jobs({"HW": entidade, "SW": entidade},
+                                      {"log": b"l", "bu": b"b"}, "o00407.vscmr")
+    assinaturas = {(tipo, arquivo): assinatura for tipo, arquivo, _, _, assinatura in jobs}
+    assert assinaturas[("SW", "bu")] == b"o00407.bu"
+    assert assinaturas[("HW", "log")] == b"o00407.logjez"
@@ -0,0 +1,101 @@
+"""
+ZipMemberDigest: hash do membro .logjez calculado a partir dos blocos do
+ZIP, comparado com o de open_member.
+"""
+import io
+import random
+import zipfile
+
+import pytest
+
+import verificacao
+
+
+def make_zip(path, membros, compressao):
+    with zipfile.ZipFile(path, 'w', compression=compressao) as pacote:
+        for nome, dados in membros:
+            pacote.writestr(nome, dados)
+
+
+def feed(path, rng):
+    digest = verificacao.ZipMemberDigest(".logjez")
+    dados = path.read_bytes()
+    pos = 0
+    while pos < len(dados):
+        n = rng.randrange(1, 5000)
+        digest.feed(dados[pos:pos + n])
+        pos += n
+    return digest
+
+
+def expected(path):
+    with verificacao.open_member(path, ".logjez") as f:
+        return verificacao.hash_stream(f)
+
+
+@pytest.mark.parametrize("compressao", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+@pytest.mark.parametrize("antes", [0, 1, 3])
+def test_matches_open_member(tmp_path, compressao, antes):
+    rng = random.Random(antes)
+    membros = [("outro%d.txt" % i, rng.randbytes(rng.randrange(10000))) for i in range(antes)]
+    membros.append(("o00407-1.logjez", rng.randbytes(50000) + b"a" * 50000))
+    path = tmp_path / "log.zip"
+    make_zip(path, membros, compressao)
+    digest = feed(path, rng)
+    assert not digest.falhou
+    assert digest.digest == expected(path)
+    assert digest.matches(path)
+
+
+def test_streamed_zip_with_data_descriptor(tmp_path):
+    # Um ZIP gravado em fluxo (sem seek) usa descritores de dados depois
+    # de cada membro, sem os tamanhos no cabeçalho local.
+    class SemSeek(io.RawIOBase):
+        def __init__(self):
+            self.dados = bytearray()
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            self.dados += b
+            return len(b)
+
+    saida = SemSeek()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        with pacote.open("o00407-1.logjez", 'w') as f:
+            f.write(b"log " * 20000)
+    path = tmp_path / "log.zip"
+    path.write_bytes(bytes(saida.dados))
+    digest = feed(path, random.Random(0))
+    assert digest.digest == expected(path)
+    assert digest.matches(path)
+
+
+def test_unsupported_compression_falls_back(tmp_path):
+    path = tmp_path / "log.zip"
+    make_zip(path, [("o00407-1.logjez", b"x" * 1000)], zipfile.ZIP_BZIP2)
+    digest = feed(path, random.Random(0))
+    assert digest.falhou
+    assert digest.digest is None
+    assert not digest.matches(path)
+
+
+def test_central_directory_must_agree(tmp_path):
+    # Dois membros .logjez: o do cabeçalho local é o primeiro, mas se o
+    # diretório central apontar para outro, o hash não pode ser usado.
+    path = tmp_path / "log.zip"
+    make_zip(path, [("a.logjez", b"primeiro"), ("b.logjez", b"segundo")], zipfile.ZIP_STORED)
+    digest = feed(path, random.Random(0))
+    assert digest.matches(path)
+    outro = tmp_path / "outro.zip"
+    make_zip(outro, [("b.logjez", b"segundo"), ("a.logjez", b"primeiro")], zipfile.ZIP_STORED)
+    with open(outro, 'r+b') as f:
+        f.write(path.read_bytes()[:40])
+    assert not digest.matches(outro)
+
+
+def test_not_a_zip():
+    digest = verificacao.ZipMemberDigest(".logjez")
+    digest.feed(b"isto nao e um zip" * 10)
+    assert digest.falhou
@@ -0,0 +1,2902 @@
+"""
+Núcleo da verificação do urnaHash, sem a interface.
+
+Decodificação dos envelopes de assinaturas e dos boletins de urna, hashes,
+chaves públicas, cadeia de certificados e verificação ECDSA (individual e em
+lote), além da leitura de seções e dos instrumentos de diagnóstico. É o que
+os scripts de linha de comando e os workers do pool de processos importam:
+não carrega o Shiny nem o Starlette, e as especificações ASN.1 só são
+compiladas (e o asn1tools só é importado) quando usadas pela primeira vez,
+a partir de uma análise guardada em __pycache__.
+
+Uso: import verificacao
+"""
+from pathlib import Path
+from ecpy.curves import Curve
+from ecpy.keys import ECPublicKey
+from ecpy.ecdsa import ECDSA
+from ecpy.eddsa import EDDSA
+from ecpy.formatters import decode_sig
+from base64 import b64decode
+import hashlib
+import zipfile
+import atexit
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import cProfile
+import datetime
+import functools
+import itertools
+import multiprocessing
+import os
+import pickle
+import re
+import secrets
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+
+ASSINATURA = """
+ModuloAssinaturaResultado DEFINITIONS IMPLICIT TAGS ::= BEGIN
+
+EXPORTS ALL;
+
+-- TIPOS
+DataHoraJE ::= GeneralString(SIZE(15))  -- Data e hora utilizada pela Justiça Eleitoral no formato YYYYMMDDThhmmss.
+
+-- ENUMS
+--Tipos de algoritmos de assinatura (cepesc é o algoritmo padrão (ainda não há previsão de uso dos demais)).
+AlgoritmoAssinatura ::= ENUMERATED {
+    rsa(1),
+    ecdsa(2),
+    cepesc(3)
+}
+
+-- Tipos de algoritmos de hash (Todos os algoritmos devem ser suportados, mas sha512 é o padrão).
+AlgoritmoHash ::= ENUMERATED {
+    sha1(1),
+    sha256(2),
+    sha384(3),
+    sha512(4)
+}
+
+-- Tipos de modelos de urna eletrônica.
+ModeloUrna ::= ENUMERATED {
+    ue2009(9),  -- Urna modelo 2009.
+    ue2010(10), -- Urna modelo 2010.
+    ue2011(11), -- Urna modelo 2011.
+    ue2013(13), -- Urna modelo 2013.
+    ue2015(15), -- Urna modelo 2015.
+    ue2020(20)  -- Urna modelo 2020.
+}
+
+-- ENVELOPE
+-- Entidade que engloba a lista de assinaturas utilizadas para assinar os arquivos para manter a integridade e segurança dos dados.
+EntidadeAssinatura ::= SEQUENCE {
+    dataHoraCriacao         DataHoraJE,                         -- Data e Hora da criacao do arquivo.
+    versao                  INTEGER (2..99999999),              -- Versao do protocolo (Alterações devem gerar novo valor. Nas eleições de 2012 foi utilizado o enumerado de valor 1, a partir de 2014 utilizar o valor 2).
+    autoAssinado            AutoAssinaturaDigital,              -- Informações da auto assinatura digital.
+    conteudoAutoAssinado    OCTET STRING,                       -- Conteúdo da assinatura do próprio arquivo.
+    certificadoDigital      OCTET STRING OPTIONAL,              -- Certificado digital da urna eletrônica.
+    conjuntoChave           GeneralString(SIZE(1..15)) OPTIONAL -- Identificador do conjunto de chaves usado para assinar o pacote.
+}
+
+-- Entidade responsável por gerar o arquivo de assinatura de todos os arquivos de resultados da urna.
+-- Podendo ter dois tipos de assinatura (Hardware (HW) e Software (SW)).
+-- Esses arquivos são informados na Mídia de Resultado quando a urna eletrônica é encerrada.
+EntidadeAssinaturaResultado ::= SEQUENCE {
+    modeloUrna      ModeloUrna,         -- Modelo da urna eletrônica.
+    assinaturaSW    EntidadeAssinatura, -- Assinatura realizada via software (normalmente CEPESC).
+    assinaturaHW    EntidadeAssinatura  -- Assinatura realizada via hardware de segurança da urna eletrônica.
+}
+
+-- Demais SEQUENCES
+-- Informações do algoritmo de hash.
+-- Informações do algoritmo de assinatura .
+AlgoritmoAssinaturaInfo ::= SEQUENCE {
+    algoritmo   AlgoritmoAssinatura,    -- Tipo do algoritmo de assinatura.
+    bits        INTEGER                 -- Tamanho da assinatura.
+}
+
+AlgoritmoHashInfo ::= SEQUENCE {
+    algoritmo AlgoritmoHash -- Tipo do algoritmo de hash.
+}
+
+-- Informações dos arquivos assinados.
+Assinatura ::= SEQUENCE {
+    arquivosAssinados SEQUENCE OF AssinaturaArquivo -- Lista com Informações dos arquivos assinados.
+}
+
+--Informações do arquivo e da assinatura.
+AssinaturaArquivo ::= SEQUENCE {
+    nomeArquivo GeneralString,      -- Nome do arquivo.
+    assinatura  AssinaturaDigital   -- Assinatura digital do arquivo.
+}
+
+-- Informações da assinatura digital
+AssinaturaDigital ::= SEQUENCE {
+    tamanho     INTEGER,        -- Tamanho da assinatura.
+    hash        OCTET STRING,   -- Hash da assinatura (Deve ser calculado uma única vez e ser utilizado também para o cálculo da assinatura).
+    assinatura  OCTET STRING    -- Assinatura (Gerado/verificado a partir do hash acima).
+}
+
+-- Informações da auto assinatura digital.
+AutoAssinaturaDigital ::= SEQUENCE {
+    usuario             DescritorChave,             -- Nome do usuário (Geralmente uma seção) que realizou a assinatura do arquivo.
+    algoritmoHash       AlgoritmoHashInfo,          -- Algoritmo de hash utilizado para realizar a assinatura (Será o mesmo para as assinaturas de arquivos).
+    algoritmoAssinatura AlgoritmoAssinaturaInfo,    -- Algoritmo utilizado para realizar a assinatura (Será o mesmo para as assinaturas de arquivos).
+    assinatura          AssinaturaDigital           -- Informações da assinatura digital.
+}
+
+-- Identificador com informações da assinatura.
+DescritorChave ::= SEQUENCE {
+    nomeUsuario GeneralString,  -- Nome do usuário (Geralmente uma seção) que realizou a assinatura no arquivo.
+    serial      INTEGER         -- Data em que foi gerado o conjunto de chaves.
+}
+
+END
+
+"""
+
+# Transcrita da especificação do Boletim de Urna do TSE (bu.asn1), sem o
+# arquivo oficial à mão para comparar. Os arquivos de fixtures.py são
+# gerados com ela mesma; tests/test_boletim.py decodifica boletins reais
+# quando URNAHASH_AMOSTRAS aponta para um diretório de arquivos do TSE.
+BOLETIM = """
+ModuloBoletimUrna DEFINITIONS IMPLICIT TAGS ::= BEGIN
+
+EXPORTS ALL;
+
+-- TIPOS
+DataHoraJE ::= GeneralString(SIZE(15))  -- Data e hora utilizada pela Justiça Eleitoral no formato YYYYMMDDThhmmss.
+NumeroSerieFlash ::= OCTET STRING(SIZE(4))  -- Número de série das flashes.
+NumeroPartido ::= INTEGER(0..99)  -- Número do partido.
+NumeroCargoConsultaLivre ::= INTEGER(1..99)  -- Número do cargo de consulta livre.
+IDEleicao ::= INTEGER(0..99999)  -- Identificador da eleição.
+
+-- ENUMS
+-- Cargos constitucionais.
+CargoConstitucional ::= ENUMERATED {
+    presidente(1),
+    vicePresidente(2),
+    governador(3),
+    viceGovernador(4),
+    senador(5),
+    deputadoFederal(6),
+    deputadoEstadual(7),
+    deputadoDistrital(8),
+    primeiroSuplenteSenador(9),
+    segundoSuplenteSenador(10),
+    prefeito(11),
+    vicePrefeito(12),
+    vereador(13)
+}
+
+-- Fase em que a urna foi utilizada.
+Fase ::= ENUMERATED {
+    simulado(1),
+    oficial(2),
+    treinamento(3)
+}
+
+-- Motivos para utilização do sistema de apuração.
+MotivoUtilizacaoSA ::= ENUMERATED {
+    naoFoiPossivelRecuperarResultado(1),
+    urnaComDefeito(2),
+    urnaIndisponivelInicio(3),
+    urnaIndisponivelDuranteVotacao(4),
+    outrosMotivos(99)
+}
+
+-- Tipos de arquivo gerados pela urna.
+TipoArquivo ::= ENUMERATED {
+    votacaoUE(1),
+    votacaoSA(2),
+    apuracaoSA(3),
+    apuracaoUEComBUVotacao(4)
+}
+
+-- Tipos de cargo.
+TipoCargoConsulta ::= ENUMERATED {
+    majoritario(1),
+    proporcional(2),
+    consulta(3)
+}
+
+-- Tipos de envelope.
+TipoEnvelope ::= ENUMERATED {
+    envelopeBoletimUrna(1),
+    envelopeRegistroDigitalVoto(2),
+    envelopeBoletimUrnaImpresso(3),
+    envelopeImagemBoletimUrna(4)
+}
+
+-- Tipos de urna.
+TipoUrna ::= ENUMERATED {
+    secao(1),
+    contingencia(3),
+    reservaSecao(4),
+    reservaEncerrandoSecao(6)
+}
+
+-- Tipos de voto.
+TipoVoto ::= ENUMERATED {
+    nominal(1),
+    branco(2),
+    nulo(3),
+    legenda(4),
+    cargoSemCandidato(5)
+}
+
+-- ENVELOPE
+-- Envelope genérico que contém o boletim de urna codificado em `conteudo`.
+EntidadeEnvelopeGenerico ::= SEQUENCE {
+    cabecalho       CabecalhoEntidade,  -- Cabeçalho com a data de geração e o identificador eleitoral.
+    fase            Fase,               -- Fase em que a urna foi utilizada.
+    urna            Urna,               -- Identificação da urna.
+    identificacao   Identificacao,      -- Seção ou contingência.
+    tipoEnvelope    TipoEnvelope,       -- Tipo do conteúdo.
+    conteudo        OCTET STRING        -- Entidade codificada (EntidadeBoletimUrna para o BU).
+}
+
+-- Boletim de urna.
+EntidadeBoletimUrna ::= SEQUENCE {
+    cabecalho                   CabecalhoEntidade,
+    fase                        Fase,
+    urna                        Urna,
+    identificacaoSecao          IdentificacaoSecaoEleitoral,
+    dataHoraEmissao             DataHoraJE,
+    dadosSecaoSA                DadosSecaoSA OPTIONAL,
+    qtdEleitoresLibCodigo       INTEGER,
+    qtdEleitoresCompBiometrico  INTEGER,
+    resultadosVotacaoPorEleicao SEQUENCE OF ResultadoVotacaoPorEleicao,
+    chaveAssinaturaVotosVotavel OCTET STRING OPTIONAL
+}
+
+-- Demais SEQUENCES
+CabecalhoEntidade ::= SEQUENCE {
+    dataGeracao DataHoraJE,     -- Data e hora de geração da entidade.
+    idEleitoral IDEleitoral     -- Processo eleitoral, pleito ou eleição.
+}
+
+IDEleitoral ::= CHOICE {
+    idProcessoEleitoral [0] INTEGER,
+    idPleito            [1] INTEGER,
+    idEleicao           [2] IDEleicao
+}
+
+Urna ::= SEQUENCE {
+    tipoUrna                    TipoUrna,
+    versaoVotacao               GeneralString,
+    correspondenciaResultado    CorrespondenciaResultado,
+    tipoArquivo                 TipoArquivo,
+    numeroSerieFV               NumeroSerieFlash,
+    motivoUtilizacaoSA          MotivoUtilizacaoSA OPTIONAL
+}
+
+CorrespondenciaResultado ::= SEQUENCE {
+    identificacao   Identificacao,
+    carga           Carga
+}
+
+Carga ::= SEQUENCE {
+    numeroInternoUrna   INTEGER,
+    numeroSerieFC       NumeroSerieFlash,
+    dataHoraCarga       DataHoraJE,
+    codigoCarga         GeneralString
+}
+
+Identificacao ::= CHOICE {
+    identificacaoSecaoEleitoral [0] IdentificacaoSecaoEleitoral,
+    identificacaoContingencia   [1] MunicipioZona
+}
+
+IdentificacaoSecaoEleitoral ::= SEQUENCE {
+    municipioZona   MunicipioZona,
+    local           INTEGER,
+    secao           INTEGER
+}
+
+MunicipioZona ::= SEQUENCE {
+    municipio   INTEGER,
+    zona        INTEGER
+}
+
+DadosSecaoSA ::= CHOICE {
+    dadosSecao  [0] DadosSecao,
+    dadosSA     [1] DadosSA
+}
+
+DadosSecao ::= SEQUENCE {
+    dataHoraAbertura        DataHoraJE,
+    dataHoraEncerramento    DataHoraJE
+}
+
+DadosSA ::= SEQUENCE {
+    juntaApuradora  INTEGER,
+    turmaApuradora  INTEGER
+}
+
+ResultadoVotacaoPorEleicao ::= SEQUENCE {
+    idEleicao           IDEleicao,
+    qtdEleitoresAptos   INTEGER,
+    resultadosVotacao   SEQUENCE OF ResultadoVotacao
+}
+
+ResultadoVotacao ::= SEQUENCE {
+    tipoCargo           TipoCargoConsulta,
+    qtdComparecimento   INTEGER,
+    totaisVotosCargo    SEQUENCE OF TotalVotosCargo
+}
+
+TotalVotosCargo ::= SEQUENCE {
+    codigoCargo     CodigoCargoConsulta,
+    ordemImpressao  INTEGER,
+    votosVotaveis   SEQUENCE OF TotalVotosVotavel
+}
+
+CodigoCargoConsulta ::= CHOICE {
+    cargoConstitucional         CargoConstitucional,
+    numeroCargoConsultaLivre    NumeroCargoConsultaLivre
+}
+
+TotalVotosVotavel ::= SEQUENCE {
+    tipoVoto                TipoVoto,
+    quantidadeVotos         INTEGER,
+    identificacaoVotavel    IdentificacaoVotavel OPTIONAL,
+    assinatura              OCTET STRING OPTIONAL
+}
+
+IdentificacaoVotavel ::= SEQUENCE {
+    partido NumeroPartido,
+    codigo  INTEGER
+}
+
+END
+
+"""
+
+X509 = '''
+PKIX1Explicit88 { iso(1) identified-organization(3) dod(6) internet(1)
+  security(5) mechanisms(5) pkix(7) id-mod(0) id-pkix1-explicit(18) }
+
+DEFINITIONS EXPLICIT TAGS ::=
+
+BEGIN
+
+-- EXPORTS ALL --
+
+-- IMPORTS NONE --
+
+-- UNIVERSAL Types defined in 1993 and 1998 ASN.1
+-- and required by this specification
+
+-- UniversalString ::= [UNIVERSAL 28] IMPLICIT OCTET STRING
+        -- UniversalString is defined in ASN.1:1993
+
+-- BMPString ::= [UNIVERSAL 30] IMPLICIT OCTET STRING
+      -- BMPString is the subtype of UniversalString and models
+      -- the Basic Multilingual Plane of ISO/IEC 10646
+
+-- UTF8String ::= [UNIVERSAL 12] IMPLICIT OCTET STRING
+      -- The content of this type conforms to RFC 3629.
+
+-- PKIX specific OIDs
+
+id-pkix  OBJECT IDENTIFIER  ::=
+         { iso(1) identified-organization(3) dod(6) internet(1)
+                    security(5) mechanisms(5) pkix(7) }
+
+-- PKIX arcs
+
+id-pe OBJECT IDENTIFIER ::= { id-pkix 1 }
+        -- arc for private certificate extensions
+id-qt OBJECT IDENTIFIER ::= { id-pkix 2 }
+        -- arc for policy qualifier types
+id-kp OBJECT IDENTIFIER ::= { id-pkix 3 }
+        -- arc for extended key purpose OIDS
+id-ad OBJECT IDENTIFIER ::= { id-pkix 48 }
+        -- arc for access descriptors
+
+-- policyQualifierIds for Internet policy qualifiers
+
+id-qt-cps      OBJECT IDENTIFIER ::=  { id-qt 1 }
+      -- OID for CPS qualifier
+id-qt-unotice  OBJECT IDENTIFIER ::=  { id-qt 2 }
+      -- OID for user notice qualifier
+
+-- access descriptor definitions
+
+id-ad-ocsp         OBJECT IDENTIFIER ::= { id-ad 1 }
+id-ad-caIssuers    OBJECT IDENTIFIER ::= { id-ad 2 }
+id-ad-timeStamping OBJECT IDENTIFIER ::= { id-ad 3 }
+id-ad-caRepository OBJECT IDENTIFIER ::= { id-ad 5 }
+
+-- attribute data types
+
+Attribute               ::= SEQUENCE {
+      type             AttributeType,
+      values    SET OF AttributeValue }
+            -- at least one value is required
+
+AttributeType           ::= OBJECT IDENTIFIER
+
+AttributeValue          ::= ANY -- DEFINED BY AttributeType
+
+AttributeTypeAndValue   ::= SEQUENCE {
+        type    AttributeType,
+        value   AttributeValue }
+
+-- suggested naming attributes: Definition of the following
+--   information object set may be augmented to meet local
+--   requirements.  Note that deleting members of the set may
+--   prevent interoperability with conforming implementations.
+-- presented in pairs: the AttributeType followed by the
+--   type definition for the corresponding AttributeValue
+
+-- Arc for standard naming attributes
+
+id-at OBJECT IDENTIFIER ::= { joint-iso-ccitt(2) ds(5) 4 }
+
+-- Naming attributes of type X520name
+
+id-at-name                AttributeType ::= { id-at 41 }
+id-at-surname             AttributeType ::= { id-at  4 }
+id-at-givenName           AttributeType ::= { id-at 42 }
+id-at-initials            AttributeType ::= { id-at 43 }
+id-at-generationQualifier AttributeType ::= { id-at 44 }
+
+-- Naming attributes of type X520Name:
+--   X520name ::= DirectoryString (SIZE (1..ub-name))
+--
+-- Expanded to avoid parameterized type:
+X520name ::= CHOICE {
+      teletexString     TeletexString   (SIZE (1..ub-name)),
+      printableString   PrintableString (SIZE (1..ub-name)),
+      universalString   UniversalString (SIZE (1..ub-name)),
+      utf8String        UTF8String      (SIZE (1..ub-name)),
+      bmpString         BMPString       (SIZE (1..ub-name)) }
+
+-- Naming attributes of type X520CommonName
+
+id-at-commonName        AttributeType ::= { id-at 3 }
+
+-- Naming attributes of type X520CommonName:
+--   X520CommonName ::= DirectoryName (SIZE (1..ub-common-name))
+--
+-- Expanded to avoid parameterized type:
+X520CommonName ::= CHOICE {
+      teletexString     TeletexString   (SIZE (1..ub-common-name)),
+      printableString   PrintableString (SIZE (1..ub-common-name)),
+      universalString   UniversalString (SIZE (1..ub-common-name)),
+      utf8String        UTF8String      (SIZE (1..ub-common-name)),
+      bmpString         BMPString       (SIZE (1..ub-common-name)) }
+
+-- Naming attributes of type X520LocalityName
+
+id-at-localityName      AttributeType ::= { id-at 7 }
+
+-- Naming attributes of type X520LocalityName:
+--   X520LocalityName ::= DirectoryName (SIZE (1..ub-locality-name))
+--
+-- Expanded to avoid parameterized type:
+X520LocalityName ::= CHOICE {
+      teletexString     TeletexString   (SIZE (1..ub-locality-name)),
+      printableString   PrintableString (SIZE (1..ub-locality-name)),
+      universalString   UniversalString (SIZE (1..ub-locality-name)),
+      utf8String        UTF8String      (SIZE (1..ub-locality-name)),
+      bmpString         BMPString       (SIZE (1..ub-locality-name)) }
+
+-- Naming attributes of type X520StateOrProvinceName
+
+id-at-stateOrProvinceName AttributeType ::= { id-at 8 }
+
+-- Naming attributes of type X520StateOrProvinceName:
+--   X520StateOrProvinceName ::= DirectoryName (SIZE (1..ub-state-name))
+--
+-- Expanded to avoid parameterized type:
+X520StateOrProvinceName ::= CHOICE {
+      teletexString     TeletexString   (SIZE (1..ub-state-name)),
+      printableString   PrintableString (SIZE (1..ub-state-name)),
+      universalString   UniversalString (SIZE (1..ub-state-name)),
+      utf8String        UTF8String      (SIZE (1..ub-state-name)),
+      bmpString         BMPString       (SIZE (1..ub-state-name)) }
+
+-- Naming attributes of type X520OrganizationName
+
+id-at-organizationName  AttributeType ::= { id-at 10 }
+
+-- Naming attributes of type X520OrganizationName:
+--   X520OrganizationName ::=
+--          DirectoryName (SIZE (1..ub-organization-name))
+--
+-- Expanded to avoid parameterized type:
+X520OrganizationName ::= CHOICE {
+      teletexString     TeletexString
+                          (SIZE (1..ub-organization-name)),
+      printableString   PrintableString
+                          (SIZE (1..ub-organization-name)),
+      universalString   UniversalString
+                          (SIZE (1..ub-organization-name)),
+      utf8String        UTF8String
+                          (SIZE (1..ub-organization-name)),
+      bmpString         BMPString
+                          (SIZE (1..ub-organization-name))  }
+
+-- Naming attributes of type X520OrganizationalUnitName
+
+id-at-organizationalUnitName AttributeType ::= { id-at 11 }
+
+-- Naming attributes of type X520OrganizationalUnitName:
+--   X520OrganizationalUnitName ::=
+--          DirectoryName (SIZE (1..ub-organizational-unit-name))
+--
+-- Expanded to avoid parameterized type:
+X520OrganizationalUnitName ::= CHOICE {
+      teletexString     TeletexString
+                          (SIZE (1..ub-organizational-unit-name)),
+      printableString   PrintableString
+                          (SIZE (1..ub-organizational-unit-name)),
+      universalString   UniversalString
+                          (SIZE (1..ub-organizational-unit-name)),
+      utf8String        UTF8String
+                          (SIZE (1..ub-organizational-unit-name)),
+      bmpString         BMPString
+                          (SIZE (1..ub-organizational-unit-name)) }
+
+-- Naming attributes of type X520Title
+
+id-at-title             AttributeType ::= { id-at 12 }
+
+-- Naming attributes of type X520Title:
+--   X520Title ::= DirectoryName (SIZE (1..ub-title))
+--
+-- Expanded to avoid parameterized type:
+X520Title ::= CHOICE {
+      teletexString     TeletexString   (SIZE (1..ub-title)),
+      printableString   PrintableString (SIZE (1..ub-title)),
+      universalString   UniversalString (SIZE (1..ub-title)),
+      utf8String        UTF8String      (SIZE (1..ub-title)),
+      bmpString         BMPString       (SIZE (1..ub-title)) }
+
+-- Naming attributes of type X520dnQualifier
+
+id-at-dnQualifier       AttributeType ::= { id-at 46 }
+
+X520dnQualifier ::=     PrintableString
+
+-- Naming attributes of type X520countryName (digraph from IS 3166)
+
+id-at-countryName       AttributeType ::= { id-at 6 }
+
+X520countryName ::=     PrintableString (SIZE (2))
+
+-- Naming attributes of type X520SerialNumber
+
+id-at-serialNumber      AttributeType ::= { id-at 5 }
+
+X520SerialNumber ::=    PrintableString (SIZE (1..ub-serial-number))
+
+-- Naming attributes of type X520Pseudonym
+
+id-at-pseudonym         AttributeType ::= { id-at 65 }
+
+-- Naming attributes of type X520Pseudonym:
+--   X520Pseudonym ::= DirectoryName (SIZE (1..ub-pseudonym))
+--
+-- Expanded to avoid parameterized type:
+X520Pseudonym ::= CHOICE {
+   teletexString     TeletexString   (SIZE (1..ub-pseudonym)),
+   printableString   PrintableString (SIZE (1..ub-pseudonym)),
+   universalString   UniversalString (SIZE (1..ub-pseudonym)),
+   utf8String        UTF8String      (SIZE (1..ub-pseudonym)),
+   bmpString         BMPString       (SIZE (1..ub-pseudonym)) }
+
+-- Naming attributes of type DomainComponent (from RFC 4519)
+
+id-domainComponent   AttributeType ::= { 0 9 2342 19200300 100 1 25 }
+
+DomainComponent ::=  IA5String
+
+-- Legacy attributes
+
+pkcs-9 OBJECT IDENTIFIER ::=
+       { iso(1) member-body(2) us(840) rsadsi(113549) pkcs(1) 9 }
+
+id-emailAddress      AttributeType ::= { pkcs-9 1 }
+
+EmailAddress ::=     IA5String (SIZE (1..ub-emailaddress-length))
+
+-- naming data types --
+
+Name ::= CHOICE { -- only one possibility for now --
+      rdnSequence  RDNSequence }
+
+RDNSequence ::= SEQUENCE OF RelativeDistinguishedName
+
+DistinguishedName ::=   RDNSequence
+
+RelativeDistinguishedName ::= SET SIZE (1..MAX) OF AttributeTypeAndValue
+
+-- Directory string type --
+
+DirectoryString ::= CHOICE {
+      teletexString       TeletexString   (SIZE (1..MAX)),
+      printableString     PrintableString (SIZE (1..MAX)),
+      universalString     UniversalString (SIZE (1..MAX)),
+      utf8String          UTF8String      (SIZE (1..MAX)),
+      bmpString           BMPString       (SIZE (1..MAX)) }
+
+-- certificate and CRL specific structures begin here
+
+Certificate  ::=  SEQUENCE  {
+     tbsCertificate       TBSCertificate,
+     signatureAlgorithm   AlgorithmIdentifier,
+     signature            BIT STRING  }
+
+TBSCertificate  ::=  SEQUENCE  {
+     version        [0] Version DEFAULT v1,
+     serialNumber         CertificateSerialNumber,
+     signature            AlgorithmIdentifier,
+     issuer               Name,
+     validity             Validity,
+     subject              Name,
+     subjectPublicKeyInfo SubjectPublicKeyInfo,
+     issuerUniqueID  [1]  IMPLICIT UniqueIdentifier OPTIONAL,
+                          -- If present, version MUST be v2 or v3
+     subjectUniqueID [2]  IMPLICIT UniqueIdentifier OPTIONAL,
+                          -- If present, version MUST be v2 or v3
+     extensions      [3]  Extensions OPTIONAL
+                          -- If present, version MUST be v3 -- }
+
+Version  ::=  INTEGER  {  v1(0), v2(1), v3(2)  }
+
+CertificateSerialNumber  ::=  INTEGER
+
+Validity ::= SEQUENCE {
+     notBefore      Time,
+     notAfter       Time  }
+
+Time ::= CHOICE {
+     utcTime        UTCTime,
+     generalTime    GeneralizedTime }
+
+UniqueIdentifier  ::=  BIT STRING
+
+SubjectPublicKeyInfo  ::=  SEQUENCE  {
+     algorithm            AlgorithmIdentifier,
+     subjectPublicKey     BIT STRING  }
+
+Extensions  ::=  SEQUENCE SIZE (1..MAX) OF Extension
+
+Extension  ::=  SEQUENCE  {
+     extnID      OBJECT IDENTIFIER,
+     critical    BOOLEAN DEFAULT FALSE,
+     extnValue   OCTET STRING
+                 -- contains the DER encoding of an ASN.1 value
+                 -- corresponding to the extension type identified
+                 -- by extnID
+     }
+
+-- CRL structures
+
+CertificateList  ::=  SEQUENCE  {
+     tbsCertList          TBSCertList,
+     signatureAlgorithm   AlgorithmIdentifier,
+     signature            BIT STRING  }
+
+TBSCertList  ::=  SEQUENCE  {
+     version                 Version OPTIONAL,
+                                   -- if present, MUST be v2
+     signature               AlgorithmIdentifier,
+     issuer                  Name,
+     thisUpdate              Time,
+     nextUpdate              Time OPTIONAL,
+     revokedCertificates     SEQUENCE OF SEQUENCE  {
+          userCertificate         CertificateSerialNumber,
+          revocationDate          Time,
+          crlEntryExtensions      Extensions OPTIONAL
+                                   -- if present, version MUST be v2
+                               }  OPTIONAL,
+     crlExtensions           [0] Extensions OPTIONAL }
+                                   -- if present, version MUST be v2
+
+-- Version, Time, CertificateSerialNumber, and Extensions were
+-- defined earlier for use in the certificate structure
+
+AlgorithmIdentifier  ::=  SEQUENCE  {
+     algorithm               OBJECT IDENTIFIER,
+     parameters              ANY DEFINED BY algorithm OPTIONAL  }
+                                -- contains a value of the type
+                                -- registered for use with the
+                                -- algorithm object identifier value
+
+-- X.400 address syntax starts here
+
+ORAddress ::= SEQUENCE {
+   built-in-standard-attributes BuiltInStandardAttributes,
+   built-in-domain-defined-attributes
+                   BuiltInDomainDefinedAttributes OPTIONAL,
+   -- see also teletex-domain-defined-attributes
+   extension-attributes ExtensionAttributes OPTIONAL }
+
+-- Built-in Standard Attributes
+
+BuiltInStandardAttributes ::= SEQUENCE {
+   country-name                  CountryName OPTIONAL,
+   administration-domain-name    AdministrationDomainName OPTIONAL,
+   network-address           [0] IMPLICIT NetworkAddress OPTIONAL,
+     -- see also extended-network-address
+   terminal-identifier       [1] IMPLICIT TerminalIdentifier OPTIONAL,
+   private-domain-name       [2] PrivateDomainName OPTIONAL,
+   organization-name         [3] IMPLICIT OrganizationName OPTIONAL,
+     -- see also teletex-organization-name
+   numeric-user-identifier   [4] IMPLICIT NumericUserIdentifier
+                                 OPTIONAL,
+   personal-name             [5] IMPLICIT PersonalName OPTIONAL,
+     -- see also teletex-personal-name
+   organizational-unit-names [6] IMPLICIT OrganizationalUnitNames
+                                 OPTIONAL }
+     -- see also teletex-organizational-unit-names
+
+CountryName ::= [APPLICATION 1] CHOICE {
+   x121-dcc-code         NumericString
+                           (SIZE (ub-country-name-numeric-length)),
+   iso-3166-alpha2-code  PrintableString
+                           (SIZE (ub-country-name-alpha-length)) }
+
+AdministrationDomainName ::= [APPLICATION 2] CHOICE {
+   numeric   NumericString   (SIZE (0..ub-domain-name-length)),
+   printable PrintableString (SIZE (0..ub-domain-name-length)) }
+
+NetworkAddress ::= X121Address  -- see also extended-network-address
+
+X121Address ::= NumericString (SIZE (1..ub-x121-address-length))
+
+TerminalIdentifier ::= PrintableString (SIZE (1..ub-terminal-id-length))
+
+PrivateDomainName ::= CHOICE {
+   numeric   NumericString   (SIZE (1..ub-domain-name-length)),
+   printable PrintableString (SIZE (1..ub-domain-name-length)) }
+
+OrganizationName ::= PrintableString
+                            (SIZE (1..ub-organization-name-length))
+  -- see also teletex-organization-name
+
+NumericUserIdentifier ::= NumericString
+                            (SIZE (1..ub-numeric-user-id-length))
+
+PersonalName ::= SET {
+   surname     [0] IMPLICIT PrintableString
+                    (SIZE (1..ub-surname-length)),
+   given-name  [1] IMPLICIT PrintableString
+                    (SIZE (1..ub-given-name-length)) OPTIONAL,
+   initials    [2] IMPLICIT PrintableString
+                    (SIZE (1..ub-initials-length)) OPTIONAL,
+   generation-qualifier [3] IMPLICIT PrintableString
+                    (SIZE (1..ub-generation-qualifier-length))
+                    OPTIONAL }
+  -- see also teletex-personal-name
+
+OrganizationalUnitNames ::= SEQUENCE SIZE (1..ub-organizational-units)
+                             OF OrganizationalUnitName
+  -- see also teletex-organizational-unit-names
+
+OrganizationalUnitName ::= PrintableString (SIZE
+                    (1..ub-organizational-unit-name-length))
+
+-- Built-in Domain-defined Attributes
+
+BuiltInDomainDefinedAttributes ::= SEQUENCE SIZE
+                    (1..ub-domain-defined-attributes) OF
+                    BuiltInDomainDefinedAttribute
+
+BuiltInDomainDefinedAttribute ::= SEQUENCE {
+   type PrintableString (SIZE
+                   (1..ub-domain-defined-attribute-type-length)),
+   value PrintableString (SIZE
+                   (1..ub-domain-defined-attribute-value-length)) }
+
+-- Extension Attributes
+
+ExtensionAttributes ::= SET SIZE (1..ub-extension-attributes) OF
+               ExtensionAttribute
+
+ExtensionAttribute ::=  SEQUENCE {
+   extension-attribute-type [0] IMPLICIT INTEGER
+                   (0..ub-extension-attributes),
+   extension-attribute-value [1]
+                   ANY DEFINED BY extension-attribute-type }
+
+-- Extension types and attribute values
+
+common-name INTEGER ::= 1
+
+CommonName ::= PrintableString (SIZE (1..ub-common-name-length))
+
+teletex-common-name INTEGER ::= 2
+
+TeletexCommonName ::= TeletexString (SIZE (1..ub-common-name-length))
+
+teletex-organization-name INTEGER ::= 3
+
+TeletexOrganizationName ::=
+                TeletexString (SIZE (1..ub-organization-name-length))
+
+teletex-personal-name INTEGER ::= 4
+
+TeletexPersonalName ::= SET {
+   surname     [0] IMPLICIT TeletexString
+                    (SIZE (1..ub-surname-length)),
+   given-name  [1] IMPLICIT TeletexString
+                    (SIZE (1..ub-given-name-length)) OPTIONAL,
+   initials    [2] IMPLICIT TeletexString
+                    (SIZE (1..ub-initials-length)) OPTIONAL,
+   generation-qualifier [3] IMPLICIT TeletexString
+                    (SIZE (1..ub-generation-qualifier-length))
+                    OPTIONAL }
+
+teletex-organizational-unit-names INTEGER ::= 5
+
+TeletexOrganizationalUnitNames ::= SEQUENCE SIZE
+      (1..ub-organizational-units) OF TeletexOrganizationalUnitName
+
+TeletexOrganizationalUnitName ::= TeletexString
+                  (SIZE (1..ub-organizational-unit-name-length))
+
+pds-name INTEGER ::= 7
+
+PDSName ::= PrintableString (SIZE (1..ub-pds-name-length))
+
+physical-delivery-country-name INTEGER ::= 8
+
+PhysicalDeliveryCountryName ::= CHOICE {
+   x121-dcc-code NumericString (SIZE (ub-country-name-numeric-length)),
+   iso-3166-alpha2-code PrintableString
+                               (SIZE (ub-country-name-alpha-length)) }
+
+postal-code INTEGER ::= 9
+
+PostalCode ::= CHOICE {
+   numeric-code   NumericString (SIZE (1..ub-postal-code-length)),
+   printable-code PrintableString (SIZE (1..ub-postal-code-length)) }
+
+physical-delivery-office-name INTEGER ::= 10
+
+PhysicalDeliveryOfficeName ::= PDSParameter
+
+physical-delivery-office-number INTEGER ::= 11
+
+PhysicalDeliveryOfficeNumber ::= PDSParameter
+
+extension-OR-address-components INTEGER ::= 12
+
+ExtensionORAddressComponents ::= PDSParameter
+
+physical-delivery-personal-name INTEGER ::= 13
+
+PhysicalDeliveryPersonalName ::= PDSParameter
+
+physical-delivery-organization-name INTEGER ::= 14
+
+PhysicalDeliveryOrganizationName ::= PDSParameter
+
+extension-physical-delivery-address-components INTEGER ::= 15
+
+ExtensionPhysicalDeliveryAddressComponents ::= PDSParameter
+
+unformatted-postal-address INTEGER ::= 16
+
+UnformattedPostalAddress ::= SET {
+   printable-address SEQUENCE SIZE (1..ub-pds-physical-address-lines)
+        OF PrintableString (SIZE (1..ub-pds-parameter-length)) OPTIONAL,
+   teletex-string TeletexString
+        (SIZE (1..ub-unformatted-address-length)) OPTIONAL }
+
+street-address INTEGER ::= 17
+
+StreetAddress ::= PDSParameter
+
+post-office-box-address INTEGER ::= 18
+
+PostOfficeBoxAddress ::= PDSParameter
+
+poste-restante-address INTEGER ::= 19
+
+PosteRestanteAddress ::= PDSParameter
+
+unique-postal-name INTEGER ::= 20
+
+UniquePostalName ::= PDSParameter
+
+local-postal-attributes INTEGER ::= 21
+
+LocalPostalAttributes ::= PDSParameter
+
+PDSParameter ::= SET {
+   printable-string PrintableString
+                (SIZE(1..ub-pds-parameter-length)) OPTIONAL,
+   teletex-string TeletexString
+                (SIZE(1..ub-pds-parameter-length)) OPTIONAL }
+
+extended-network-address INTEGER ::= 22
+
+ExtendedNetworkAddress ::= CHOICE {
+   e163-4-address SEQUENCE {
+      number      [0] IMPLICIT NumericString
+                       (SIZE (1..ub-e163-4-number-length)),
+      sub-address [1] IMPLICIT NumericString
+                       (SIZE (1..ub-e163-4-sub-address-length))
+                       OPTIONAL },
+   psap-address   [0] IMPLICIT PresentationAddress }
+
+PresentationAddress ::= SEQUENCE {
+    pSelector     [0] EXPLICIT OCTET STRING OPTIONAL,
+    sSelector     [1] EXPLICIT OCTET STRING OPTIONAL,
+    tSelector     [2] EXPLICIT OCTET STRING OPTIONAL,
+    nAddresses    [3] EXPLICIT SET SIZE (1..MAX) OF OCTET STRING }
+
+terminal-type  INTEGER ::= 23
+
+TerminalType ::= INTEGER {
+   telex        (3),
+   teletex      (4),
+   g3-facsimile (5),
+   g4-facsimile (6),
+   ia5-terminal (7),
+   videotex     (8) } (0..ub-integer-options)
+
+-- Extension Domain-defined Attributes
+
+teletex-domain-defined-attributes INTEGER ::= 6
+
+TeletexDomainDefinedAttributes ::= SEQUENCE SIZE
+   (1..ub-domain-defined-attributes) OF TeletexDomainDefinedAttribute
+
+TeletexDomainDefinedAttribute ::= SEQUENCE {
+        type TeletexString
+               (SIZE (1..ub-domain-defined-attribute-type-length)),
+        value TeletexString
+               (SIZE (1..ub-domain-defined-attribute-value-length)) }
+
+--  specifications of Upper Bounds MUST be regarded as mandatory
+--  from Annex B of ITU-T X.411 Reference Definition of MTS Parameter
+--  Upper Bounds
+
+-- Upper Bounds
+ub-name INTEGER ::= 32768
+ub-common-name INTEGER ::= 64
+ub-locality-name INTEGER ::= 128
+ub-state-name INTEGER ::= 128
+ub-organization-name INTEGER ::= 64
+ub-organizational-unit-name INTEGER ::= 64
+ub-title INTEGER ::= 64
+ub-serial-number INTEGER ::= 64
+ub-match INTEGER ::= 128
+ub-emailaddress-length INTEGER ::= 255
+ub-common-name-length INTEGER ::= 64
+ub-country-name-alpha-length INTEGER ::= 2
+ub-country-name-numeric-length INTEGER ::= 3
+ub-domain-defined-attributes INTEGER ::= 4
+ub-domain-defined-attribute-type-length INTEGER ::= 8
+ub-domain-defined-attribute-value-length INTEGER ::= 128
+ub-domain-name-length INTEGER ::= 16
+ub-extension-attributes INTEGER ::= 256
+ub-e163-4-number-length INTEGER ::= 15
+ub-e163-4-sub-address-length INTEGER ::= 40
+ub-generation-qualifier-length INTEGER ::= 3
+ub-given-name-length INTEGER ::= 16
+ub-initials-length INTEGER ::= 5
+ub-integer-options INTEGER ::= 256
+ub-numeric-user-id-length INTEGER ::= 32
+ub-organization-name-length INTEGER ::= 64
+ub-organizational-unit-name-length INTEGER ::= 32
+ub-organizational-units INTEGER ::= 4
+ub-pds-name-length INTEGER ::= 16
+ub-pds-parameter-length INTEGER ::= 30
+ub-pds-physical-address-lines INTEGER ::= 6
+ub-postal-code-length INTEGER ::= 16
+ub-pseudonym INTEGER ::= 128
+ub-surname-length INTEGER ::= 40
+ub-terminal-id-length INTEGER ::= 24
+ub-unformatted-address-length INTEGER ::= 180
+ub-x121-address-length INTEGER ::= 16
+
+-- Note - upper bounds on string types, such as TeletexString, are
+-- measured in characters.  Excepting PrintableString or IA5String, a
+-- significantly greater number of octets will be required to hold
+-- such a value.  As a minimum, 16 octets, or twice the specified
+-- upper bound, whichever is the larger, should be allowed for
+
+-- TeletexString.  For UTF8String or UniversalString at least four
+-- times the upper bound should be allowed.
+
+END
+
+PKIX1Implicit88 { iso(1) identified-organization(3) dod(6) internet(1)
+  security(5) mechanisms(5) pkix(7) id-mod(0) id-pkix1-implicit(19) }
+
+DEFINITIONS IMPLICIT TAGS ::=
+
+BEGIN
+
+-- EXPORTS ALL --
+
+IMPORTS
+      id-pe, id-kp, id-qt-unotice, id-qt-cps,
+      -- delete following line if "new" types are supported --
+      BMPString, UTF8String,  -- end "new" types --
+      ORAddress, Name, RelativeDistinguishedName,
+      CertificateSerialNumber, Attribute, DirectoryString
+      FROM PKIX1Explicit88 { iso(1) identified-organization(3)
+            dod(6) internet(1) security(5) mechanisms(5) pkix(7)
+            id-mod(0) id-pkix1-explicit(18) };
+
+-- ISO arc for standard certificate and CRL extensions
+
+id-ce OBJECT IDENTIFIER  ::=  {joint-iso-ccitt(2) ds(5) 29}
+
+-- authority key identifier OID and syntax
+
+id-ce-authorityKeyIdentifier OBJECT IDENTIFIER ::=  { id-ce 35 }
+
+AuthorityKeyIdentifier ::= SEQUENCE {
+    keyIdentifier             [0] KeyIdentifier            OPTIONAL,
+    authorityCertIssuer       [1] GeneralNames             OPTIONAL,
+    authorityCertSerialNumber [2] CertificateSerialNumber  OPTIONAL }
+    -- authorityCertIssuer and authorityCertSerialNumber MUST both
+    -- be present or both be absent
+
+KeyIdentifier ::= OCTET STRING
+
+-- subject key identifier OID and syntax
+
+id-ce-subjectKeyIdentifier OBJECT IDENTIFIER ::=  { id-ce 14 }
+
+SubjectKeyIdentifier ::= KeyIdentifier
+
+-- key usage extension OID and syntax
+
+id-ce-keyUsage OBJECT IDENTIFIER ::=  { id-ce 15 }
+
+KeyUsage ::= BIT STRING {
+     digitalSignature        (0),
+     nonRepudiation          (1),  -- recent editions of X.509 have
+                                -- renamed this bit to contentCommitment
+     keyEncipherment         (2),
+     dataEncipherment        (3),
+     keyAgreement            (4),
+     keyCertSign             (5),
+     cRLSign                 (6),
+     encipherOnly            (7),
+     decipherOnly            (8) }
+
+-- private key usage period extension OID and syntax
+
+id-ce-privateKeyUsagePeriod OBJECT IDENTIFIER ::=  { id-ce 16 }
+
+PrivateKeyUsagePeriod ::= SEQUENCE {
+     notBefore       [0]     GeneralizedTime OPTIONAL,
+     notAfter        [1]     GeneralizedTime OPTIONAL }
+     -- either notBefore or notAfter MUST be present
+
+-- certificate policies extension OID and syntax
+
+id-ce-certificatePolicies OBJECT IDENTIFIER ::=  { id-ce 32 }
+
+anyPolicy OBJECT IDENTIFIER ::= { id-ce-certificatePolicies 0 }
+
+CertificatePolicies ::= SEQUENCE SIZE (1..MAX) OF PolicyInformation
+
+PolicyInformation ::= SEQUENCE {
+     policyIdentifier   CertPolicyId,
+     policyQualifiers   SEQUENCE SIZE (1..MAX) OF
+             PolicyQualifierInfo OPTIONAL }
+
+CertPolicyId ::= OBJECT IDENTIFIER
+
+PolicyQualifierInfo ::= SEQUENCE {
+     policyQualifierId  PolicyQualifierId,
+     qualifier          ANY DEFINED BY policyQualifierId }
+
+-- Implementations that recognize additional policy qualifiers MUST
+-- augment the following definition for PolicyQualifierId
+
+PolicyQualifierId ::= OBJECT IDENTIFIER ( id-qt-cps | id-qt-unotice )
+
+-- CPS pointer qualifier
+
+CPSuri ::= IA5String
+
+-- user notice qualifier
+
+UserNotice ::= SEQUENCE {
+     noticeRef        NoticeReference OPTIONAL,
+     explicitText     DisplayText OPTIONAL }
+
+NoticeReference ::= SEQUENCE {
+     organization     DisplayText,
+     noticeNumbers    SEQUENCE OF INTEGER }
+
+DisplayText ::= CHOICE {
+     ia5String        IA5String      (SIZE (1..200)),
+     visibleString    VisibleString  (SIZE (1..200)),
+     bmpString        BMPString      (SIZE (1..200)),
+     utf8String       UTF8String     (SIZE (1..200)) }
+
+-- policy mapping extension OID and syntax
+
+id-ce-policyMappings OBJECT IDENTIFIER ::=  { id-ce 33 }
+
+PolicyMappings ::= SEQUENCE SIZE (1..MAX) OF SEQUENCE {
+     issuerDomainPolicy      CertPolicyId,
+     subjectDomainPolicy     CertPolicyId }
+
+-- subject alternative name extension OID and syntax
+
+id-ce-subjectAltName OBJECT IDENTIFIER ::=  { id-ce 17 }
+
+SubjectAltName ::= GeneralNames
+
+GeneralNames ::= SEQUENCE SIZE (1..MAX) OF GeneralName
+
+GeneralName ::= CHOICE {
+     otherName                 [0]  AnotherName,
+     rfc822Name                [1]  IA5String,
+     dNSName                   [2]  IA5String,
+     x400Address               [3]  ORAddress,
+     directoryName             [4]  Name,
+     ediPartyName              [5]  EDIPartyName,
+     uniformResourceIdentifier [6]  IA5String,
+     iPAddress                 [7]  OCTET STRING,
+     registeredID              [8]  OBJECT IDENTIFIER }
+
+-- AnotherName replaces OTHER-NAME ::= TYPE-IDENTIFIER, as
+-- TYPE-IDENTIFIER is not supported in the '88 ASN.1 syntax
+
+AnotherName ::= SEQUENCE {
+     type-id    OBJECT IDENTIFIER,
+     value      [0] EXPLICIT ANY DEFINED BY type-id }
+
+EDIPartyName ::= SEQUENCE {
+     nameAssigner              [0]  DirectoryString OPTIONAL,
+     partyName                 [1]  DirectoryString }
+
+-- issuer alternative name extension OID and syntax
+
+id-ce-issuerAltName OBJECT IDENTIFIER ::=  { id-ce 18 }
+
+IssuerAltName ::= GeneralNames
+
+id-ce-subjectDirectoryAttributes OBJECT IDENTIFIER ::=  { id-ce 9 }
+
+SubjectDirectoryAttributes ::= SEQUENCE SIZE (1..MAX) OF Attribute
+
+-- basic constraints extension OID and syntax
+
+id-ce-basicConstraints OBJECT IDENTIFIER ::=  { id-ce 19 }
+
+BasicConstraints ::= SEQUENCE {
+     cA                      BOOLEAN DEFAULT FALSE,
+     pathLenConstraint       INTEGER (0..MAX) OPTIONAL }
+
+-- name constraints extension OID and syntax
+
+id-ce-nameConstraints OBJECT IDENTIFIER ::=  { id-ce 30 }
+
+NameConstraints ::= SEQUENCE {
+     permittedSubtrees       [0]     GeneralSubtrees OPTIONAL,
+     excludedSubtrees        [1]     GeneralSubtrees OPTIONAL }
+
+GeneralSubtrees ::= SEQUENCE SIZE (1..MAX) OF GeneralSubtree
+
+GeneralSubtree ::= SEQUENCE {
+     base                    GeneralName,
+     minimum         [0]     BaseDistance DEFAULT 0,
+     maximum         [1]     BaseDistance OPTIONAL }
+
+BaseDistance ::= INTEGER (0..MAX)
+
+-- policy constraints extension OID and syntax
+
+id-ce-policyConstraints OBJECT IDENTIFIER ::=  { id-ce 36 }
+
+PolicyConstraints ::= SEQUENCE {
+     requireExplicitPolicy   [0]     SkipCerts OPTIONAL,
+     inhibitPolicyMapping    [1]     SkipCerts OPTIONAL }
+
+SkipCerts ::= INTEGER (0..MAX)
+
+-- CRL distribution points extension OID and syntax
+
+id-ce-cRLDistributionPoints     OBJECT IDENTIFIER  ::=  {id-ce 31}
+
+CRLDistributionPoints ::= SEQUENCE SIZE (1..MAX) OF DistributionPoint
+
+DistributionPoint ::= SEQUENCE {
+     distributionPoint       [0]     DistributionPointName OPTIONAL,
+     reasons                 [1]     ReasonFlags OPTIONAL,
+     cRLIssuer               [2]     GeneralNames OPTIONAL }
+
+DistributionPointName ::= CHOICE {
+     fullName                [0]     GeneralNames,
+     nameRelativeToCRLIssuer [1]     RelativeDistinguishedName }
+
+ReasonFlags ::= BIT STRING {
+     unused                  (0),
+     keyCompromise           (1),
+     cACompromise            (2),
+     affiliationChanged      (3),
+     superseded              (4),
+     cessationOfOperation    (5),
+     certificateHold         (6),
+     privilegeWithdrawn      (7),
+     aACompromise            (8) }
+
+-- extended key usage extension OID and syntax
+
+id-ce-extKeyUsage OBJECT IDENTIFIER ::= {id-ce 37}
+
+ExtKeyUsageSyntax ::= SEQUENCE SIZE (1..MAX) OF KeyPurposeId
+
+KeyPurposeId ::= OBJECT IDENTIFIER
+
+-- permit unspecified key uses
+
+anyExtendedKeyUsage OBJECT IDENTIFIER ::= { id-ce-extKeyUsage 0 }
+
+-- extended key purpose OIDs
+
+id-kp-serverAuth             OBJECT IDENTIFIER ::= { id-kp 1 }
+id-kp-clientAuth             OBJECT IDENTIFIER ::= { id-kp 2 }
+id-kp-codeSigning            OBJECT IDENTIFIER ::= { id-kp 3 }
+id-kp-emailProtection        OBJECT IDENTIFIER ::= { id-kp 4 }
+id-kp-timeStamping           OBJECT IDENTIFIER ::= { id-kp 8 }
+id-kp-OCSPSigning            OBJECT IDENTIFIER ::= { id-kp 9 }
+
+-- inhibit any policy OID and syntax
+
+id-ce-inhibitAnyPolicy OBJECT IDENTIFIER ::=  { id-ce 54 }
+
+InhibitAnyPolicy ::= SkipCerts
+
+-- freshest (delta)CRL extension OID and syntax
+
+id-ce-freshestCRL OBJECT IDENTIFIER ::=  { id-ce 46 }
+
+FreshestCRL ::= CRLDistributionPoints
+
+-- authority info access
+
+id-pe-authorityInfoAccess OBJECT IDENTIFIER ::= { id-pe 1 }
+
+AuthorityInfoAccessSyntax  ::=
+        SEQUENCE SIZE (1..MAX) OF AccessDescription
+
+AccessDescription  ::=  SEQUENCE {
+        accessMethod          OBJECT IDENTIFIER,
+        accessLocation        GeneralName  }
+
+-- subject info access
+
+id-pe-subjectInfoAccess OBJECT IDENTIFIER ::= { id-pe 11 }
+
+SubjectInfoAccessSyntax  ::=
+        SEQUENCE SIZE (1..MAX) OF AccessDescription
+
+-- CRL number extension OID and syntax
+
+id-ce-cRLNumber OBJECT IDENTIFIER ::= { id-ce 20 }
+
+CRLNumber ::= INTEGER (0..MAX)
+
+-- issuing distribution point extension OID and syntax
+
+id-ce-issuingDistributionPoint OBJECT IDENTIFIER ::= { id-ce 28 }
+
+IssuingDistributionPoint ::= SEQUENCE {
+     distributionPoint          [0] DistributionPointName OPTIONAL,
+     onlyContainsUserCerts      [1] BOOLEAN DEFAULT FALSE,
+     onlyContainsCACerts        [2] BOOLEAN DEFAULT FALSE,
+     onlySomeReasons            [3] ReasonFlags OPTIONAL,
+     indirectCRL                [4] BOOLEAN DEFAULT FALSE,
+     onlyContainsAttributeCerts [5] BOOLEAN DEFAULT FALSE }
+     -- at most one of onlyContainsUserCerts, onlyContainsCACerts,
+     -- and onlyContainsAttributeCerts may be set to TRUE.
+
+id-ce-deltaCRLIndicator OBJECT IDENTIFIER ::= { id-ce 27 }
+
+BaseCRLNumber ::= CRLNumber
+
+-- reason code extension OID and syntax
+
+id-ce-cRLReasons OBJECT IDENTIFIER ::= { id-ce 21 }
+
+CRLReason ::= ENUMERATED {
+     unspecified             (0),
+     keyCompromise           (1),
+     cACompromise            (2),
+     affiliationChanged      (3),
+     superseded              (4),
+     cessationOfOperation    (5),
+     certificateHold         (6),
+     removeFromCRL           (8),
+     privilegeWithdrawn      (9),
+     aACompromise           (10) }
+
+-- certificate issuer CRL entry extension OID and syntax
+
+id-ce-certificateIssuer OBJECT IDENTIFIER ::= { id-ce 29 }
+
+CertificateIssuer ::= GeneralNames
+
+-- hold instruction extension OID and syntax
+
+id-ce-holdInstructionCode OBJECT IDENTIFIER ::= { id-ce 23 }
+
+HoldInstructionCode ::= OBJECT IDENTIFIER
+
+-- ANSI x9 arc holdinstruction arc
+
+holdInstruction OBJECT IDENTIFIER ::=
+          {joint-iso-itu-t(2) member-body(2) us(840) x9cm(10040) 2}
+
+-- ANSI X9 holdinstructions
+
+id-holdinstruction-none OBJECT IDENTIFIER  ::=
+                                      {holdInstruction 1} -- deprecated
+
+id-holdinstruction-callissuer OBJECT IDENTIFIER ::= {holdInstruction 2}
+
+id-holdinstruction-reject OBJECT IDENTIFIER ::= {holdInstruction 3}
+
+-- invalidity date CRL entry extension OID and syntax
+
+id-ce-invalidityDate OBJECT IDENTIFIER ::= { id-ce 24 }
+
+InvalidityDate ::=  GeneralizedTime
+
+END
+'''
+
+ESQUEMAS = {
+    "conv": (ASSINATURA, "ber"),
+    "bu_conv": (BOLETIM, "ber"),
+    "x509_conv": (X509, "der"),
+}
+
+
+_compilados = {}
+_compilados_lock = threading.Lock()
+
+
+def parsed_schema(texto):
+    """
+    Especificação ASN.1 analisada pelo asn1tools. A análise do texto é quase
+    todo o custo da compilação (cerca de 0,7 s só para a X509), então o
+    resultado fica em __pycache__, ao lado dos .pyc e com as mesmas regras
+    (PYTHONDONTWRITEBYTECODE), identificado pelo hash do texto e pela versão
+    do asn1tools.
+    """
+    import asn1tools
+
+    chave = hashlib.sha256((asn1tools.__version__ + texto).encode()).hexdigest()[:16]
+    caminho = Path(__file__).parent / "__pycache__" / ("asn1-%s.pickle" % chave)
+    try:
+        with open(caminho, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Um cache corrompido ou de outra versão pode falhar de vários
+        # jeitos (AttributeError, ImportError, ValueError...); ele é
+        # analisado de novo e sobrescrito, sem impedir o import.
+        pass
+    analisado = asn1tools.parse_string(texto)
+    if not sys.dont_write_bytecode:
+        temporario = caminho.with_suffix(".%d.tmp" % os.getpid())
+        try:
+            caminho.parent.mkdir(exist_ok=True)
+            with open(temporario, "wb") as f:
+                pickle.dump(analisado, f)
+            os.replace(temporario, caminho)
+        except OSError:
+            pass
+    return analisado
+
+
+def compiled_schema(nome):
+    """
+    Especificação ASN.1 compilada na primeira vez que é usada: um worker que
+    só verifica assinaturas precisa apenas da X509 e a linha de comando, em
+    geral, não precisa dela.
+    """
+    compilado = _compilados.get(nome)
+    if compilado is None:
+        with _compilados_lock:
+            compilado = _compilados.get(nome)
+            if compilado is None:
+                import asn1tools
+
+                texto, codec = ESQUEMAS[nome]
+                opcoes = {"numeric_enums": True} if codec == "ber" else {}
+                compilado = _compilados[nome] = asn1tools.compile_dict(
+                    parsed_schema(texto), codec=codec, **opcoes)
+    return compilado
+
+
+def __getattr__(nome):
+    # verificacao.conv, verificacao.bu_conv e verificacao.x509_conv continuam
+    # disponíveis como atributos, compilados sob demanda.
+    if nome in ESQUEMAS:
+        return compiled_schema(nome)
+    raise AttributeError("module %r has no attribute %r" % (__name__, nome))
+
+
+# Identificador da requisição (ou seção, em lote) em andamento, usado pelos
+# instrumentos de diagnóstico.
+requisicao_atual = contextvars.ContextVar("requisicao_atual", default=None)
+stage_hooks = []
+
+
+def stage(nome):
+    """
+    Marca uma etapa da verificação para os instrumentos de diagnóstico
+    registrados em `stage_hooks`. Sem instrumentos ativos, o custo é um
+    teste de lista vazia.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not stage_hooks:
+                return fn(*args, **kwargs)
+            with contextlib.ExitStack() as hooks:
+                for hook in list(stage_hooks):
+                    hooks.enter_context(hook(nome, requisicao_atual.get() or "-"))
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    """
+    Perfis de desempenho sob demanda. Enquanto ativo, cada etapa marcada com
+    @stage gera um arquivo cProfile `<requisição>-<etapa>-<n>.prof` em
+    `diretorio`, e uma thread amostra as pilhas das threads que estão em
+    alguma etapa, acumuladas em `perfil-<pid>.folded` (formato de pilhas
+    colapsadas do flamegraph.pl/speedscope, com a requisição e a etapa como
+    raiz), gravado ao desligar o profiler ou ao fim do processo.
+    """
+
+    def __init__(self, diretorio, intervalo=0.005):
+        self.diretorio = Path(diretorio)
+        self.intervalo = intervalo
+        self.ativo = False
+        self.pilhas = collections.Counter()
+        self.threads = {}
+        self.contador = itertools.count()
+        self._amostrador = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def start(self):
+        if self.ativo:
+            return
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.ativo = True
+        stage_hooks.append(self.hook)
+
+    def stop(self):
+        if not self.ativo:
+            return
+        self.ativo = False
+        stage_hooks.remove(self.hook)
+        if self._amostrador is not None and self._pid == os.getpid():
+            self._amostrador.join()
+        # A próxima etapa depois de um novo start() inicia outra amostragem.
+        self._amostrador = None
+        self._pid = None
+        self.write_collapsed()
+
+    def write_collapsed(self):
+        caminho = self.diretorio / ("perfil-%d.folded" % os.getpid())
+        with open(caminho, "w") as f:
+            for pilha, amostras in list(self.pilhas.items()):
+                f.write("%s %d\n" % (pilha, amostras))
+        return caminho
+
+    def _ensure_sampler(self):
+        # Threads não sobrevivem ao fork dos workers: cada processo inicia
+        # a sua amostragem na primeira etapa que executar.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._amostrador = threading.Thread(
+                target=self._sample, name="perfil", daemon=True)
+            self._amostrador.start()
+
+    def _sample(self):
+        while self.ativo:
+            time.sleep(self.intervalo)
+            frames = sys._current_frames()
+            for ident, raiz in list(self.threads.items()):
+                frame = frames.get(ident)
+                pilha = []
+                while frame is not None:
+                    code = frame.f_code
+                    pilha.append("%s:%s" % (os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                if pilha:
+                    self.pilhas[";".join(raiz + pilha[::-1])] += 1
+
+    @contextlib.contextmanager
+    def hook(self, etapa, requisicao):
+        self._ensure_sampler()
+        ident = threading.get_ident()
+        anterior = self.threads.get(ident)
+        if anterior is not None:
+            # Etapa dentro de outra: já coberta pelo perfil externo.
+            yield
+            return
+        self.threads[ident] = [requisicao, etapa]
+        perfil = cProfile.Profile()
+        perfil.enable()
+        try:
+            yield
+        finally:
+            perfil.disable()
+            del self.threads[ident]
+            perfil.dump_stats(self.diretorio / ("%s-%s-%d.prof" % (
+                requisicao, etapa, next(self.contador))))
+
+
+profiler = Profiler(
+    os.environ.get("URNAHASH_PROFILE_DIR", Path(tempfile.gettempdir()) / "urnahash-perfis"),
+    intervalo=float(os.environ.get("URNAHASH_PROFILE_INTERVAL", 0.005)))
+if os.environ.get("URNAHASH_PROFILE"):
+    profiler.start()
+
+
+class MemoryTracer:
+    """
+    Alocações por etapa com tracemalloc. Para cada etapa marcada com @stage
+    registra o pico (máximo alocado acima do início da etapa) e o retido
+    (alocado no início e não liberado ao fim), agregados por etapa e por
+    requisição, para as últimas `historico` requisições. Com etapas
+    simultâneas em várias threads, o pico de uma inclui as alocações das
+    outras.
+    """
+
+    def __init__(self, historico=100, frames=1):
+        self.historico = historico
+        self.frames = frames
+        self.ativo = False
+        self.etapas = collections.defaultdict(lambda: {
+            "chamadas": 0, "pico_max": 0, "pico_total": 0, "retido_total": 0})
+        self.requisicoes = collections.OrderedDict()
+        self._abertas = {}
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.ativo:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.ativo = True
+        stage_hooks.append(self.hook)
+
+    def stop(self):
+        # As etapas ainda abertas terminam sem ser contabilizadas (veja hook).
+        with self._lock:
+            if not self.ativo:
+                return
+            self.ativo = False
+            stage_hooks.remove(self.hook)
+            tracemalloc.stop()
+            self._abertas.clear()
+
+    def _update_peaks(self):
+        # Há um único pico global: antes de zerá-lo, ele é repassado a todas
+        # as etapas abertas.
+        _, pico = tracemalloc.get_traced_memory()
+        for aberta in self._abertas.values():
+            aberta[1] = max(aberta[1], pico)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def hook(self, etapa, requisicao):
+        with self._lock:
+            token = None
+            if self.ativo:
+                self._update_peaks()
+                atual, _ = tracemalloc.get_traced_memory()
+                token = next(self._tokens)
+                self._abertas[token] = aberta = [atual, atual]
+        try:
+            yield
+        finally:
+            with self._lock:
+                # Se o tracer foi desligado durante a etapa, ela é descartada.
+                if token in self._abertas:
+                    self._update_peaks()
+                    del self._abertas[token]
+                    fim, _ = tracemalloc.get_traced_memory()
+                    self.record(requisicao, etapa, aberta[1] - aberta[0], fim - aberta[0])
+
+    def record(self, requisicao, etapa, pico, retido):
+        total = self.etapas[etapa]
+        total["chamadas"] += 1
+        total["pico_max"] = max(total["pico_max"], pico)
+        total["pico_total"] += pico
+        total["retido_total"] += retido
+        por_etapa = self.requisicoes.setdefault(requisicao, {})
+        self.requisicoes.move_to_end(requisicao)
+        anterior = por_etapa.get(etapa, (0, 0))
+        por_etapa[etapa] = (max(anterior[0], pico), anterior[1] + retido)
+        while len(self.requisicoes) > self.historico:
+            self.requisicoes.popitem(last=False)
+
+    def top(self, n=10):
+        """
+        As `n` linhas de código com mais memória alocada ainda viva.
+        """
+        if not tracemalloc.is_tracing():
+            return []
+        estatisticas = tracemalloc.take_snapshot().statistics('lineno')
+        return [(str(e.traceback[0]), e.size, e.count) for e in estatisticas[:n]]
+
+    def report(self):
+        with self._lock:
+            atual, pico = tracemalloc.get_traced_memory() if self.ativo else (0, 0)
+            etapas = {
+                etapa: dict(total,
+                            pico_medio=total["pico_total"] // total["chamadas"],
+                            retido_medio=total["retido_total"] // total["chamadas"])
+                for etapa, total in self.etapas.items()}
+            requisicoes = {requisicao: {etapa: {"pico": p, "retido": r}
+                                        for etapa, (p, r) in por_etapa.items()}
+                           for requisicao, por_etapa in self.requisicoes.items()}
+        return {"ativo": self.ativo, "atual": atual, "pico": pico,
+                "etapas": etapas, "requisicoes": requisicoes}
+
+
+memory_tracer = MemoryTracer(
+    historico=int(os.environ.get("URNAHASH_TRACEMALLOC_HISTORICO", 100)),
+    frames=int(os.environ.get("URNAHASH_TRACEMALLOC_FRAMES", 1)))
+if os.environ.get("URNAHASH_TRACEMALLOC"):
+    memory_tracer.start()
+
+
+def hash_file(file):
+    sha = hashlib.sha512()
+    sha.update(file)
+    digest = sha.digest()
+    return digest
+
+
+HASH_CHUNK_SIZE = int(os.environ.get("URNAHASH_HASH_CHUNK", 1 << 20))
+
+
+def hash_stream(f, chunk_size=HASH_CHUNK_SIZE):
+    sha = hashlib.sha512()
+    for bloco in iter(functools.partial(f.read, chunk_size), b""):
+        sha.update(bloco)
+    return sha.digest()
+
+
+def open_member(zip_path, extensao):
+    """
+    Abre o primeiro membro de `zip_path` terminado em `extensao`.
+    """
+    zip = zipfile.ZipFile(zip_path, mode='r')
+    return zip.open(next(f for f in zip.namelist() if f.endswith(extensao)), 'r')
+
+
+class HashService:
+    """
+    Calcula o SHA-512 de vários arquivos ao mesmo tempo. O hashlib libera o
+    GIL durante update() com blocos grandes, então threads bastam para usar
+    vários núcleos; o tamanho do bloco equilibra esse ganho e a memória.
+    """
+
+    def __init__(self, workers=None, chunk_size=HASH_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="hash")
+
+    @stage("hash")
+    def _hash(self, abrir):
+        with abrir() as f:
+            return hash_stream(f, self.chunk_size)
+
+    def submit(self, abrir):
+        """
+        `abrir` é chamado na thread de hash e deve retornar um arquivo binário.
+        """
+        return self.executor.submit(contextvars.copy_context().run, self._hash, abrir)
+
+    def hash_all(self, aberturas):
+        return [futuro.result() for futuro in [self.submit(a) for a in aberturas]]
+
+
+class ZipMemberDigest:
+    """
+    SHA-512 do primeiro membro de um ZIP terminado em `extensao`, calculado
+    à medida que os bytes do ZIP chegam (feed), a partir dos cabeçalhos
+    locais. Só membros armazenados ou deflate, sem criptografia nem ZIP64:
+    em qualquer outro caso `falhou` fica verdadeiro e o hash tem de ser
+    calculado do arquivo completo. O ZIP só é lido depois pelo diretório
+    central, que pode discordar dos cabeçalhos locais: use `matches`.
+    """
+
+    CABECALHO = struct.Struct("<4sHHHHHIIIHH")
+
+    def __init__(self, extensao):
+        self.extensao = extensao
+        self.buffer = bytearray()
+        self.posicao = 0
+        self.estado = "cabecalho"
+        self.restante = 0
+        self.sha = None
+        self.descompressor = None
+        self.offset = None
+        self.crc = 0
+        self.tamanho = 0
+        self.digest = None
+        self.falhou = False
+
+    def feed(self, chunk):
+        if self.digest is not None or self.falhou:
+            return
+        self.buffer += chunk
+        try:
+            while self.buffer and self.digest is None and self._step():
+                pass
+        except (ValueError, zlib.error):
+            self.falhou = True
+        if self.digest is not None or self.falhou:
+            self.buffer = bytearray()
+            self.sha = self.descompressor = None
+
+    def _consume(self, n):
+        dados = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        self.posicao += len(dados)
+        return dados
+
+    def _step(self):
+        # Processa o que for possível do buffer; False se faltam bytes.
+        if self.estado == "pular":
+            self.restante -= len(self._consume(self.restante))
+            if not self.restante:
+                self.estado = "cabecalho"
+            return True
+        if self.estado == "membro":
+            return self._member()
+        if len(self.buffer) < self.CABECALHO.size:
+            return False
+        (assinatura, _, flags, metodo, _, _, _, compactado, _,
+         tamanho_nome, tamanho_extra) = self.CABECALHO.unpack_from(self.buffer)
+        if assinatura != b"PK\x03\x04":
+            raise ValueError("Membro %s não encontrado nos cabeçalhos locais" % self.extensao)
+        tamanho = self.CABECALHO.size + tamanho_nome + tamanho_extra
+        if len(self.buffer) < tamanho:
+            return False
+        nome = bytes(self.buffer[self.CABECALHO.size:self.CABECALHO.size + tamanho_nome])
+        nome = nome.decode("utf-8" if flags & 0x800 else "cp437")
+        if flags & 1 or compactado == 0xFFFFFFFF:
+            raise ValueError("ZIP criptografado ou ZIP64")
+        offset = self.posicao
+        self._consume(tamanho)
+        if not nome.endswith(self.extensao):
+            if flags & 8:
+                raise ValueError("Tamanho do membro desconhecido")
+            self.estado, self.restante = "pular", compactado
+            return True
+        if metodo == zipfile.ZIP_DEFLATED:
+            self.descompressor = zlib.decompressobj(-15)
+        elif metodo != zipfile.ZIP_STORED or flags & 8:
+            raise ValueError("Compressão não suportada")
+        self.estado, self.offset, self.restante = "membro", offset, compactado
+        self.sha = hashlib.sha512()
+        return True
+
+    def _member(self):
+        dados = self._consume(self.restante if self.descompressor is None else len(self.buffer))
+        if self.descompressor is not None:
+            dados = self.descompressor.decompress(dados)
+        else:
+            self.restante -= len(dados)
+        self.sha.update(dados)
+        self.crc = zlib.crc32(dados, self.crc)
+        self.tamanho += len(dados)
+        if self.descompressor.eof if self.descompressor is not None else not self.restante:
+            self.digest = self.sha.digest()
+        return False
+
+    def matches(self, zip_path):
+        """
+        Se o membro que open_member(zip_path, extensao) abriria é o que foi
+        resumido: mesma posição do cabeçalho local, tamanho e CRC-32.
+        """
+        if self.digest is None:
+            return False
+        with zipfile.ZipFile(zip_path, mode='r') as pacote:
+            info = next((i for i in pacote.infolist() if i.filename.endswith(self.extensao)),
+                        None)
+        return (info is not None and info.header_offset == self.offset
+                and info.file_size == self.tamanho and info.CRC == self.crc)
+
+
+@functools.lru_cache(maxsize=1)
+def hash_service():
+    return HashService(
+        workers=int(os.environ.get("URNAHASH_HASH_WORKERS", os.cpu_count() or 1)))
+
+
+class UntrustedInput(ValueError):
+    """
+    Arquivo enviado rejeitado antes da decodificação por exceder os limites.
+    """
+
+
+class DecodeLimits:
+    def __init__(self, max_size, max_depth, max_items, max_seconds):
+        self.max_size = max_size
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_seconds = max_seconds
+
+
+DECODE_LIMITS = DecodeLimits(
+    max_size=int(os.environ.get("URNAHASH_MAX_DER_SIZE", 1 << 20)),
+    max_depth=int(os.environ.get("URNAHASH_MAX_DER_DEPTH", 24)),
+    max_items=int(os.environ.get("URNAHASH_MAX_DER_ITEMS", 4096)),
+    max_seconds=float(os.environ.get("URNAHASH_MAX_DER_SECONDS", 0.2)),
+)
+
+
+def check_tlv(data, limits=DECODE_LIMITS):
+    """
+    Percorre a estrutura TLV (BER/DER) do primeiro elemento de `data` sem
+    decodificar os valores, em tempo linear, e lança UntrustedInput se ela
+    for malformada ou exceder os limites de tamanho, profundidade, elementos
+    por lista ou tempo. Os decodificadores do asn1tools e do ecpy não têm
+    esses limites e só devem receber dados já verificados aqui.
+    """
+    if len(data) > limits.max_size:
+        raise UntrustedInput("Arquivo maior que %d bytes" % limits.max_size)
+    deadline = time.monotonic() + limits.max_seconds
+    # Pilha de (fim do elemento construído ou None se indefinido, filhos).
+    pilha = []
+    pos = 0
+    elementos = 0
+    while True:
+        if pilha and pilha[-1][0] == pos:
+            pilha.pop()
+            if not pilha:
+                return pos
+            continue
+        fim = pilha[-1][0] if pilha else len(data)
+        if pilha and pilha[-1][0] is None and data[pos:pos + 2] == b'\0\0':
+            pos += 2
+            pilha.pop()
+            if not pilha:
+                return pos
+            continue
+        if fim is None:
+            fim = len(data)
+        if pos + 2 > fim:
+            raise UntrustedInput("TLV truncado")
+        if pilha:
+            pilha[-1][1] += 1
+            if pilha[-1][1] > limits.max_items:
+                raise UntrustedInput("Mais de %d elementos numa lista" % limits.max_items)
+        elementos += 1
+        if not elementos % 1024 and time.monotonic() > deadline:
+            raise UntrustedInput("Tempo de análise excedido")
+        tag = data[pos]
+        pos += 1
+        if tag & 0x1f == 0x1f:
+            for _ in range(4):
+                if pos >= fim:
+                    raise UntrustedInput("TLV truncado")
+                pos += 1
+                if not data[pos - 1] & 0x80:
+                    break
+            else:
+                raise UntrustedInput("Tag longa demais")
+        if pos >= fim:
+            raise UntrustedInput("TLV truncado")
+        length = data[pos]
+        pos += 1
+        construido = bool(tag & 0x20)
+        if length == 0x80:
+            if not construido:
+                raise UntrustedInput("Comprimento indefinido em valor primitivo")
+            fim_elemento = None
+        else:
+            if length & 0x80:
+                size = length & 0x7f
+                if size > 4 or pos + size > fim:
+                    raise UntrustedInput("Comprimento inválido")
+                length = int.from_bytes(data[pos:pos + size], 'big')
+                pos += size
+            fim_elemento = pos + length
+            if fim_elemento > fim:
+                raise UntrustedInput("TLV maior que o elemento que o contém")
+        if construido:
+            if len(pilha) >= limits.max_depth:
+                raise UntrustedInput("Aninhamento maior que %d níveis" % limits.max_depth)
+            pilha.append([fim_elemento, 0])
+        else:
+            pos = fim_elemento
+            if not pilha:
+                return pos
+
+
+@stage("decode_envelope")
+def decode_resultado(assinatura):
+    check_tlv(assinatura)
+    envelope_encoded = bytearray(assinatura)
+    return compiled_schema("conv").decode("EntidadeAssinaturaResultado", envelope_encoded)
+
+
+def decode_envelope(assinatura):
+    entidade_assinatura = decode_resultado(assinatura)['assinaturaHW']
+    return entidade_assinatura
+
+
+def decode_envelope_completo(assinatura):
+    check_tlv(assinatura)
+    envelope_decoded = compiled_schema("conv").decode(
+        "EntidadeAssinaturaResultado", bytearray(assinatura))
+    return {"HW": envelope_decoded['assinaturaHW'],
+            "SW": envelope_decoded['assinaturaSW']}
+
+
+@stage("decode_assinaturas")
+def decode_assinaturas(entidade_assinatura):
+    assinaturas_encoded = entidade_assinatura["conteudoAutoAssinado"]
+    # O decodificador especializado já confere os limites do TLV em tempo
+    # linear; check_tlv só é necessário antes do asn1tools.
+    try:
+        return fast_decode_assinatura(assinaturas_encoded)
+    except ValueError:
+        check_tlv(assinaturas_encoded)
+        return compiled_schema("conv").decode("Assinatura", assinaturas_encoded)
+
+
+@stage("decode_bu")
+def decode_bu(bu):
+    check_tlv(bu)
+    bu_conv = compiled_schema("bu_conv")
+    envelope_encoded = bytearray(bu)
+    envelope_decoded = bu_conv.decode("EntidadeEnvelopeGenerico", envelope_encoded)
+    check_tlv(envelope_decoded["conteudo"])
+    bu_decoded = bu_conv.decode("EntidadeBoletimUrna", envelope_decoded["conteudo"])
+    return bu_decoded
+
+
+def extract_votes(bu_decoded):
+    """
+    Gera (idEleicao, cargo, tipoVoto, número do votável, votos) para cada
+    total do boletim. O número é 0 para brancos, nulos e demais votos sem
+    votável identificado.
+    """
+    for eleicao in bu_decoded['resultadosVotacaoPorEleicao']:
+        for resultado in eleicao['resultadosVotacao']:
+            for total in resultado['totaisVotosCargo']:
+                _, cargo = total['codigoCargo']
+                for votavel in total['votosVotaveis']:
+                    identificacao = votavel.get('identificacaoVotavel')
+                    codigo = identificacao['codigo'] if identificacao else 0
+                    yield (eleicao['idEleicao'], cargo, votavel['tipoVoto'],
+                           codigo, votavel['quantidadeVotos'])
+
+
+class AssinaturaDigital:
+    __slots__ = ('tamanho', 'hash', 'assinatura')
+
+    def __init__(self, tamanho, hash, assinatura):
+        self.tamanho = tamanho
+        self.hash = hash
+        self.assinatura = assinatura
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def as_dict(self):
+        return {'tamanho': self.tamanho, 'hash': self.hash, 'assinatura': self.assinatura}
+
+
+class AssinaturaArquivo:
+    __slots__ = ('nomeArquivo', 'assinatura')
+
+    def __init__(self, nomeArquivo, assinatura):
+        self.nomeArquivo = nomeArquivo
+        self.assinatura = assinatura
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def as_dict(self):
+        return {'nomeArquivo': self.nomeArquivo, 'assinatura': self.assinatura.as_dict()}
+
+
+def _ber_value(data, pos, tag):
+    if pos + 2 > len(data):
+        raise ValueError("TLV truncado")
+    if data[pos] != tag:
+        raise ValueError("Tag inesperada")
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7f
+        if size == 0:
+            raise ValueError("Comprimento indefinido")
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    end = pos + length
+    if end > len(data):
+        raise ValueError("TLV truncado")
+    return pos, end
+
+
+def fast_decode_assinatura(data):
+    """
+    Decodificador BER especializado para o tipo `Assinatura`, equivalente a
+    `conv.decode("Assinatura", data)` para codificações com comprimento
+    definido. Levanta ValueError para qualquer outra forma, e nesse caso o
+    chamador deve recorrer ao codec genérico. O ganho sobre conv.decode
+    fica entre 1,3x e 2,6x conforme a máquina e o número de arquivos
+    (benchmark.py), cerca de 15% da decodificação de um arquivo de
+    assinaturas inteiro, que é dominada pelo envelope externo.
+    """
+    data = bytes(data)
+    pos, end = _ber_value(data, 0, 0x30)
+    pos, lista_end = _ber_value(data, pos, 0x30)
+    arquivos = []
+    while pos < lista_end:
+        pos, item_end = _ber_value(data, pos, 0x30)
+        pos, nome_end = _ber_value(data, pos, 0x1b)
+        nome = data[pos:nome_end].decode('latin-1')
+        pos, dig_end = _ber_value(data, nome_end, 0x30)
+        pos, int_end = _ber_value(data, pos, 0x02)
+        if pos == int_end:
+            raise ValueError("INTEGER vazio")
+        tamanho = int.from_bytes(data[pos:int_end], 'big', signed=True)
+        pos, hash_end = _ber_value(data, int_end, 0x04)
+        hash = data[pos:hash_end]
+        pos, sig_end = _ber_value(data, hash_end, 0x04)
+        assinatura = data[pos:sig_end]
+        if sig_end != dig_end or dig_end != item_end:
+            raise ValueError("Campos inesperados em AssinaturaArquivo")
+        arquivos.append(AssinaturaArquivo(
+            nome, AssinaturaDigital(tamanho, hash, assinatura)))
+        pos = item_end
+    if pos != lista_end or lista_end != end:
+        raise ValueError("Campos inesperados em Assinatura")
+    return {'arquivosAssinados': arquivos}
+
+
+def extract_pubkey(entidade_assinatura):
+    return pubkey_from_cert(entidade_assinatura['certificadoDigital'])
+
+
+@functools.lru_cache(maxsize=64)
+def pubkey_from_cert(cert):
+    """
+    Code from epicleet: https://github.com/epicleet/var-ue
+    """
+    cert = compiled_schema("x509_conv").decode('Certificate', cert_der(cert))
+    cert = cert['tbsCertificate']
+    cn = next(
+        item['value'] for item in cert['subject'][1][0]
+        if item['type'] == '2.5.4.3')
+    assert cn[0] in {
+        0x13, 0xc}, 'CN deveria ser PrintableString ou OCTET STRING'
+    cn = cn[2:2+cn[1]].decode('utf-8')
+
+    pubkey, signer = pubkey_from_spki(cert['subjectPublicKeyInfo'])
+    return {"pubkey": pubkey, "signer": signer, "cn": cn}
+
+
+# Parâmetros DER (namedCurve) das curvas aceitas nos certificados.
+EC_CURVES = {
+    b'\x06\x05+\x81\x04\x00#': 'secp521r1',
+    b'\x06\x05+\x81\x04\x00"': 'secp384r1',
+    b'\x06\x08*\x86H\xce=\x03\x01\x07': 'secp256r1',
+}
+
+
+def pubkey_from_spki(spki):
+    pubkey_algo = spki['algorithm']['algorithm']
+    pubkey, _ = spki['subjectPublicKey']
+
+    if pubkey_algo == '1.2.840.10045.2.1':
+        signer = ECDSA()
+        parametros = bytes(spki['algorithm'].get('parameters') or b'')
+        if parametros not in EC_CURVES:
+            raise UntrustedInput("curva elíptica não suportada")
+        curve = Curve.get_curve(EC_CURVES[parametros])
+    elif pubkey_algo == '1.3.6.1.4.1.44588.2.1':
+        signer = EDDSA(hashlib.shake_256, hash_len=132)
+        curve = Curve.get_curve('Ed521')
+    else:
+        raise UntrustedInput("algoritmo de chave pública não suportado: " + pubkey_algo)
+    pubkey = ECPublicKey(curve.decode_point(pubkey))
+    return pubkey, signer
+
+
+def preload():
+    """
+    Compila as especificações e carrega as curvas de antemão, para processos
+    que vão ser copiados com fork depois de inicializados.
+    """
+    for nome in ESQUEMAS:
+        compiled_schema(nome)
+    for nome in set(EC_CURVES.values()) | {'Ed521'}:
+        Curve.get_curve(nome)
+
+
+def cert_der(cert):
+    if cert.startswith(b'-----'):
+        # PEM to DER
+        cert = b64decode(b''.join(cert.splitlines()[1:-1]))
+    cert = bytes(cert)
+    check_tlv(cert)
+    return cert
+
+
+def tlv_span(data, offset):
+    """
+    Retorna (início do conteúdo, fim) do TLV DER que começa em `offset`.
+    """
+    length = data[offset + 1]
+    start = offset + 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[start:start + size], 'big')
+        start += size
+    return start, start + length
+
+
+SIGNATURE_HASHES = {
+    '1.2.840.10045.4.3.2': hashlib.sha256,
+    '1.2.840.10045.4.3.3': hashlib.sha384,
+    '1.2.840.10045.4.3.4': hashlib.sha512,
+}
+
+
+class TrustStore:
+    """
+    Certificados emissores da Justiça Eleitoral carregados de um diretório
+    local (arquivos .pem, .crt, .cer ou .der), indexados pelo nome do titular.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.by_subject = collections.defaultdict(list)
+        if not self.path.is_dir():
+            return
+        for f in sorted(self.path.iterdir()):
+            if f.suffix.lower() not in {'.pem', '.crt', '.cer', '.der'}:
+                continue
+            data = f.read_bytes()
+            if data.startswith(b'-----'):
+                blocks = data.split(b'-----END CERTIFICATE-----')
+                certs = [cert_der(b.strip() + b'\n-----END CERTIFICATE-----')
+                         for b in blocks if b.strip()]
+            else:
+                certs = [data]
+            for der in certs:
+                self.add(der)
+
+    def add(self, der):
+        x509_conv = compiled_schema("x509_conv")
+        tbs = x509_conv.decode('Certificate', der)['tbsCertificate']
+        self.by_subject[x509_conv.encode('Name', tbs['subject'])].append(der)
+
+    def __len__(self):
+        return sum(len(certs) for certs in self.by_subject.values())
+
+    def issuers(self, der):
+        x509_conv = compiled_schema("x509_conv")
+        tbs = x509_conv.decode('Certificate', der)['tbsCertificate']
+        return self.by_subject.get(x509_conv.encode('Name', tbs['issuer']), [])
+
+
+@functools.lru_cache(maxsize=4096)
+def check_issued_by(issuer, cert):
+    """
+    Verifica se `cert` foi assinado pela chave de `issuer` (ambos em DER).
+    O resultado fica em cache: milhares de urnas compartilham poucos
+    certificados intermediários, cuja assinatura é verificada uma única vez.
+    """
+    decoded = compiled_schema("x509_conv").decode('Certificate', cert)
+    algorithm = decoded['signatureAlgorithm']['algorithm']
+    signature, _ = decoded['signature']
+    start, _ = tlv_span(cert, 0)
+    _, tbs_end = tlv_span(cert, start)
+    tbs = cert[start:tbs_end]
+
+    issuer_tbs = compiled_schema("x509_conv").decode('Certificate', issuer)['tbsCertificate']
+    try:
+        pubkey, signer = pubkey_from_spki(issuer_tbs['subjectPublicKeyInfo'])
+    except UntrustedInput:
+        return False
+    if algorithm in SIGNATURE_HASHES and isinstance(signer, ECDSA):
+        return signer.verify(SIGNATURE_HASHES[algorithm](tbs).digest(), signature, pubkey)
+    if algorithm == '1.3.6.1.4.1.44588.2.1' and isinstance(signer, EDDSA):
+        return signer.verify(tbs, signature, pubkey)
+    return False
+
+
+@functools.lru_cache(maxsize=1)
+def trust_store():
+    return TrustStore(os.environ.get(
+        "URNAHASH_TRUST_STORE", Path(__file__).parent / 'certs'))
+
+
+def _utc(tempo):
+    _, valor = tempo
+    if valor.tzinfo is None:
+        valor = valor.replace(tzinfo=datetime.timezone.utc)
+    return valor
+
+
+@functools.lru_cache(maxsize=4096)
+def certificate_info(der):
+    """
+    (notBefore, notAfter, é uma AC) do certificado DER. É uma AC se tem a
+    extensão basicConstraints com cA=TRUE.
+    """
+    x509_conv = compiled_schema("x509_conv")
+    tbs = x509_conv.decode('Certificate', der)['tbsCertificate']
+    autoridade = False
+    for extensao in tbs.get('extensions') or []:
+        if extensao['extnID'] == '2.5.29.19':
+            autoridade = x509_conv.decode('BasicConstraints', extensao['extnValue'])['cA']
+    return _utc(tbs['validity']['notBefore']), _utc(tbs['validity']['notAfter']), autoridade
+
+
+def validation_time():
+    """
+    Momento em que os certificados devem estar válidos: o de
+    URNAHASH_VALIDADE_EM (data ISO, por exemplo a da eleição, para conferir
+    certificados já expirados) ou o atual.
+    """
+    momento = os.environ.get("URNAHASH_VALIDADE_EM")
+    if not momento:
+        return datetime.datetime.now(datetime.timezone.utc)
+    momento = datetime.datetime.fromisoformat(momento)
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=datetime.timezone.utc)
+    return momento
+
+
+def valid_at(der, momento):
+    inicio, fim, _ = certificate_info(der)
+    return inicio <= momento <= fim
+
+
+@stage("validate_chain")
+def validate_chain(cert, store=None, max_depth=8, momento=None):
+    """
+    Valida o certificado da urna até uma raiz auto-assinada do repositório
+    de confiança: cada certificado da cadeia deve estar no seu período de
+    validade em `momento` (padrão: validation_time()) e cada emissor deve
+    ser uma AC. Retorna None se não há repositório configurado.
+    """
+    if store is None:
+        store = trust_store()
+    if not len(store):
+        return None
+    if momento is None:
+        momento = validation_time()
+    current = cert_der(cert)
+    for _ in range(max_depth):
+        if not valid_at(current, momento):
+            return False
+        for issuer in store.issuers(current):
+            if certificate_info(issuer)[2] and valid_at(issuer, momento) \
+                    and check_issued_by(issuer, current):
+                break
+        else:
+            return False
+        if issuer == current:
+            return True
+        current = issuer
+    return False
+
+
+def extract_hash_signature(assinaturas_decoded, arquivo, sign):
+    assert sign in {'hash', 'assinatura'}
+    if arquivo == "log":
+        resumo = assinaturas_decoded['arquivosAssinados'][10]['assinatura'][sign]
+    elif arquivo == "bu":
+        resumo = assinaturas_decoded['arquivosAssinados'][0]['assinatura'][sign]
+    else:
+        resumo = "Opção inválida"
+    return resumo
+
+
+def check_signature(hash_arquivo, assinatura_original, pub_key):
+    pubkey, signer, _ = pub_key.values()
+    return signer.verify(hash_arquivo, assinatura_original, pubkey)
+
+
+# Verificação de assinaturas ECDSA em lote. A aritmética de pontos é feita
+# em coordenadas jacobianas com inteiros do Python, sem os objetos do ecpy.
+def _jacobian_double(P, a, p):
+    X, Y, Z = P
+    if not Y:
+        return None
+    YY = Y * Y % p
+    S = 4 * X * YY % p
+    ZZ = Z * Z % p
+    M = (3 * X * X + a * ZZ * ZZ) % p
+    X3 = (M * M - 2 * S) % p
+    return X3, (M * (S - X3) - 8 * YY * YY) % p, 2 * Y * Z % p
+
+
+def _jacobian_add(P, Q, a, p):
+    if P is None:
+        return Q
+    if Q is None:
+        return P
+    X1, Y1, Z1 = P
+    X2, Y2, Z2 = Q
+    Z1Z1 = Z1 * Z1 % p
+    Z2Z2 = Z2 * Z2 % p
+    U1 = X1 * Z2Z2 % p
+    U2 = X2 * Z1Z1 % p
+    S1 = Y1 * Z2 * Z2Z2 % p
+    S2 = Y2 * Z1 * Z1Z1 % p
+    H = (U2 - U1) % p
+    R = (S2 - S1) % p
+    if not H:
+        return _jacobian_double(P, a, p) if not R else None
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (R * R - HHH - 2 * V) % p
+    return X3, (R * (V - X3) - S1 * HHH) % p, Z1 * Z2 * H % p
+
+
+def multi_scalar_mul(pares, curve, janela=4):
+    """
+    Soma de k_i * P_i para `pares` [(k_i, (x_i, y_i))] numa única cadeia de
+    duplicações (método de Straus com janelas de `janela` bits). Retorna o
+    ponto em coordenadas jacobianas, ou None para o ponto no infinito.
+    """
+    a, p = curve.a, curve.field
+    tabelas = []
+    for k, (x, y) in pares:
+        if not k:
+            continue
+        P = (x, y, 1)
+        tabela = [None, P]
+        for _ in range(2, 1 << janela):
+            tabela.append(_jacobian_add(tabela[-1], P, a, p))
+        tabelas.append((k, tabela))
+    if not tabelas:
+        return None
+    bits = max(k.bit_length() for k, _ in tabelas)
+    mascara = (1 << janela) - 1
+    acumulado = None
+    for deslocamento in range((bits - 1) // janela * janela, -1, -janela):
+        for _ in range(janela):
+            if acumulado is not None:
+                acumulado = _jacobian_double(acumulado, a, p)
+        for k, tabela in tabelas:
+            digito = (k >> deslocamento) & mascara
+            if digito:
+                acumulado = _jacobian_add(acumulado, tabela[digito], a, p)
+    return acumulado
+
+
+def _recover_r(r, curve):
+    """
+    Ponto R da assinatura a partir de r, com y de sinal arbitrário. Retorna
+    None se nenhum ponto tem x = r e "ambíguo" se x = r + n também é válido
+    (caso de probabilidade desprezível, verificado individualmente).
+    """
+    p, n = curve.field, curve.order
+    if p % 4 != 3:
+        return "ambíguo"
+    pontos = []
+    for x in (r, r + n):
+        if x >= p:
+            continue
+        rhs = (x * x * x + curve.a * x + curve.b) % p
+        y = pow(rhs, (p + 1) // 4, p)
+        if y * y % p == rhs:
+            pontos.append((x, y))
+    if len(pontos) > 1:
+        return "ambíguo"
+    return pontos[0] if pontos else None
+
+
+def _batch_holds(itens, curve):
+    """
+    Testa de uma vez as equações u1_i*G + u2_i*Q_i = R_i de `itens`
+    [(u1, u2, Q, R, r)] com coeficientes aleatórios a_i de 128 bits:
+    sum(a_i*u1_i)*G + sum(a_i*u2_i*Q_i) = sum(+-a_i*R_i). Como o sinal de
+    cada R_i recuperado de r é desconhecido, as 2^(t-1) combinações de
+    sinais são percorridas em código de Gray, uma soma de ponto por passo.
+    """
+    a, p, n = curve.a, curve.field, curve.order
+    G = (curve.generator.x, curve.generator.y)
+    coeficientes = [secrets.randbits(128) | 1 for _ in itens]
+    escalar_g = 0
+    por_chave = {}
+    for c, (u1, u2, Q, _, _) in zip(coeficientes, itens):
+        escalar_g += c * u1
+        por_chave[Q] = por_chave.get(Q, 0) + c * u2
+    S = multi_scalar_mul([(escalar_g % n, G)] + [(k % n, Q) for Q, k in por_chave.items()], curve)
+    if S is None:
+        return False
+    T = [multi_scalar_mul([(c, R)], curve) for c, (_, _, _, R, _) in zip(coeficientes, itens)]
+    Sx, Sy, Sz = S
+    zz = Sz * Sz % p
+    alvo_x, alvo_y, alvo_z = Sx, Sy, zz * Sz % p
+
+    def confere(P):
+        # P == +-S, comparando em coordenadas jacobianas sem inversão.
+        if P is None:
+            return False
+        X, Y, Z = P
+        ZZ = Z * Z % p
+        if X * zz % p != alvo_x * ZZ % p:
+            return False
+        return Y * alvo_z % p in (alvo_y * ZZ * Z % p, -alvo_y * ZZ * Z % p)
+
+    soma = None
+    for t in T:
+        soma = _jacobian_add(soma, t, a, p)
+    if confere(soma):
+        return True
+    dobros = [_jacobian_double(t, a, p) if t else None for t in T]
+    sinais = [1] * len(T)
+    # O primeiro sinal fica fixo: a comparação com +-S cobre o complemento.
+    for passo in range(1, 1 << (len(T) - 1)):
+        j = (passo & -passo).bit_length()
+        X, Y, Z = dobros[j]
+        menos = (X, -Y % p, Z) if sinais[j] > 0 else (X, Y, Z)
+        sinais[j] = -sinais[j]
+        soma = _jacobian_add(soma, menos, a, p)
+        if confere(soma):
+            return True
+    return False
+
+
+def _verify_one(item, curve):
+    # Verificação ECDSA individual e exata: x(u1*G + u2*Q) mod n == r.
+    u1, u2, Q, _, r = item
+    p = curve.field
+    P = multi_scalar_mul([(u1, (curve.generator.x, curve.generator.y)), (u2, Q)], curve)
+    if P is None:
+        return False
+    X, _, Z = P
+    return X * pow(Z * Z, -1, p) % p % curve.order == r
+
+
+def check_signature_batch(itens, tamanho_lote=8):
+    """
+    Verifica muitas assinaturas, `itens` [(hash_arquivo, assinatura,
+    pub_key)] como em check_signature, e retorna a lista de resultados.
+    Assinaturas ECDSA da mesma curva são verificadas em lotes de até
+    `tamanho_lote` com uma multiplicação multiescalar por lote, somando as
+    chaves repetidas; um lote que falha é dividido ao meio até isolar as
+    assinaturas inválidas. As demais são verificadas uma a uma.
+    """
+    resultados = [None] * len(itens)
+    grupos = collections.defaultdict(list)
+    for i, (hash_arquivo, assinatura, pub_key) in enumerate(itens):
+        W = pub_key["pubkey"].W
+        curve = W.curve
+        if not isinstance(pub_key["signer"], ECDSA) or not W.is_on_curve:
+            resultados[i] = check_signature(hash_arquivo, assinatura, pub_key)
+            continue
+        n = curve.order
+        try:
+            r, s = decode_sig(assinatura, "DER")
+        except Exception:
+            resultados[i] = False
+            continue
+        if r is None or s is None or not 0 < r < n or not 0 < s < n:
+            resultados[i] = False
+            continue
+        R = _recover_r(r, curve)
+        if R is None:
+            resultados[i] = False
+            continue
+        if R == "ambíguo":
+            resultados[i] = check_signature(hash_arquivo, assinatura, pub_key)
+            continue
+        h = int.from_bytes(hash_arquivo, 'big')
+        if len(hash_arquivo) * 8 > curve.size:
+            h >>= len(hash_arquivo) * 8 - curve.size
+        c = pow(s, -1, n)
+        grupos[curve.name].append((i, (h * c % n, r * c % n, (W.x, W.y), R, r)))
+
+    def verificar(lote, curve):
+        if len(lote) == 1:
+            i, item = lote[0]
+            resultados[i] = _verify_one(item, curve)
+        elif _batch_holds([item for _, item in lote], curve):
+            for i, _ in lote:
+                resultados[i] = True
+        else:
+            meio = len(lote) // 2
+            verificar(lote[:meio], curve)
+            verificar(lote[meio:], curve)
+
+    for nome, grupo in grupos.items():
+        curve = Curve.get_curve(nome)
+        for inicio in range(0, len(grupo), tamanho_lote):
+            verificar(grupo[inicio:inicio + tamanho_lote], curve)
+    return resultados
+
+
+def check_signature_job(cert, hash_arquivo, assinatura):
+    # Recebe o certificado em bytes porque as chaves do ecpy não são
+    # serializáveis entre processos.
+    if cert is None:
+        return None
+    pub_key = pubkey_from_cert(cert)
+    return check_signature(hashlib.sha512(hash_arquivo).digest(), assinatura, pub_key)
+
+
+def signature_jobs(entidades, atuais, nome):
+    """
+    (tipo, arquivo, certificado, hash atual, assinatura) da auto-assinatura
+    e de cada arquivo em `atuais`, para as entidades HW e SW do envelope
+    `nome`. As entradas são encontradas por find_signed, como em read_section.
+    """
+    for tipo, entidade in entidades.items():
+        cert = entidade.get('certificadoDigital')
+        auto = entidade['autoAssinado']['assinatura']
+        yield tipo, "auto", cert, hash_file(entidade['conteudoAutoAssinado']), auto['assinatura']
+        envelopes = [{"nome": nome, "certificado": cert, "pub_key": None,
+                      "arquivos": signed_files(decode_assinaturas(entidade))}]
+        tabela = merge_signed_files(envelopes)
+        for arquivo, atual in atuais.items():
+            yield tipo, arquivo, cert, atual, find_signed(tabela, envelopes, arquivo)["assinatura"]
+
+
+def process_pool(workers, preload=()):
+    # Os workers são criados por um forkserver que só importa este módulo (e
+    # os de `preload`): não herdam as threads de quem cria o pool (o que um
+    # fork direto faria) nem importam o Shiny, e compilam apenas a
+    # especificação X509, na primeira verificação. URNAHASH_VERIFY_START=
+    # fork|spawn muda o método.
+    metodo = os.environ.get("URNAHASH_VERIFY_START", "forkserver")
+    contexto = multiprocessing.get_context(metodo)
+    if metodo == "forkserver":
+        contexto.set_forkserver_preload([__name__, *preload])
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=contexto)
+
+
+_verification_pool = None
+
+
+def verification_pool():
+    global _verification_pool
+    if _verification_pool is None:
+        _verification_pool = process_pool(
+            int(os.environ.get("URNAHASH_VERIFY_WORKERS", os.cpu_count() or 1)))
+    return _verification_pool
+
+
+SECAO = re.compile(r'o\d{5}-\d{13}')
+
+
+def find_sections(diretorio):
+    """
+    Agrupa os arquivos de cada seção encontrados em `diretorio` (e
+    subpastas) pelo identificador oNNNNN-MMMMMZZZZSSSS do nome. A UF é o
+    caminho da pasta da seção relativo a `diretorio`. Retorna dicionários
+    com as chaves "secao", "uf", "sign", "log" e "bu" (ausentes como None).
+    """
+    diretorio = Path(diretorio)
+    secoes = {}
+    for path in sorted(diretorio.rglob("*")):
+        encontrado = SECAO.search(path.name)
+        if encontrado is None or not path.is_file():
+            continue
+        uf = path.parent.relative_to(diretorio).as_posix()
+        secao = secoes.setdefault((uf, encontrado.group()), {
+            "secao": encontrado.group(), "uf": "" if uf == "." else uf,
+            "sign": None, "log": None, "bu": None})
+        _classify(secao, path)
+    return list(secoes.values())
+
+
+def _classify(secao, path):
+    if path.suffix == ".bu":
+        secao["bu"] = path
+    elif path.suffix == ".zip" and "log" in path.name.lower():
+        secao["log"] = path
+    elif path.suffix == ".zip":
+        secao["sign"] = path
+
+
+def iter_sections(diretorio):
+    """
+    Como find_sections, mas percorre `diretorio` uma pasta por vez e gera
+    cada seção assim que os seus três arquivos aparecem; as incompletas saem
+    no fim da pasta. Só as seções incompletas da pasta atual e os nomes das
+    subpastas pendentes ficam em memória. A ordem dentro de uma pasta é a
+    do sistema de arquivos; as subpastas são visitadas em ordem alfabética.
+    """
+    raiz = Path(diretorio)
+    pendentes = [raiz]
+    while pendentes:
+        pasta = pendentes.pop()
+        uf = pasta.relative_to(raiz).as_posix()
+        uf = "" if uf == "." else uf
+        secoes, subpastas = {}, []
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    subpastas.append(entrada.name)
+                    continue
+                encontrado = SECAO.search(entrada.name)
+                if encontrado is None or not entrada.is_file():
+                    continue
+                secao = secoes.setdefault(encontrado.group(), {
+                    "secao": encontrado.group(), "uf": uf,
+                    "sign": None, "log": None, "bu": None})
+                _classify(secao, pasta / entrada.name)
+                if secao["sign"] and secao["log"] and secao["bu"]:
+                    yield secoes.pop(encontrado.group())
+        yield from secoes.values()
+        pendentes.extend(pasta / nome for nome in sorted(subpastas, reverse=True))
+
+
+class ByteLRU:
+    """
+    Cache LRU limitado pela soma dos tamanhos (estimados, em bytes) dos
+    valores, seguro para uso por várias threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.itens = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self.itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            self.itens.move_to_end(chave)
+            self.hits += 1
+            return item[0]
+
+    def put(self, chave, valor, tamanho):
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self.itens.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            self.itens[chave] = (valor, tamanho)
+            self.bytes += tamanho
+            while self.bytes > self.max_bytes:
+                _, (_, removido) = self.itens.popitem(last=False)
+                self.bytes -= removido
+                self.evictions += 1
+                self.evicted_bytes += removido
+
+    def stats(self):
+        with self._lock:
+            return {"itens": len(self.itens), "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "evicted_bytes": self.evicted_bytes}
+
+
+# Envelopes decodificados, com a chave pública, indexados pelo SHA-256 dos
+# bytes do arquivo de assinaturas: compartilhado por todas as sessões do
+# processo, que costumam comparar arquivos com os mesmos poucos envelopes.
+envelope_cache = ByteLRU(int(os.environ.get("URNAHASH_ENVELOPE_CACHE_BYTES", 64 << 20)))
+
+# Estimativa do que um envelope ocupa além dos bytes: dicionário, tuplas
+# por arquivo assinado e a chave pública do ecpy.
+TAMANHO_ENVELOPE = 4096
+TAMANHO_ARQUIVO_ASSINADO = 300
+
+
+def envelope_size(envelope):
+    return TAMANHO_ENVELOPE + len(envelope["dados"]) + len(envelope["certificado"]) + sum(
+        TAMANHO_ARQUIVO_ASSINADO + len(nome) + len(hash) + len(assinatura)
+        for nome, hash, assinatura in envelope["arquivos"])
+
+
+# Arquivos de assinaturas do pacote da urna: .vscmr, .vscsa, .vscrd...
+ARQUIVO_ASSINATURAS = re.compile(r'\.vsc\w*$')
+EXTENSAO = {"bu": ".bu", "log": ".logjez"}
+POSICAO = {"bu": 0, "log": 10}
+
+
+def reset_thread_pools():
+    # Threads não sobrevivem ao fork: um worker criado depois do aquecimento
+    # herdaria pools sem threads e esperaria para sempre.
+    hash_service.cache_clear()
+
+
+os.register_at_fork(after_in_child=reset_thread_pools)
+
+
+def decode_signature_file(nome, dados):
+    """
+    Decodifica um arquivo de assinaturas. Retorna apenas bytes, textos,
+    números e tuplas, para que também possa rodar num pool de processos.
+    """
+    resultado = decode_resultado(dados)
+    envelope = resultado['assinaturaHW']
+    return {"nome": nome, "dados": bytes(dados),
+            "certificado": bytes(envelope['certificadoDigital']),
+            "arquivos": signed_files(decode_assinaturas(envelope)),
+            "modelo": resultado['modeloUrna'], "datahora": envelope['dataHoraCriacao'],
+            "conjunto_chave": envelope.get('conjuntoChave')}
+
+
+def signed_files(assinaturas):
+    """
+    [(nomeArquivo, hash, assinatura)] de uma Assinatura decodificada.
+    """
+    return [(a['nomeArquivo'], bytes(a['assinatura']['hash']),
+             bytes(a['assinatura']['assinatura'])) for a in assinaturas['arquivosAssinados']]
+
+
+def read_signature_files(sign_path, limits=DECODE_LIMITS):
+    """
+    [(nome, conteúdo)] dos arquivos de assinaturas do ZIP, com o .vscmr
+    primeiro.
+    """
+    with zipfile.ZipFile(sign_path, mode='r') as pacote:
+        nomes = sorted((f for f in pacote.namelist() if ARQUIVO_ASSINATURAS.search(f)),
+                       key=lambda f: (not f.endswith(".vscmr"), f))
+        if len(nomes) > limits.max_items:
+            raise UntrustedInput("Mais de %d arquivos de assinaturas" % limits.max_items)
+        arquivos = []
+        for nome in nomes:
+            with pacote.open(nome, 'r') as file:
+                # Lê no máximo um byte além do limite: um ZIP com um membro
+                # enorme é rejeitado sem ser descompactado.
+                arquivos.append((nome, file.read(limits.max_size + 1)))
+    return arquivos
+
+
+def read_envelopes(sign_path, limits=DECODE_LIMITS):
+    """
+    Decodifica todos os arquivos de assinaturas do ZIP, com o .vscmr
+    primeiro, reaproveitando os que estão em envelope_cache. Cada envelope
+    traz também "pub_key". Retorna (envelopes, [(nome, erro)]).
+    """
+    # A decodificação é Python puro: numa thread à parte ela não ganha nada
+    # por causa do GIL (medido: 2 envelopes, 351 us em 4 threads contra 372
+    # us direto; 4 envelopes, 571 us contra 547 us) e as etapas perderiam o
+    # identificador da requisição.
+    arquivos = read_signature_files(sign_path, limits)
+    envelopes, erros = [], []
+    for nome, dados in arquivos:
+        chave = hashlib.sha256(dados).digest()
+        em_cache = envelope_cache.get(chave)
+        if em_cache is not None:
+            envelopes.append(dict(em_cache, nome=nome))
+            continue
+        try:
+            envelope = decode_signature_file(nome, dados)
+            envelope["pub_key"] = pubkey_from_cert(envelope["certificado"])
+        except Exception as e:
+            erros.append((nome, str(e) or type(e).__name__))
+            continue
+        envelope_cache.put(chave, envelope, envelope_size(envelope))
+        envelopes.append(envelope)
+    return envelopes, erros
+
+
+def merge_signed_files(envelopes):
+    """
+    Junta os arquivosAssinados de todos os envelopes numa só tabela
+    {nomeArquivo: {"hash", "assinatura", "certificado", "pub_key",
+    "envelopes"}}. Hash
+    e assinatura vêm do primeiro envelope que cobre o arquivo; "envelopes"
+    lista todos os que o cobrem.
+    """
+    tabela = {}
+    for envelope in envelopes:
+        for nome, hash, assinatura in envelope["arquivos"]:
+            entrada = tabela.setdefault(nome, {
+                "hash": hash, "assinatura": assinatura,
+                "certificado": envelope["certificado"],
+                "pub_key": envelope["pub_key"], "envelopes": []})
+            entrada["envelopes"].append(envelope["nome"])
+    return tabela
+
+
+def find_signed(tabela, envelopes, arquivo):
+    """
+    Entrada da tabela para o BU ou o log: pelo nome do arquivo assinado ou,
+    se nenhum nome tem a extensão, pela posição fixa no envelope .vscmr. A
+    posição só vale para ele: se o .vscmr não pôde ser lido, o primeiro
+    envelope é outro e a entrada nessa posição não é o arquivo pedido.
+    """
+    for nome, entrada in tabela.items():
+        if nome.endswith(EXTENSAO[arquivo]):
+            return entrada
+    if (envelopes and envelopes[0]["nome"].endswith(".vscmr")
+            and len(envelopes[0]["arquivos"]) > POSICAO[arquivo]):
+        return tabela[envelopes[0]["arquivos"][POSICAO[arquivo]][0]]
+    raise UntrustedInput("Nenhum envelope cobre o arquivo %s" % EXTENSAO[arquivo])
+
+
+def _ready(valor):
+    futuro = concurrent.futures.Future()
+    futuro.set_result(valor)
+    return futuro
+
+
+@stage("read_section")
+def read_section(sign_path, log_path, bu_path, digests=None):
+    # Os hashes do log e do BU são calculados em paralelo enquanto os
+    # envelopes são decodificados, a não ser que já venham em `digests`
+    # ({"log": ..., "bu": ...}, calculados durante o upload).
+    digests = digests or {}
+    hashes = hash_service()
+    if "log" in digests:
+        futuro_log = _ready(digests["log"])
+    else:
+        futuro_log = hashes.submit(lambda: open_member(log_path, ".logjez"))
+    if "bu" in digests:
+        futuro_bu = _ready(digests["bu"])
+    else:
+        futuro_bu = hashes.submit(lambda: open(bu_path, 'rb'))
+
+    envelopes, erros = read_envelopes(sign_path)
+    if not envelopes:
+        raise UntrustedInput("nenhum envelope de assinaturas válido" + "".join(
+            "; %s: %s" % erro for erro in erros))
+    tabela = merge_signed_files(envelopes)
+    log = find_signed(tabela, envelopes, "log")
+    bu = find_signed(tabela, envelopes, "bu")
+
+    currentLog = futuro_log.result()
+    currentBU = futuro_bu.result()
+
+    principal = next(e for e in envelopes if bu["envelopes"][0] == e["nome"])
+    return {
+        "envelope": principal["dados"],
+        "nome_envelope": principal["nome"],
+        "certificado": bu["certificado"],
+        "pub_key": bu["pub_key"],
+        "chaves": {"log": log["pub_key"], "bu": bu["pub_key"]},
+        "log": (log["hash"], log["assinatura"], currentLog),
+        "bu": (bu["hash"], bu["assinatura"], currentBU),
+        "cobertura": {nome: entrada["envelopes"] for nome, entrada in tabela.items()},
+        "erros": erros,
+    }
+
+
+@stage("verify_section")
+def verify_section(section, arquivo):
+    _, assinatura, atual = section[arquivo]
+    return check_signature(hashlib.sha512(atual).digest(), assinatura,
+                           section["chaves"][arquivo])
+